@@ -0,0 +1,312 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from urllib.parse import urldefrag, urlparse
+
+import aiohttp
+import lxml.html
+from lxml import etree
+
+from .politeness import HostScheduler, RetryPolicy
+from .seen_set import BloomFilter, FingerprintSet
+
+
+def parse_html(content: bytes, url: str):
+    """
+    Parse the page content and make all the links inside it absolute.
+    :param content: The raw body of the response
+    :param url: The final URL of the page used to resolve the relative links
+    :return: The root of the document, None if the page is not an HTML page
+    """
+    try:
+        tree = lxml.html.document_fromstring(content)
+    except (etree.ParserError, ValueError):
+        return None
+    tree.make_links_absolute(url, resolve_base_href=True)
+    return tree
+
+
+class AsyncCrawlEngine:
+    """
+    Crawls a site using asyncio, where one event loop keeps thousands of fetches in flight,
+    instead of one blocking browser per thread.
+    Links are visited by level (BFS or DFS) and every host has its own bounded semaphore.
+    """
+
+    def __init__(
+        self,
+        seed_url: str,
+        max_pages: int,
+        max_depth: int,
+        max_collected_docs: int,
+        page_handler: Callable[[str, int, object, int], int] | None = None,
+        scope_divs: list[str] | None = None,
+        link_filter: Callable[[str], bool] | None = None,
+        depth_first: bool = False,
+        concurrency: int = 100,
+        host_concurrency: int = 10,
+        timeout: float = 10,
+        user_agent: str | None = None,
+        canonicalize: Callable[[str], str] | None = None,
+        seen: FingerprintSet | BloomFilter | None = None,
+        scheduler: HostScheduler | None = None,
+        retry_policy: RetryPolicy | None = None,
+        handler_threads: int | None = None,
+        handler_exit: Callable[[], None] | None = None,
+    ):
+        """
+        :param seed_url: The root url to start crawling from
+        :param max_pages: Maximum number of links to be discovered
+        :param max_depth: Links deeper than this level are not followed
+        :param max_collected_docs: The crawl stops once the page handler reports this number of documents
+        :param page_handler: Called in a worker thread as handler(url, status_code, tree, level),
+         it returns the number of documents found in the page
+        :param scope_divs: XPaths of the elements to collect the links from
+        :param link_filter: Returns False for links that should not be crawled
+        :param depth_first: Visit the deepest level first
+        :param concurrency: Maximum number of fetches in flight
+        :param host_concurrency: Maximum number of fetches in flight per host
+        :param timeout: Timeout of one fetch in seconds
+        :param user_agent: User agent sent with the requests
+        :param canonicalize: Rewrites the found links to their canonical form, by default only the fragment is removed
+        :param seen: The set of discovered URLs, a `FingerprintSet` is used by default
+        :param scheduler: Spaces the requests sent to every host, they are not spaced by default
+        :param retry_policy: Backoff of the pages failing with transient errors, they are not retried by default
+        :param handler_threads: Number of threads running the page handler, they are shut down at the end of the crawl
+        :param handler_exit: Called once in every handler thread at the end of the crawl, e.g. to close its
+         database connection
+        """
+        self.seed_url = seed_url
+        self.base_host = urlparse(seed_url).hostname
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.max_collected_docs = max_collected_docs
+        self.page_handler = page_handler
+        self.scope_divs = scope_divs or ["//body"]
+        self.link_filter = link_filter
+        self.depth_first = depth_first
+        self.concurrency = concurrency
+        self.host_concurrency = host_concurrency
+        self.timeout = timeout
+        self.user_agent = user_agent
+
+        self.canonicalize = canonicalize or (lambda url: urldefrag(url)[0])
+        self.seen = seen if seen is not None else FingerprintSet()
+        self.scheduler = scheduler
+        self.retry_policy = retry_policy or RetryPolicy(0)
+        # Same default as the executor of the event loop
+        self.handler_threads = handler_threads or min(32, (os.cpu_count() or 1) + 4)
+        self.handler_exit = handler_exit
+        self.executor: ThreadPoolExecutor | None = None
+        self.host_semaphores: dict[str, asyncio.Semaphore] = {}
+        # Used to keep the insertion order between links of the same level
+        self.counter = itertools.count()
+        self.queue: asyncio.PriorityQueue | None = None
+        self.stopped = False
+
+        # statistics
+        self.visited_pages = 0
+        self.collected_documents = 0
+        self.http_codes: dict = {"Errors": 0}
+        self.started_at = 0
+        self.completed_at = 0
+
+    @property
+    def elapsed(self) -> float:
+        end = self.completed_at if self.completed_at else time.monotonic()
+        return end - self.started_at if self.started_at else 0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.visited_pages / self.elapsed if self.elapsed > 0 else 0
+
+    def report(self) -> dict:
+        return {
+            "visited_pages": self.visited_pages,
+            "discovered_links": len(self.seen),
+            "collected_documents": self.collected_documents,
+            "elapsed": self.elapsed,
+            "pages_per_second": self.pages_per_second,
+            "http_codes": self.http_codes,
+        }
+
+    def stop(self) -> None:
+        self.stopped = True
+
+    def count(self, key) -> None:
+        self.http_codes[key] = self.http_codes.get(key, 0) + 1
+
+    def enqueue(self, url: str, level: int) -> None:
+        self.seen.add(url)
+        priority = -level if self.depth_first else level
+        self.queue.put_nowait((priority, next(self.counter), url, level))
+
+    def host_semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.host_concurrency)
+        return self.host_semaphores[host]
+
+    def find_links(self, tree) -> list[str]:
+        links = []
+        for scope_div in self.scope_divs:
+            try:
+                scoped_elements = tree.xpath(scope_div)
+            except etree.XPathError:
+                continue
+            for scoped_element in scoped_elements:
+                if not isinstance(scoped_element, etree.ElementBase):
+                    continue
+                for a in scoped_element.iter("a"):
+                    href = a.get("href")
+                    if href:
+                        links.append(self.canonicalize(href))
+        return links
+
+    def add_links(self, tree, level: int) -> None:
+        next_level = level + 1
+        if next_level > self.max_depth:
+            return
+        for href in self.find_links(tree):
+            if href in self.seen:
+                continue
+            # Links from outside the main host are skipped
+            if urlparse(href).hostname != self.base_host:
+                continue
+            if self.link_filter is not None and not self.link_filter(href):
+                continue
+            if len(self.seen) >= self.max_pages:
+                return
+            self.enqueue(href, next_level)
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str):
+        async with self.host_semaphore(urlparse(url).hostname):
+            async with session.get(url) as response:
+                return response.status, str(response.url), await response.read()
+
+    async def fetch_with_retries(self, session: aiohttp.ClientSession, url: str):
+        for attempt in range(self.retry_policy.attempts):
+            if self.scheduler is not None:
+                delay = self.scheduler.reserve(url)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            error = None
+            result = None
+            try:
+                result = await self.fetch(session, url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            transient = error is not None or self.retry_policy.is_transient(result[0])
+            if self.scheduler is not None:
+                self.scheduler.feedback(url, not transient)
+            if not transient or attempt == self.retry_policy.retries or self.stopped:
+                break
+            self.count("Retries")
+            await asyncio.sleep(self.retry_policy.delay(attempt))
+        if error is not None:
+            raise error
+        return result
+
+    async def process(self, session: aiohttp.ClientSession, url: str, level: int):
+        try:
+            status_code, final_url, content = await self.fetch_with_retries(
+                session, url
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            self.count("Errors")
+            return
+        self.visited_pages += 1
+        self.count(status_code)
+
+        tree = parse_html(content, final_url)
+        if tree is None:
+            return
+        self.add_links(tree, level)
+
+        if self.page_handler is None:
+            return
+        loop = asyncio.get_running_loop()
+        documents = await loop.run_in_executor(
+            self.executor, self.page_handler, url, status_code, tree, level
+        )
+        self.collected_documents += documents or 0
+        if self.collected_documents >= self.max_collected_docs:
+            self.stop()
+
+    async def worker(self, session: aiohttp.ClientSession) -> None:
+        while True:
+            _, _, url, level = await self.queue.get()
+            try:
+                # Once stopped, the rest of the queue is only drained
+                if not self.stopped:
+                    await self.process(session, url, level)
+            except Exception:
+                self.count("Errors")
+            finally:
+                self.queue.task_done()
+
+    async def on_every_thread(self, function: Callable[[], None]) -> None:
+        """
+        Run the function once in every handler thread, the barrier keeps each thread busy until all of them
+        took one call, so no thread runs it twice.
+        """
+        barrier = threading.Barrier(self.handler_threads)
+
+        def run() -> None:
+            barrier.wait()
+            function()
+
+        await asyncio.gather(
+            *(
+                asyncio.wrap_future(self.executor.submit(run))
+                for _ in range(self.handler_threads)
+            )
+        )
+
+    async def crawl(self) -> dict:
+        self.queue = asyncio.PriorityQueue()
+        self.started_at = time.monotonic()
+        self.enqueue(self.canonicalize(self.seed_url), 0)
+        if self.page_handler is None:
+            return await self.fetch_pages()
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.handler_threads, thread_name_prefix="page-handler"
+        )
+        try:
+            # The threads are started lazily, they are all started now to be all reached at the end
+            await self.on_every_thread(lambda: None)
+            return await self.fetch_pages()
+        finally:
+            if self.handler_exit is not None:
+                await self.on_every_thread(self.handler_exit)
+            self.executor.shutdown(wait=True)
+
+    async def fetch_pages(self) -> dict:
+        headers = {"User-Agent": self.user_agent} if self.user_agent else None
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=headers
+        ) as session:
+            tasks = [
+                asyncio.create_task(self.worker(session))
+                for _ in range(self.concurrency)
+            ]
+            await self.queue.join()
+            self.stopped = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.completed_at = time.monotonic()
+        return self.report()
+
+    def run(self) -> dict:
+        """
+        Run the crawl until the queue is empty or one of the stop conditions is met.
+        :return: The crawl report
+        """
+        return asyncio.run(self.crawl())
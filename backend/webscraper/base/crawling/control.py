@@ -0,0 +1,142 @@
+import logging
+import select
+import threading
+from typing import Callable
+
+import psycopg2
+from django.db import connection, connections
+
+from ..models import Runner, RunnerStatus
+
+# Postgres channel where the status changes of all the runners are published
+CHANNEL = "runner_control"
+
+# The runners of this process, they are notified without going through the database
+local_controls: dict[int, list["RunnerControl"]] = {}
+local_controls_lock = threading.Lock()
+
+
+def publish_runner_status(runner_id: int, status: str) -> None:
+    """
+    Tell the workers of the runner that its status changed, wherever they are running.
+    The status must be saved before, so workers which start listening later read it from the database.
+    :param runner_id: The id of the runner
+    :param status: The new status
+    """
+    with local_controls_lock:
+        controls = list(local_controls.get(runner_id, []))
+    for control in controls:
+        control.update(status)
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)", [CHANNEL, f"{runner_id}:{status}"]
+            )
+
+
+class RunnerControl:
+    """
+    Follows the status of a runner without querying it for every page.
+    The status is pushed by Postgres LISTEN/NOTIFY, so workers on the PBS nodes are reached too.
+    If the channel can not be opened, the status is read from the database once per `poll_interval`.
+    """
+
+    def __init__(
+        self,
+        runner_id: int,
+        on_stop: Callable[[], None] | None = None,
+        poll_interval: float = 1,
+        logger: logging.Logger | None = None,
+    ):
+        """
+        :param runner_id: The id of the runner
+        :param on_stop: Called once when the runner is stopped or paused
+        :param poll_interval: Seconds between two reads of the status when the channel is not available
+        :param logger: Logger of the runner
+        """
+        self.runner_id = runner_id
+        self.on_stop = on_stop
+        self.poll_interval = poll_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.status = str(RunnerStatus.RUNNING)
+        self.stop_event = threading.Event()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self.listen, daemon=True)
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_event.is_set()
+
+    def update(self, status: str) -> None:
+        self.status = status
+        if status in (str(RunnerStatus.EXIT), str(RunnerStatus.PAUSED)):
+            if not self.stop_event.is_set():
+                self.stop_event.set()
+                if self.on_stop is not None:
+                    self.on_stop()
+
+    def read_status(self) -> None:
+        status = Runner.objects.filter(id=self.runner_id).values_list(
+            "status", flat=True
+        )
+        if status:
+            self.update(status[0])
+
+    def start(self) -> None:
+        with local_controls_lock:
+            local_controls.setdefault(self.runner_id, []).append(self)
+        self.thread.start()
+
+    def listen(self) -> None:
+        try:
+            listener = psycopg2.connect(
+                **connections["default"].get_connection_params()
+            )
+            listener.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with listener.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+        except Exception as e:
+            self.logger.warning(
+                f"Runner control channel is not available, polling: {e}"
+            )
+            self.poll()
+            return
+
+        try:
+            # The status may have changed before we started listening
+            self.read_status()
+            while not self.closed.is_set():
+                if select.select([listener], [], [], 0.5) == ([], [], []):
+                    continue
+                listener.poll()
+                while listener.notifies:
+                    payload = listener.notifies.pop(0).payload
+                    runner_id, _, status = payload.partition(":")
+                    if runner_id == str(self.runner_id):
+                        self.update(status)
+        except Exception as e:
+            self.logger.warning(f"Runner control channel is lost, polling: {e}")
+            self.poll()
+        finally:
+            listener.close()
+            connection.close()
+
+    def poll(self) -> None:
+        while not self.closed.is_set():
+            try:
+                self.read_status()
+            except Exception as e:
+                self.logger.error(f"Could not read the status of the runner: {e}")
+            self.closed.wait(self.poll_interval)
+        connection.close()
+
+    def close(self) -> None:
+        self.closed.set()
+        with local_controls_lock:
+            controls = local_controls.get(self.runner_id, [])
+            if self in controls:
+                controls.remove(self)
+            if not controls:
+                local_controls.pop(self.runner_id, None)
+        if self.thread.is_alive():
+            self.thread.join()
@@ -1,39 +1,88 @@
-import requests
-from django.db import transaction
 from urllib.parse import urlparse
-
-from selenium.common import UnexpectedAlertPresentException, WebDriverException
+from selenium.common import WebDriverException
 
 from ..models import (
     Runner,
     RunnerStatus,
-    Inspector,
     InspectorValue,
-    Document,
-    LinkFragment,
     Crawler,
     Statistics,
+    CrawlerEngines,
+    CrawlingAlgorithms,
+    ConfigurationModel,
 )
 import logging
 import logging.handlers
+from django.db import connection
 from django.utils import timezone
-import re
 import threading
 from concurrent.futures import ThreadPoolExecutor, Future, wait
+from contextlib import contextmanager
 import time
-from selenium.webdriver.common.by import By
-from ..dataclasses import Link, CrawlerThread
+from typing import Iterator
+from .async_crawler import AsyncCrawlEngine
+from .control import RunnerControl
+from .extraction_plan import ExtractionPlan, InspectorPlan
+from .page_extraction import PageContent, extract_page
+from .static_driver import StaticDriver, StaticElement
+from .frontier import Frontier
+from .document_writer import DocumentWriter
+from .fragment_cache import LinkFragmentCache
+from .journal import FrontierJournal
+from .metrics import RunnerMetrics
+from .network_events import PageResponse
+from .politeness import HostScheduler, RetryPolicy
+from .profiler import CrawlProfiler, NullProfiler, NullSpan, Span
+from .seen_set import BloomFilter, FingerprintSet
+from .urls import UrlCanonicalizer
+from .watchdog import Watchdog
+from ..dataclasses import Link
 from ..utils import (
-    find_the_links_current_level,
-    add_link_to_level,
-    split_work_between_threads,
-    create_chrome_driver,
-    all_threads_completed,
+    driver_pool,
+    load_page,
+    create_http_session,
     execute_all_before_actions,
-    fetch_robots_txt,
-    check_crawl_permission,
+    extraction_plans,
+    metrics_registry,
+    robots_cache,
     evaluate_document_hash_code,
+    USER_AGENT,
+    ROBOTS_USER_AGENT,
+)
+
+# Categories of the skipped links, they are counted with a few examples instead of one entry per link
+DISALLOWED_LINKS = "Disallowed links"
+EXCLUDED_LINKS = "Excluded links"
+CROSS_SITE_LINKS = "Cross site links"
+
+# Seconds a browser call may take after the page timeout before the browser is killed
+WATCHDOG_GRACE = 30
+
+# Live state of the runners of the process, read from memory when the metrics are scraped
+PAGES = metrics_registry.counter(
+    "webscraper_pages_total", "Pages visited by the runner", ("runner",)
+)
+PAGES_PER_SECOND = metrics_registry.gauge(
+    "webscraper_pages_per_second",
+    "Pages visited per second since the runner started",
+    ("runner",),
+)
+FRONTIER_LINKS = metrics_registry.gauge(
+    "webscraper_frontier_links",
+    "Links waiting in the frontier by level",
+    ("runner", "level"),
+)
+ACTIVE_WORKERS = metrics_registry.gauge(
+    "webscraper_frontier_active_workers",
+    "Threads processing a link of the frontier",
+    ("runner",),
+)
+WRITE_QUEUE = metrics_registry.gauge(
+    "webscraper_document_writer_pending",
+    "Documents waiting to be saved by the document writer",
+    ("runner",),
 )
+RUNNER_METRICS = (PAGES, PAGES_PER_SECOND, FRONTIER_LINKS, ACTIVE_WORKERS, WRITE_QUEUE)
 
 
 class CrawlerUtils:
@@ -44,45 +93,164 @@ class CrawlerUtils:
     def __init__(self, runner_id: int, crawler_id: int):
         self.runner_id = runner_id
         self.crawler_id = crawler_id
+        # Created when the runner starts
+        self.document_writer: DocumentWriter | None = None
+        self.link_fragments: LinkFragmentCache | None = None
 
-    @staticmethod
-    def clean_up_value(value: str, expressions: str) -> str:
-        if value == "" or expressions == "":
-            return value
+    def save_url_fragments(self, url: str) -> int | None:
+        """
+        Saves the fragments of the URL as a tree, most of them are already known by the cache.
+        :param url: The URL of the page
+        :return: The id of the last fragment, None if the fragments could not be saved
+        """
+        try:
+            return self.link_fragments.save(url)
+        except Exception as e:
+            # The links of the page are still followed, only its documents are not saved
+            logging.getLogger().error(f"The fragments of {url} could not be saved: {e}")
+            return None
+
+    def collect_documents(
+        self,
+        content: PageContent,
+        plan: ExtractionPlan | None,
+        url: str,
+        link_fragment_id: int | None,
+        runner: Runner,
+        crawler: Crawler,
+        metrics: RunnerMetrics,
+    ) -> int | None:
+        """
+        Turns the values of the template inspectors found in the page into documents and saves them.
+        :param content: The content extracted from the page with the inspectors of the plan
+        :param plan: The extraction plan of the crawler template, None if the crawler has no template
+        :param url: The URL of the page
+        :param link_fragment_id: The id of the saved fragment of the URL, None if it could not be saved
+        :param runner: Runner that is in progress.
+        :param crawler: Crawler that is in progress.
+        :param metrics: Statistics of the runner
+        :return: The number of the found documents, None if the page does not contain complete documents
+        """
+        # The values need the fragment of the URL, they would make the whole batch of the writer fail
+        if plan is None or link_fragment_id is None:
+            return None
+
+        def inspector_value(
+            inspector: InspectorPlan, text: str, attribute: str | None
+        ) -> InspectorValue:
+            return InspectorValue(
+                url=url,
+                link_fragment_id=link_fragment_id,
+                attribute=attribute or "",
+                value=inspector.clean_up(text),
+                inspector=inspector.inspector,
+                runner=runner,
+            )
 
-        for reg_expression in expressions.split('";"'):
-            k, v = reg_expression.split("=")
-            value = re.sub(k, v, value)
-        return value
+        if plan.record_selector != "":
+            # Every record is a document, a record missing one of the values is not complete
+            documents = [
+                [
+                    inspector_value(inspector, *value)
+                    for inspector, value in zip(plan.inspectors, record)
+                ]
+                for record in content.records
+                if len(record) > 0 and None not in record
+            ]
+            if len(documents) == 0:
+                return None
+        else:
+            documents_dict = {}
+            for inspector, elements in zip(plan.inspectors, content.values):
+                if len(elements) == 0:
+                    return None
+                if not crawler.allow_multi_elements:
+                    elements = elements[:1]
+                documents_dict[inspector] = [
+                    inspector_value(inspector, text, attribute)
+                    for text, attribute in elements
+                ]
+
+            lengths = [len(doc) for doc in documents_dict.values()]
+            if len(lengths) == 0 or not all(
+                list_size == lengths[0] for list_size in lengths
+            ):
+                return None
+            documents = [
+                [documents_dict[inspector][i] for inspector in documents_dict.keys()]
+                for i in range(lengths[0])
+            ]
+        # We start saving documents
+        for inspector_values in documents:
+            document_hash_code = evaluate_document_hash_code(inspector_values)
+            # The writer saves the document in the background, duplicates found in the database are counted at the end
+            if not self.document_writer.submit(
+                crawler.template, document_hash_code, inspector_values
+            ):
+                metrics.count("Duplicated content")
+                print(
+                    f"Found duplicated contents with hashcode: {document_hash_code}"
+                    f"Values are {inspector_values}"
+                )
+        return len(documents)
 
     @staticmethod
-    def save_url_fragments(url, runner):
-        parsed_url = urlparse(url)
-        fragments = [parsed_url.netloc] + parsed_url.path.split("/")
-
-        parent = None
-        for fragment in fragments:
-            if not fragment:
-                continue
-
-            try:
-                with transaction.atomic():
-                    link_fragment = LinkFragment.objects.get(
-                        fragment=fragment, parent=parent, runner=runner
-                    )
-            except Exception:
-                link_fragment = LinkFragment(
-                    fragment=fragment, parent=parent, runner=runner
-                )
-                link_fragment.save()
+    def create_seen_set(crawler: Crawler) -> FingerprintSet | BloomFilter:
+        """
+        The set of discovered links, a Bloom filter uses less memory but it may skip a few pages.
+        """
+        if crawler.use_bloom_filter:
+            return BloomFilter(capacity=crawler.max_pages)
+        return FingerprintSet()
 
-            parent = link_fragment
+    @staticmethod
+    def report_profile(profiler: CrawlProfiler | NullProfiler, logger: logging) -> None:
+        """
+        Close the trace of the runner and log where the time went.
+        """
+        summary = profiler.close()
+        for kind, totals in summary.items():
+            shares = ", ".join(
+                f"{phase} {value['share']:.1%}"
+                for phase, value in totals["phases"].items()
+            )
+            logger.info(
+                f"Profile of {totals['count']} {kind} spans ({totals['seconds']:.2f}s): {shares}"
+            )
+            for slow in totals["slowest"]:
+                logger.info(f"Slow {kind}: {slow['name']} took {slow['seconds']:.2f}s")
 
-        return link_fragment
+    @staticmethod
+    def save_statistics(statistics: Statistics, snapshot: dict) -> None:
+        """
+        Copies a snapshot of the runner metrics to its statistics and saves them.
+        The averages of a resumed runner are kept until the new pages have their own.
+        """
+        histograms = snapshot["histograms"]
+        statistics.visited_pages = snapshot["visited_pages"]
+        statistics.http_codes = snapshot["counters"]
+        statistics.link_samples = snapshot["samples"]
+        statistics.avg_loading_time = histograms.get("loading", {}).get(
+            "mean", statistics.avg_loading_time
+        )
+        statistics.avg_page_size = histograms.get("page_size", {}).get(
+            "mean", statistics.avg_page_size
+        )
+        statistics.average_processing_time = histograms.get("page", {}).get(
+            "mean", statistics.average_processing_time
+        )
+        statistics.average_docs_per_page = round(
+            histograms.get("documents", {}).get(
+                "mean", statistics.average_docs_per_page
+            )
+        )
+        statistics.metrics = histograms
+        statistics.save()
 
-    def create_logger(self) -> logging:
+    def create_logger(self, mode: str = "w") -> logging:
         """
         Creates a logger for the runner to log the history  of the crawler runner.
+        :param mode: "a" to keep the history of a resumed runner
         :return:
         """
         runner = Runner.objects.get(id=self.runner_id)
@@ -94,7 +262,7 @@ class CrawlerUtils:
         )
 
         handler = logging.handlers.RotatingFileHandler(
-            filename, mode="w", backupCount=5
+            filename, mode=mode, backupCount=5
         )
         handler.setLevel(logging.INFO)
         handler.setFormatter(formatter)
@@ -106,24 +274,134 @@ class CrawlerUtils:
         logger.addHandler(ch)
         return logger
 
+    def start_async(
+        self,
+        crawler: Crawler,
+        runner: Runner,
+        statistics: Statistics,
+        metrics: RunnerMetrics,
+        logger: logging,
+        scope_divs: list[str],
+        excluded_urls: set[str],
+        canonicalizer: UrlCanonicalizer,
+        scheduler: HostScheduler,
+        retry_policy: RetryPolicy,
+        profiler: CrawlProfiler | NullProfiler,
+    ) -> None:
+        """
+        Crawl the seed with the asyncio engine, pages are fetched concurrently by one event loop
+        and the documents are extracted in worker threads.
+        """
+
+        def link_filter(href: str) -> bool:
+            if href in excluded_urls:
+                metrics.sample(EXCLUDED_LINKS, href)
+                return False
+            if not robots_cache.can_fetch(ROBOTS_USER_AGENT, href):
+                metrics.sample(DISALLOWED_LINKS, href)
+                return False
+            return True
+
+        def page_handler(url: str, status_code: int, tree, level: int) -> int:
+            if crawler.template is None:
+                return 0
+            link_fragment_id = self.save_url_fragments(url)
+            # The engine finds the links itself, only the inspectors are evaluated
+            plan = extraction_plans.get(crawler.template)
+            with metrics.timer("extraction"):
+                content = extract_page(StaticElement(tree), [], plan)
+            documents_number = self.collect_documents(
+                content, plan, url, link_fragment_id, runner, crawler, metrics
+            )
+            if documents_number is not None:
+                metrics.observe("documents", documents_number)
+            return documents_number or 0
+
+        engine = AsyncCrawlEngine(
+            seed_url=crawler.seed_url,
+            max_pages=crawler.max_pages,
+            max_depth=crawler.max_depth,
+            max_collected_docs=crawler.max_collected_docs,
+            page_handler=page_handler,
+            scope_divs=scope_divs,
+            link_filter=link_filter,
+            depth_first=crawler.parsing_algorithm == CrawlingAlgorithms.DFS,
+            concurrency=crawler.concurrency,
+            host_concurrency=crawler.host_concurrency,
+            timeout=crawler.timeout,
+            user_agent=USER_AGENT,
+            canonicalize=canonicalizer.canonicalize,
+            seen=self.create_seen_set(crawler),
+            scheduler=scheduler,
+            retry_policy=retry_policy,
+            # The page handler uses the ORM, every handler thread has its own database connection
+            handler_exit=connection.close,
+        )
+        runner.status = RunnerStatus.RUNNING
+        runner.created_at = timezone.now()
+        runner.save()
+        # Stopping the runner reaches the engine as soon as it is published
+        control = RunnerControl(runner.id, on_stop=engine.stop, logger=logger)
+        control.start()
+
+        report = engine.run()
+        control.close()
+        self.document_writer.close()
+        self.report_profile(profiler, logger)
+        metrics.count("Duplicated content", self.document_writer.duplicates)
+
+        snapshot = metrics.snapshot()
+        snapshot["visited_pages"] = report["visited_pages"]
+        snapshot["counters"] = {**report["http_codes"], **snapshot["counters"]}
+        self.save_statistics(statistics, snapshot)
+        # A stopped or paused runner keeps its status, the async engine starts it over from the seed
+        runner.refresh_from_db()
+        runner.documents_count = self.document_writer.saved
+        if runner.status in (str(RunnerStatus.EXIT), str(RunnerStatus.PAUSED)):
+            runner.save()
+            logger.info(
+                f"Runner #{runner.id} is stopped. Visited {report['visited_pages']} pages"
+            )
+            return
+        runner.status = RunnerStatus.COMPLETED
+        runner.completed_at = timezone.now()
+        runner.save()
+        logger.info(
+            f"Runner #{runner.id} is completed. Visited {report['visited_pages']} pages"
+            f" in {report['elapsed']:.2f}s ({report['pages_per_second']:.2f} pages/sec)"
+        )
+
     def start(self):
         crawler = Crawler.objects.get(pk=self.crawler_id)
-        logger = self.create_logger()
-        links: dict[str, Link] = {}
-
-        # This dictionary contain all the queues shared between threads
-        shared_threads_pool: dict[int, CrawlerThread] = {}
+        # The frontier of a paused, stopped or crashed runner is kept on disk, so it can be resumed
+        journal = FrontierJournal(
+            f"{self.runner_id}.frontier", self.create_seen_set(crawler)
+        )
+        resuming = crawler.engine != CrawlerEngines.ASYNC and journal.exists
+        logger = self.create_logger(mode="a" if resuming else "w")
         start = time.time()
         # Define Browser Options
         threads_metrics = {}
 
         # TODO: Use a better splitter
         # Urls that may crawler navigate by mistake
-        excluded_urls = crawler.excluded_urls.split('";"')
-        robots_file_link = (
-            crawler.robot_file_url if crawler.robot_file_url != "" else crawler.seed_url
+        # Links are compared in their canonical form, so the same page is crawled only once
+        canonicalizer = UrlCanonicalizer(
+            [param for param in crawler.stripped_url_params.split('";"') if param],
+            sort_params=crawler.sort_url_params,
+            remove_trailing_slash=crawler.remove_trailing_slash,
         )
-        robots_txt_content = fetch_robots_txt(robots_file_link)
+        excluded_urls = {
+            canonicalizer.canonicalize(url)
+            for url in crawler.excluded_urls.split('";"')
+            if url != ""
+        }
+        if crawler.robot_file_url != "":
+            robots_cache.set_robots_url(crawler.seed_url, crawler.robot_file_url)
+        # The rules of the seed are fetched once here, later checks are served from the cache
+        crawl_delay = robots_cache.crawl_delay(ROBOTS_USER_AGENT, crawler.seed_url)
+        if crawl_delay is not None:
+            logger.info(f"ROBOTS.txt asks for {crawl_delay}s between the requests")
 
         scope_divs = []
         # We read the scopes from the user input if it is not empty otherwise we get all elements from the DOM body
@@ -136,367 +414,460 @@ class CrawlerUtils:
         max_visited_links = crawler.max_pages
         max_rec_level = crawler.max_depth
 
+        configuration = ConfigurationModel.get_solo()
+        driver_pool.configure(
+            configuration.driver_pool_size,
+            configuration.driver_max_pages,
+            configuration.driver_max_memory,
+        )
+        if crawler.template is not None:
+            # The template may have been edited by another process, so the plan of the runner is compiled again
+            extraction_plans.invalidate(crawler.template.id)
+            extraction_plans.get(crawler.template)
         runner = Runner.objects.get(id=self.runner_id)
         # Statistics variables
-        statistics = Statistics.objects.create(runner=runner)
+        statistics = None
+        if resuming:
+            statistics = Statistics.objects.filter(runner=runner).last()
+        if statistics is None:
+            statistics = Statistics.objects.create(runner=runner)
         visited_pages = 0
-        http_codes = {"Already visited": 0, "Duplicated content": 0, "Errors": 0}
-
-        def crawl_seed(seed: str) -> None:
-            """
-            This is the starting point where the crawling process start
-            :param seed: The root url to start crawling from
-            """
-            thread_id = threading.get_native_id()
-            driver = create_chrome_driver(crawler.show_browser)
-
-            # This will hold all the queues for all the links different levels
-            links_queues: dict[int, list] = {}
-            crawler_thread = CrawlerThread(
-                thread_id=thread_id, crawler=crawler, running=True, queues=links_queues
+        http_codes = {"Duplicated content": 0, "Errors": 0}
+        if resuming:
+            # The status codes became strings when they were saved as JSON
+            http_codes.update(
+                {
+                    int(key) if key.isdigit() else key: value
+                    for key, value in statistics.http_codes.items()
+                }
             )
+        # The threads only update the metrics in memory, they are saved to the statistics on an interval
+        metrics = RunnerMetrics(
+            http_codes,
+            statistics.visited_pages if resuming else 0,
+            statistics.link_samples if resuming else None,
+        )
 
-            if thread_id not in shared_threads_pool:
-                shared_threads_pool[thread_id] = crawler_thread
-
-            if seed == "":
-                return
-            # This is the base URL that the crawler should only crawl from
-            base_url = urlparse(seed).hostname
-            start_url = seed
-            current_active_queue = []
-
-            def find_links() -> None:
-                shared_threads_pool[thread_id].running = True
-                runner = Runner.objects.get(id=self.runner_id)
+        # The time of every page is traced only if the crawler asks for it
+        profiler = (
+            CrawlProfiler(f"{runner.id}.trace", mode="a" if resuming else "w")
+            if crawler.profile
+            else NullProfiler()
+        )
+        # Crawling threads hand the found documents to this writer instead of waiting for the database
+        # The count is exact again if the runner died before saving it
+        runner.documents_count = runner.count_documents()
+        runner.save(update_fields=["documents_count"])
+        self.document_writer = DocumentWriter(
+            runner,
+            configuration.document_batch_size,
+            configuration.document_flush_interval,
+            logger,
+            metrics,
+            profiler,
+        )
+        self.document_writer.start()
+        # Pages of the static engine are fetched through one pool of keep-alive connections
+        session = None
+        if crawler.engine == CrawlerEngines.STATIC:
+            session = create_http_session(crawler.threads)
+
+        # Requests to a host are spaced by the crawler sleep, or by the crawl delay of its ROBOTS.txt if it is longer
+        scheduler = HostScheduler(
+            max(crawler.sleep, configuration.min_sleep_time),
+            lambda url: robots_cache.crawl_delay(ROBOTS_USER_AGENT, url),
+        )
+        retry_policy = RetryPolicy(crawler.retry)
+
+        self.link_fragments = LinkFragmentCache(runner)
+        if resuming:
+            self.link_fragments.preload()
+
+        if crawler.engine == CrawlerEngines.ASYNC:
+            self.start_async(
+                crawler,
+                runner,
+                statistics,
+                metrics,
+                logger,
+                scope_divs,
+                excluded_urls,
+                canonicalizer,
+                scheduler,
+                retry_policy,
+                profiler,
+            )
+            return
 
-                if runner.status == str(RunnerStatus.EXIT):
-                    driver.quit()
-                    return
-                print(f"{thread_id}  - {start_url}")
+        if resuming:
+            journal.load()
+            logger.info(
+                f"Resuming runner #{runner.id} with {len(journal.pending)} links left"
+                f" out of {len(journal.seen)} found"
+            )
+        journal.open()
+        # All the threads pull their links from this frontier
+        frontier = Frontier(
+            depth_first=crawler.parsing_algorithm == CrawlingAlgorithms.DFS,
+            max_links=max_visited_links,
+            seen=journal.seen,
+            journal=journal,
+        )
+        # This is the base URL that the crawler should only crawl from
+        base_url = urlparse(crawler.seed_url).hostname
 
-                if len(current_active_queue) == 0:
+        def crawl_seed() -> None:
+            """
+            This is the starting point where the crawling process start,
+            the thread keeps crawling the links of the frontier until it is empty.
+            """
+            thread_id = threading.get_native_id()
+            # Chrome drivers are leased warm from the pool of the process
+            lease = None
+            if crawler.engine == CrawlerEngines.STATIC:
+                driver = StaticDriver(session, crawler.timeout)
+            else:
+                lease = driver_pool.lease(crawler.show_browser)
+            # The page timeout is kept by the browser, it is set again if the pool replaces the browser
+            timed_driver = None
+
+            def current_driver():
+                nonlocal timed_driver
+                if lease is None:
+                    return driver
+                if lease.driver is None:
+                    raise WebDriverException("The browser could not be restarted")
+                if lease.driver is not timed_driver:
+                    lease.driver.set_page_load_timeout(crawler.timeout)
+                    timed_driver = lease.driver
+                return lease.driver
+
+            def kill_driver() -> None:
+                # The hanging call fails once its browser is gone
+                if lease.driver is not None:
+                    driver_pool.quit_driver(lease.driver)
+
+            @contextmanager
+            def watched() -> Iterator[None]:
+                """
+                Kills the browser if the block hangs, the pool starts another one for the next call.
+                Requests of the static driver have their own timeout.
+                """
+                if lease is None:
+                    yield
                     return
-
-                # TODO: This should be configurable
-                link: Link = current_active_queue.pop()
-                link_fragment = self.save_url_fragments(link.url, runner)
-                if runner.collected_documents >= max_collected_docs:
-                    statistics.http_codes[
-                        f"Stopped because reached {max_collected_docs} docs"
-                    ] = max_collected_docs
+                with watchdog.watch(
+                    crawler.timeout + WATCHDOG_GRACE, kill_driver
+                ) as watch:
+                    try:
+                        yield
+                    finally:
+                        if watch.expired:
+                            logger.warning(f"Thread: {thread_id} - the browser hung")
+                            driver_pool.recycle(lease)
+
+            def fetch(url: str, span: Span | NullSpan) -> PageResponse | None:
+                """
+                Load the page once its host allows it, transient failures are tried again after a backoff.
+                """
+                for attempt in range(retry_policy.attempts):
+                    with span.phase("politeness"):
+                        allowed = scheduler.wait(url, control.stop_event)
+                    if not allowed:
+                        raise InterruptedError("The runner is stopped")
+                    error = None
+                    response = None
+                    try:
+                        with metrics.timer("fetch"), span.phase("fetch"), watched():
+                            response = load_page(current_driver(), url)
+                    except Exception as e:
+                        error = e
+                    transient = error is not None or (
+                        response is not None
+                        and retry_policy.is_transient(response.status_code)
+                    )
+                    scheduler.feedback(url, not transient)
+                    if not transient or attempt == retry_policy.retries:
+                        break
+                    metrics.count("Retries")
+                    logger.warning(
+                        f"Thread: {thread_id} - {url} failed, it is tried again: "
+                        f"{error if error is not None else response.status_code}"
+                    )
+                    with span.phase("politeness"):
+                        stopped = control.stop_event.wait(retry_policy.delay(attempt))
+                    if stopped:
+                        raise InterruptedError("The runner is stopped")
+                if error is not None:
+                    raise error
+                return response
+
+            def find_links(link: Link, span: Span | NullSpan) -> None:
+                with span.phase("fragments"):
+                    link_fragment_id = self.save_url_fragments(link.url)
+                if self.document_writer.documents >= max_collected_docs:
+                    metrics.mark(
+                        f"Stopped because reached {max_collected_docs} docs",
+                        max_collected_docs,
+                    )
+                    frontier.close()
                     return
-                logger.info(
-                    f"Thread: {thread_id} - {link.url} out of {len(current_active_queue)}"
-                )
+                logger.info(f"Thread: {thread_id} - {link.url} out of {len(frontier)}")
                 # Run the Webdriver, save page an quit browser
-                # TODO: I should use `retry` here
-                if links[link.url].visited:
-                    http_codes["Already visited"] = http_codes["Already visited"] + 1
-                    logger.info(f"Thread: {thread_id} - {link.url} already visited.")
-                    return
                 start_time = time.time()
                 try:
-                    driver.get(link.url)
+                    response = fetch(link.url, span)
+                except InterruptedError:
+                    return
                 except Exception as e:
-                    http_codes["Errors"] = http_codes["Errors"] + 1
+                    metrics.count("Errors")
                     logger.error(f"The link {link.url} thrown an error: {e}")
                     return
                 # wait = WebDriverWait(driver, 10)
                 # wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "body")))
 
-                statistics.visited_pages = statistics.visited_pages + 1
-                # Calculate the download time
-                end_time = time.time()
-                download_time = end_time - start_time
-                statistics.avg_loading_time = (
-                    download_time
-                    if statistics.avg_loading_time == 0
-                    else (download_time + statistics.avg_loading_time) / 2
-                )
-                print(statistics.avg_loading_time)
-                # Get the page source
-                try:
-                    page_source = driver.page_source
-                    page_size = len(page_source.encode("utf-8")) / 1048576
-                    statistics.avg_page_size = (
-                        page_size
-                        if statistics.avg_page_size == 0
-                        else (page_size + statistics.avg_page_size) / 2
+                metrics.page_visited()
+                if response is None:
+                    metrics.count("No response")
+                    logger.error(f"The link {link.url} did not report a response.")
+                else:
+                    # Calculate the download time, the network timing is used when the browser reports it
+                    download_time = (
+                        response.load_time
+                        if response.load_time is not None
+                        else time.time() - start_time
                     )
-                except (UnexpectedAlertPresentException) as e:
-                    http_codes["Errors"] = http_codes["Errors"] + 1
-                    logger.error(f"The link {link.url} thrown an error: {e}")
-
-                # Get the current URL from Selenium
-                # Send a separate HTTP request using requests library to retrieve the status code\
-                try:
-                    current_url = driver.current_url
-                    response = requests.get(current_url)
-                    status_code = response.status_code
-                    print(status_code)
-                    if status_code in http_codes:
-                        http_codes[status_code] = http_codes[status_code] + 1
-                    else:
-                        http_codes[status_code] = 1
-                    statistics.http_codes = http_codes
-                except (
-                    WebDriverException,
-                    requests.exceptions.ConnectionError,
-                    requests.exceptions.TooManyRedirects,
-                ) as e:
-                    http_codes["Errors"] = http_codes["Errors"] + 1
-                    logger.error(f"The link {link.url} thrown an error: {e}")
-                    return
-
-                links[link.url].visited = True
-                # We execute all the 'before actions' before we start crawling
-                execute_all_before_actions(crawler.template, driver)
-                # This should be configured
-                scoped_elements = []
+                    metrics.observe("loading", download_time)
+                    metrics.observe("page_size", response.size / 1048576)
+                    metrics.count(response.status_code)
+
+                link.visited = True
+                # The template is compiled once, edits reach the next page
+                plan = (
+                    extraction_plans.get(crawler.template)
+                    if crawler.template is not None
+                    else None
+                )
+                # We execute all the 'before actions' before we start crawling, actions need a real browser
+                if crawler.engine == CrawlerEngines.SELENIUM and plan is not None:
+                    with metrics.timer("actions"), span.phase("actions"):
+                        execute_all_before_actions(plan.actions, current_driver())
                 try:
-                    for scope_div in scope_divs:
-                        try:
-                            scoped_elements += driver.find_elements(By.XPATH, scope_div)
-                        except Exception:
-                            print(
-                                f"Thread id: {crawler_thread.thread_id} had an error, scope not found."
-                            )
-                            pass
                     # We stop recursion when we reach tha mx level of digging into pages
                     # We add one layer of depth
                     current_rec_level = link.level + 1
-                    if current_rec_level <= max_rec_level:
-                        for scoped_element in scoped_elements:
-                            # We add one level
-                            all_links_in_the_page = scoped_element.find_elements(
-                                By.CSS_SELECTOR, "a"
-                            )
-                            for a in all_links_in_the_page:
-                                if a.get_attribute("href") is None:
-                                    continue
-                                # We skip the fragments as they do not add any product, that why we split by #
-                                href = a.get_attribute("href").split("#").pop()
-                                # Check if the link is allowed to be crawled
-                                if not check_crawl_permission(
-                                    robots_txt_content, "deepcrawl", href
-                                ):
-                                    statistics.http_codes[f"Disallow link: {href}"] = 1
+                    # The links are only read if we can still dig deeper
+                    scopes = scope_divs if current_rec_level <= max_rec_level else []
+                    # Links and values are read with one call, not one call per element
+                    with span.phase("extraction"):
+                        with metrics.timer("extraction"), watched():
+                            content = extract_page(current_driver(), scopes, plan)
+                    for error in content.errors:
+                        logger.warning(f"Thread: {thread_id} - {link.url}: {error}")
+                    with span.phase("links"):
+                        if current_rec_level <= max_rec_level:
+                            for href in content.links:
+                                # The fragments are removed as they do not add any product
+                                href = canonicalizer.canonicalize(href)
+                                # Links from outside the main host are skipped
+                                if base_url != urlparse(href).hostname:
+                                    metrics.sample(CROSS_SITE_LINKS, href)
                                     continue
                                 # Skip unwanted links
                                 if href in excluded_urls:
-                                    statistics.http_codes[f"Excluded link: {href}"] = 1
+                                    metrics.sample(EXCLUDED_LINKS, href)
                                     continue
-                                # Links from outside the main host are skipped
-                                if base_url != urlparse(href).hostname:
-                                    statistics.http_codes[
-                                        f"Cross site link: {href}"
-                                    ] = 1
+                                # Check if the link is allowed to be crawled, the robots.txt
+                                # is only downloaded for the links which are kept otherwise
+                                if not robots_cache.can_fetch(ROBOTS_USER_AGENT, href):
+                                    metrics.sample(DISALLOWED_LINKS, href)
                                     continue
 
-                                if not len(links) < max_visited_links:
-                                    statistics.http_codes[
-                                        "Max visited links reached"
-                                    ] = max_rec_level
-                                if (
-                                    link.url != href
-                                    and href not in links
-                                    and len(links) < max_visited_links
-                                ):
-                                    found_link = Link(
-                                        url=href, visited=False, level=current_rec_level
+                                if frontier.full:
+                                    metrics.mark(
+                                        "Max visited links reached", max_rec_level
+                                    )
+                                if link.url != href:
+                                    # The frontier skips links which are already discovered
+                                    frontier.add(
+                                        Link(
+                                            url=href,
+                                            visited=False,
+                                            level=current_rec_level,
+                                        )
                                     )
-                                    links[href] = found_link
-                                    add_link_to_level(links_queues, found_link)
-                    else:
-                        statistics.http_codes[
-                            f"Reached max recursion level reached {max_rec_level}"
-                        ] = max_rec_level
+                        else:
+                            metrics.mark(
+                                f"Reached max recursion level reached {max_rec_level}",
+                                max_rec_level,
+                            )
 
                     # We start looking up for the elements we would like to collect inside the page/document
-                    inspectors_list = Inspector.objects.filter(
-                        template=crawler.template, deleted=False
-                    )
-                    documents_dict = {}
-                    for inspector in inspectors_list:
-                        inspector_elements = driver.find_elements(
-                            By.XPATH, inspector.selector
+                    with span.phase("documents"):
+                        documents_number = self.collect_documents(
+                            content,
+                            plan,
+                            link.url,
+                            link_fragment_id,
+                            runner,
+                            crawler,
+                            metrics,
                         )
-                        if len(inspector_elements) == 0:
-                            return
-                        documents_dict[inspector] = []
-                        if not crawler.allow_multi_elements:
-                            inspector_elements = [inspector_elements[0]]
-                        for inspector_element in inspector_elements:
-                            attribute = ""
-                            if inspector.attribute != "":
-                                attribute = inspector_element.get_attribute(
-                                    inspector.attribute
-                                )
-                                if attribute is None:
-                                    attribute = ""
-                            if thread_id not in threads_metrics:
-                                threads_metrics[thread_id] = 1
-                            else:
-                                threads_metrics[thread_id] = (
-                                    threads_metrics[thread_id] + 1
-                                )
-                            threads_metrics[thread_id] += 1
-                            documents_dict[inspector].append(
-                                InspectorValue(
-                                    url=link.url,
-                                    link_fragment=link_fragment,
-                                    attribute=attribute,
-                                    value=self.clean_up_value(
-                                        inspector_element.text,
-                                        inspector.clean_up_expression,
-                                    ),
-                                    inspector=inspector,
-                                    runner=runner,
-                                )
-                            )
-
-                    lengths = [len(doc) for doc in documents_dict.values()]
-                    if not all(list_size == lengths[0] for list_size in lengths):
+                    if documents_number is None:
                         logger.info(
-                            f"Thread: {thread_id} - The URL: {link.url} has different inspectors lists {lengths}."
+                            f"Thread: {thread_id} - The URL: {link.url} has no complete documents."
                         )
                         return
-                    documents_number = lengths[0]
-                    # We start saving documents
-                    for i in range(documents_number):
-                        inspector_values = [
-                            documents_dict[inspector][i]
-                            for inspector in documents_dict.keys()
-                        ]
-                        document_hash_code = evaluate_document_hash_code(
-                            inspector_values
-                        )
-                        if not Document.objects.filter(
-                            hash_code=document_hash_code
-                        ).exists():
-                            Document.objects.create(
-                                template=crawler.template, hash_code=document_hash_code
-                            )
-                            doc = Document.objects.last()
-                            for inspector_value in inspector_values:
-                                InspectorValue.objects.update_or_create(
-                                    url=inspector_value.url,
-                                    link_fragment=inspector_value.link_fragment,
-                                    attribute=inspector_value.attribute,
-                                    value=inspector_value.value,
-                                    document=doc,
-                                    inspector=inspector_value.inspector,
-                                    runner=inspector_value.runner,
-                                )
-                        else:
-                            http_codes["Duplicated content"] = (
-                                http_codes["Duplicated content"] + 1
-                            )
-                            print(
-                                f"Found duplicated contents with hashcode: {document_hash_code}"
-                                f"Values are {inspector_values}"
-                            )
-                    statistics.average_docs_per_page = (
-                        documents_number
-                        if statistics.average_docs_per_page == 0
-                        else (documents_number + statistics.average_docs_per_page) / 2
-                    )
-                    end_time = time.time()
-                    average_processing_time = end_time - start_time
-                    statistics.average_processing_time = (
-                        average_processing_time
-                        if statistics.average_processing_time == 0
-                        else (
-                            average_processing_time + statistics.average_processing_time
-                        )
-                        / 2
+                    threads_metrics[thread_id] = (
+                        threads_metrics.get(thread_id, 0) + documents_number
                     )
-                    print(statistics.avg_loading_time)
-                    statistics.save()
+                    metrics.observe("documents", documents_number)
+                    metrics.observe("page", time.time() - start_time)
                 except Exception as e:
-                    http_codes["Errors"] = http_codes["Errors"] + 1
+                    metrics.count("Errors")
                     print(f"{thread_id} encountered an error:")
                     print(e)
                 return
 
-            runner = Runner.objects.get(id=self.runner_id)
-            runner.status = RunnerStatus.RUNNING
-            runner.created_at = timezone.now()
-            runner.save()
-
-            add_link_to_level(links_queues, Link(start_url))
-            level = find_the_links_current_level(links_queues, crawler)
-            current_active_queue = links_queues[level]
-            #  We only stop the thread if one queue is done AND all other threads are also completed
-            while len(current_active_queue) != 0 or not all_threads_completed(
-                shared_threads_pool
-            ):
-                runner = Runner.objects.get(id=self.runner_id)
-                if runner.status == str(RunnerStatus.EXIT):
-                    break
-
-                if len(current_active_queue) != 0:
-                    find_links()
+            #  The frontier returns None once it is empty AND all other threads are also idle
+            try:
+                while True:
+                    if control.stopped:
+                        break
+                    link = frontier.get()
+                    if link is None:
+                        break
+                    try:
+                        with profiler.page(link.url) as span:
+                            find_links(link, span)
+                        if lease is not None:
+                            driver_pool.page_loaded(lease)
+                    finally:
+                        # Pages interrupted by a pause are crawled again when the runner is resumed
+                        frontier.task_done(link, crawled=not control.stopped)
+                    if lease is not None and lease.driver is None:
+                        # The other threads keep crawling the frontier
+                        logger.error(
+                            f"Thread: {thread_id} - the browser could not be restarted"
+                        )
+                        break
+            finally:
+                if lease is not None:
+                    driver_pool.release(lease)
                 else:
-                    level = find_the_links_current_level(links_queues, crawler)
-                    if level != -1:
-                        current_active_queue = links_queues[level]
-                    else:
-                        shared_threads_pool[thread_id].running = False
-                        time.sleep(5)
-                        # If all threads are done we break the loop
-                        new_queues = split_work_between_threads(shared_threads_pool)
-                        if new_queues is not None:
-                            shared_threads_pool[thread_id].running = True
-                            shared_threads_pool[thread_id].queues = new_queues
-                            current_active_queue = next(iter(new_queues.values()))
-
-            driver.quit()
-            shared_threads_pool[thread_id].running = False
+                    driver.quit()
             print(
-                f"Thread: {thread_id} completed!."
-                f" Queue: {shared_threads_pool[thread_id]}. Docs: {threads_metrics[thread_id]}"
+                f"Thread: {thread_id} completed!. Docs: {threads_metrics.get(thread_id, 0)}"
             )
 
-        links[crawler.seed_url] = Link(url=crawler.seed_url, visited=False)
+        runner.status = RunnerStatus.RUNNING
+        runner.created_at = timezone.now()
+        runner.save()
+        # The threads are stopped by the control channel, so the status is not read for every page
+        control = RunnerControl(runner.id, on_stop=frontier.close, logger=logger)
+        control.start()
+
+        if resuming:
+            # Links processed before the runner stopped are not crawled again
+            frontier.restore(journal.pending)
+        elif crawler.seed_url != "":
+            frontier.add(
+                Link(url=canonicalizer.canonicalize(crawler.seed_url), visited=False)
+            )
         threads_number = crawler.threads
+
+        def flush_statistics(snapshot: dict) -> None:
+            try:
+                self.save_statistics(statistics, snapshot)
+            except Exception as e:
+                logger.error(f"Could not save the statistics: {e}")
+
+        started_pages = metrics.visited_pages
+        started_at = time.monotonic()
+
+        def collect_runner() -> None:
+            # Only the memory of the runner is read, the scrapes never wait for the database
+            visited = metrics.visited_pages
+            elapsed = time.monotonic() - started_at
+            PAGES.set(visited, runner=runner.id)
+            PAGES_PER_SECOND.set(
+                (visited - started_pages) / elapsed if elapsed > 0 else 0,
+                runner=runner.id,
+            )
+            for level, size in frontier.level_sizes().items():
+                FRONTIER_LINKS.set(size, runner=runner.id, level=level)
+            ACTIVE_WORKERS.set(frontier.active_workers, runner=runner.id)
+            WRITE_QUEUE.set(self.document_writer.pending, runner=runner.id)
+
+        metrics_registry.add_collector(collect_runner)
+        metrics.start(
+            flush_statistics,
+            configuration.statistics_flush_interval,
+            # The statistics are saved from their own thread, so it has its own database connection
+            connection.close,
+        )
+        # Browsers hanging longer than the page timeout are killed
+        watchdog = Watchdog(logger=logger)
         with ThreadPoolExecutor(max_workers=threads_number) as executor:
             futures: list[Future] = []
             for i in range(threads_number):
-                seed_url = crawler.seed_url
-                futures.append(executor.submit(crawl_seed, seed_url))
+                futures.append(executor.submit(crawl_seed))
             wait(futures)
+        for future in futures:
+            if future.exception() is not None:
+                metrics.count("Errors")
+                logger.error(f"A crawling thread failed: {future.exception()}")
+        watchdog.close()
+        control.close()
+        self.document_writer.close()
+        metrics.count("Duplicated content", self.document_writer.duplicates)
+        self.report_profile(profiler, logger)
+        metrics_registry.remove_collector(collect_runner)
+        for metric in RUNNER_METRICS:
+            metric.remove_matching(runner=runner.id)
+        # The last snapshot is saved before the thread exits
+        metrics.close()
+        for phase in ("fetch", "actions", "extraction", "save"):
+            logger.info(f"{phase.capitalize()} time: {metrics.summary(phase)}")
+        logger.info(f"Threads were idle for {frontier.idle_time:.2f}s in total")
+        logger.info(f"Driver pool: {driver_pool.stats()}")
+        logger.info(
+            f"Waited {scheduler.wait_time:.2f}s for the hosts {scheduler.waits} times,"
+            f" {watchdog.expired} browsers hung"
+        )
 
-        print(f"Docs: {runner.collected_documents}")
-        statistics.save()
-        print(f"Visited Links: {visited_pages}")
+        if session is not None:
+            session.close()
+        print(f"Docs: {self.document_writer.saved}")
 
-        visited = []
-        visitied_not_saved = []
-        not_visited = []
-        for key, link in links.items():
-            if link.visited:
-                visited.append(key)
-            else:
-                not_visited.append(key)
-            if not InspectorValue.objects.filter(url=link.url).exists():
-                print(link.url)
-                visitied_not_saved.append(key)
+        runner.refresh_from_db()
+        if runner.status in (str(RunnerStatus.EXIT), str(RunnerStatus.PAUSED)):
+            frontier.checkpoint()
+            journal.close()
+            logger.info(
+                f"Runner #{runner.id} is stopped with {len(frontier)} links left, it can be resumed"
+            )
+            if runner.status == str(RunnerStatus.PAUSED):
+                return
+        else:
+            journal.delete()
+        print(f"Visited Links: {visited_pages}")
 
+        # Only the fingerprints of the links are kept, so the report has the numbers and not the links
         print("--------------------- All found links -----------------------")
-        print(len(visited) + len(not_visited))
+        print(len(frontier.seen))
         print("--------------------- visited -----------------------")
-        print(len(visited))
+        print(metrics.visited_pages)
 
         print("--------------------- not_visited -----------------------")
-        print(len(not_visited))
-
-        print("--------------------- visitied_not_saved -----------------------")
-        print(len(visitied_not_saved))
+        print(len(frontier.seen) - metrics.visited_pages)
         end = time.time()
         print(end - start)
         print(threads_metrics)
+        if runner.status == str(RunnerStatus.EXIT):
+            # A stopped runner keeps its status, so it can be resumed from its journal
+            logger.info(f"Runner #{runner.id} is stopped. Time consumed {end - start}")
+            return
         runner.status = RunnerStatus.COMPLETED
         runner.completed_at = timezone.now()
         runner.save()
@@ -0,0 +1,870 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import lxml.html
+from lxml import etree
+from selenium.common import WebDriverException
+
+from backend.webscraper.base.crawling.async_crawler import AsyncCrawlEngine
+from backend.webscraper.base.crawling.driver_pool import DriverPool
+from backend.webscraper.base.crawling.frontier import Frontier
+from backend.webscraper.base.crawling.journal import FrontierJournal
+from backend.webscraper.base.crawling.metrics import (
+    Histogram,
+    ReservoirSample,
+    RunnerMetrics,
+)
+from backend.webscraper.base.crawling.network_events import parse_performance_log
+from backend.webscraper.base.crawling.page_extraction import extract_page
+from backend.webscraper.base.crawling.politeness import (
+    HostScheduler,
+    RetryPolicy,
+    TokenBucket,
+)
+from backend.webscraper.base.crawling.profiler import CrawlProfiler, NullProfiler
+from backend.webscraper.base.crawling.robots import RobotsCache
+from backend.webscraper.base.crawling.seen_set import BloomFilter, FingerprintSet
+from backend.webscraper.base.crawling.static_driver import StaticElement
+from backend.webscraper.base.crawling.urls import UrlCanonicalizer
+from backend.webscraper.base.crawling.watchdog import Watchdog
+from backend.webscraper.base.dataclasses import Link
+from backend.webscraper.base.prometheus import MetricsRegistry
+
+# Number of pages of the synthetic site
+PAGES = 200
+
+
+class SyntheticSiteHandler(BaseHTTPRequestHandler):
+    """
+    Serves a binary tree of pages, page n links to the pages 2n and 2n + 1.
+    """
+
+    def do_GET(self) -> None:
+        page = int(self.path.strip("/").split("/")[-1] or 1)
+        if page > PAGES:
+            self.send_response(404)
+            self.end_headers()
+            return
+        links = "".join(
+            f'<a href="/page/{child}#top">{child}</a>'
+            for child in (2 * page, 2 * page + 1)
+            if child <= PAGES
+        )
+        body = (
+            f"<html><body><h1>Page {page}</h1><div id='links'>{links}</div>"
+            f"<a href='https://example.com/'>external</a></body></html>"
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class AsyncCrawlEngineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SyntheticSiteHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.seed_url = f"http://127.0.0.1:{cls.server.server_port}/page/1"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_crawl_all_pages(self) -> None:
+        engine = AsyncCrawlEngine(self.seed_url, 1000, 20, 1000, concurrency=50)
+        report = engine.run()
+        self.assertEqual(report["visited_pages"], PAGES)
+        self.assertEqual(report["http_codes"], {"Errors": 0, 200: PAGES})
+        print(f"Async engine: {report['pages_per_second']:.0f} pages/sec")
+
+    def test_max_depth(self) -> None:
+        engine = AsyncCrawlEngine(self.seed_url, 1000, 2, 1000)
+        report = engine.run()
+        # Levels 0, 1 and 2 of the tree
+        self.assertEqual(report["visited_pages"], 7)
+
+    def test_max_pages(self) -> None:
+        engine = AsyncCrawlEngine(self.seed_url, 10, 20, 1000)
+        report = engine.run()
+        self.assertEqual(report["visited_pages"], 10)
+
+    def test_max_collected_docs(self) -> None:
+        engine = AsyncCrawlEngine(
+            self.seed_url,
+            1000,
+            20,
+            5,
+            page_handler=lambda url, status_code, tree, level: 1,
+            concurrency=1,
+        )
+        report = engine.run()
+        self.assertEqual(report["collected_documents"], 5)
+        self.assertEqual(report["visited_pages"], 5)
+
+    def test_handler_threads(self) -> None:
+        handled = set()
+        exited = []
+        engine = AsyncCrawlEngine(
+            self.seed_url,
+            50,
+            20,
+            1000,
+            page_handler=lambda url, status_code, tree, level: handled.add(
+                threading.current_thread()
+            ),
+            handler_threads=3,
+            handler_exit=lambda: exited.append(threading.current_thread()),
+        )
+        engine.run()
+        # The handler exit runs once in every thread, including the ones which handled pages
+        self.assertEqual(len(exited), 3)
+        self.assertEqual(len(set(exited)), 3)
+        self.assertLessEqual(handled, set(exited))
+        self.assertFalse(any(thread.is_alive() for thread in exited))
+
+    def test_link_filter(self) -> None:
+        engine = AsyncCrawlEngine(
+            self.seed_url,
+            1000,
+            20,
+            1000,
+            link_filter=lambda href: not href.endswith("/page/2"),
+        )
+        report = engine.run()
+        # The whole left subtree is not reachable anymore
+        self.assertLess(report["visited_pages"], PAGES // 2 + 10)
+
+
+class FrontierTest(unittest.TestCase):
+    def test_add(self) -> None:
+        frontier = Frontier(depth_first=False, max_links=2)
+        self.assertTrue(frontier.add(Link("a")))
+        self.assertFalse(frontier.add(Link("a")))
+        self.assertTrue(frontier.add(Link("b")))
+        self.assertFalse(frontier.add(Link("c")))
+        self.assertTrue(frontier.full)
+        self.assertEqual(len(frontier), 2)
+
+    def test_levels_order(self) -> None:
+        for depth_first, expected in (
+            (True, ["c", "b", "a"]),
+            (False, ["a", "b", "c"]),
+        ):
+            frontier = Frontier(depth_first=depth_first, max_links=10)
+            for level, url in enumerate(["a", "b", "c"]):
+                frontier.add(Link(url, level=level))
+            urls = []
+            while (link := frontier.get()) is not None:
+                urls.append(link.url)
+                frontier.task_done(link)
+            self.assertEqual(urls, expected)
+
+    def test_waiting_thread_wakes_up(self) -> None:
+        frontier = Frontier(depth_first=False, max_links=10)
+        frontier.add(Link("a"))
+        link = frontier.get()
+        result = []
+        waiting = threading.Thread(target=lambda: result.append(frontier.get()))
+        waiting.start()
+        # The second thread waits because the first one can still find new links
+        frontier.add(Link("b", level=link.level + 1))
+        frontier.task_done(link)
+        waiting.join(timeout=1)
+        self.assertEqual(result[0].url, "b")
+        frontier.task_done(result[0])
+        # Nothing left and no thread is busy, the crawl is completed
+        self.assertIsNone(frontier.get())
+
+
+class FrontierJournalTest(unittest.TestCase):
+    def crawl(self, path: str, pages: int) -> list[str]:
+        """
+        Crawls `pages` pages of a binary tree of 100 pages, then the process "dies" without any cleanup.
+        """
+        journal = FrontierJournal(path, FingerprintSet())
+        resuming = journal.exists
+        if resuming:
+            journal.load()
+        journal.open()
+        frontier = Frontier(False, 1000, seen=journal.seen, journal=journal)
+        if resuming:
+            frontier.restore(journal.pending)
+        else:
+            frontier.add(Link("1"))
+        crawled = []
+        while len(crawled) < pages and (link := frontier.get()) is not None:
+            crawled.append(link.url)
+            for child in (2 * int(link.url), 2 * int(link.url) + 1):
+                if child <= 100:
+                    frontier.add(Link(str(child), level=link.level + 1))
+            frontier.task_done(link)
+        journal.close()
+        return crawled
+
+    def test_resume_after_crash(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/1.frontier"
+            crawled = self.crawl(path, 30)
+            crawled += self.crawl(path, 1000)
+            self.assertEqual(sorted(crawled), sorted(str(i) for i in range(1, 101)))
+
+    def test_resume_from_checkpoint(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/1.frontier"
+            FrontierJournal.CHECKPOINT_RECORDS = 16
+            try:
+                crawled = self.crawl(path, 30)
+                crawled += self.crawl(path, 20)
+                crawled += self.crawl(path, 1000)
+            finally:
+                FrontierJournal.CHECKPOINT_RECORDS = 10_000
+            self.assertEqual(sorted(crawled), sorted(str(i) for i in range(1, 101)))
+
+    def test_resume_before_checkpoint_is_written(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/1.frontier"
+            journal = FrontierJournal(path, FingerprintSet())
+            journal.open()
+            frontier = Frontier(False, 1000, seen=journal.seen, journal=journal)
+            frontier.add(Link("1"))
+            with frontier.condition:
+                # The process dies before the checkpoint of this state is written
+                journal.snapshot()
+            frontier.add(Link("2"))
+            journal.close()
+            journal = FrontierJournal(path, FingerprintSet())
+            journal.load()
+            self.assertEqual(journal.pending, {"1": 0, "2": 0})
+            journal.open()
+            self.assertFalse(os.path.exists(journal.previous_path))
+            journal.close()
+            journal = FrontierJournal(path, FingerprintSet())
+            journal.load()
+            self.assertEqual(journal.pending, {"1": 0, "2": 0})
+
+    def test_interrupted_link_is_kept(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            journal = FrontierJournal(f"{directory}/1.frontier", FingerprintSet())
+            journal.open()
+            frontier = Frontier(False, 1000, seen=journal.seen, journal=journal)
+            frontier.add(Link("1"))
+            frontier.task_done(frontier.get(), crawled=False)
+            journal.close()
+            journal = FrontierJournal(f"{directory}/1.frontier", FingerprintSet())
+            journal.load()
+            self.assertEqual(journal.pending, {"1": 0})
+
+
+class FakeDriver:
+    def __init__(self, show_browser: bool):
+        self.show_browser = show_browser
+        self.cookies_deleted = 0
+        self.closed = False
+
+    def execute_script(self, script: str):
+        return 1
+
+    def execute_cdp_cmd(self, cmd: str, params: dict) -> dict:
+        return {}
+
+    def delete_all_cookies(self) -> None:
+        self.cookies_deleted += 1
+
+    def get(self, url: str) -> None:
+        pass
+
+    def quit(self) -> None:
+        self.closed = True
+
+
+class DriverPoolTest(unittest.TestCase):
+    def test_reuse_driver(self) -> None:
+        pool = DriverPool(FakeDriver, size=2, max_pages=0, max_memory=0)
+        lease = pool.lease(False)
+        driver = lease.driver
+        pool.release(lease)
+        self.assertEqual(driver.cookies_deleted, 1)
+        self.assertIs(pool.lease(False).driver, driver)
+        self.assertEqual(pool.stats()["created"], 1)
+        self.assertEqual(pool.stats()["leases"], 2)
+
+    def test_recycle_after_max_pages(self) -> None:
+        pool = DriverPool(FakeDriver, size=1, max_pages=2, max_memory=0)
+        lease = pool.lease(False)
+        driver = lease.driver
+        pool.page_loaded(lease)
+        self.assertIs(lease.driver, driver)
+        pool.page_loaded(lease)
+        self.assertTrue(driver.closed)
+        self.assertIsNot(lease.driver, driver)
+        self.assertEqual(pool.stats()["recycles"], 1)
+
+    def test_size_limits_idle_drivers(self) -> None:
+        pool = DriverPool(FakeDriver, size=1, max_pages=0, max_memory=0)
+        # More threads than the size of the pool get a driver without waiting
+        first = pool.lease(True)
+        second = pool.lease(True)
+        self.assertEqual(pool.stats()["alive"], 2)
+        pool.release(first)
+        pool.release(second)
+        self.assertFalse(first.driver.closed)
+        self.assertTrue(second.driver.closed)
+        self.assertEqual(pool.stats()["alive"], 1)
+        self.assertEqual(pool.stats()["peak"], 2)
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_quit_outside_lock(self) -> None:
+        locked = []
+
+        class SlowDriver(FakeDriver):
+            def quit(self) -> None:
+                locked.append(pool.lock.locked())
+                super().quit()
+
+        pool = DriverPool(SlowDriver, size=2, max_pages=0, max_memory=0)
+        leases = [pool.lease(False) for _ in range(3)]
+        for lease in leases:
+            pool.release(lease)
+        pool.configure(1, 0, 0)
+        pool.close()
+        self.assertEqual(locked, [False, False, False])
+        self.assertEqual(pool.stats()["alive"], 0)
+
+    def test_recycle_failure(self) -> None:
+        pool = DriverPool(FakeDriver, size=1, max_pages=1, max_memory=0)
+        lease = pool.lease(False)
+        driver = lease.driver
+
+        def fail(show_browser: bool) -> FakeDriver:
+            raise WebDriverException("Chrome failed to start")
+
+        pool.factory = fail
+        pool.page_loaded(lease)
+        self.assertTrue(driver.closed)
+        self.assertIsNone(lease.driver)
+        pool.release(lease)
+        self.assertEqual(pool.stats()["alive"], 0)
+        self.assertEqual(pool.stats()["idle"], 0)
+        self.assertEqual(pool.stats()["start_failures"], 1)
+
+
+def performance_entry(method: str, params: dict) -> dict:
+    return {"message": json.dumps({"message": {"method": method, "params": params}})}
+
+
+class NetworkEventsTest(unittest.TestCase):
+    def test_parse_performance_log(self) -> None:
+        entries = [
+            performance_entry(
+                "Network.requestWillBeSent",
+                {"requestId": "1", "type": "Document", "timestamp": 10.0},
+            ),
+            # Redirected to the final URL
+            performance_entry(
+                "Network.requestWillBeSent",
+                {"requestId": "1", "type": "Document", "timestamp": 10.2},
+            ),
+            performance_entry(
+                "Network.responseReceived",
+                {
+                    "requestId": "1",
+                    "type": "Document",
+                    "response": {"url": "https://a.com/b", "status": 404},
+                },
+            ),
+            performance_entry(
+                "Network.responseReceived",
+                {"requestId": "2", "type": "Script", "response": {"status": 200}},
+            ),
+            performance_entry(
+                "Network.loadingFinished",
+                {"requestId": "1", "timestamp": 10.5, "encodedDataLength": 2048},
+            ),
+        ]
+        response = parse_performance_log(entries)
+        self.assertEqual(response.url, "https://a.com/b")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.size, 2048)
+        self.assertAlmostEqual(response.load_time, 0.5)
+        self.assertIsNone(parse_performance_log(entries[3:]))
+
+    def test_iframe_document_is_skipped(self) -> None:
+        entries = [
+            performance_entry(
+                "Network.requestWillBeSent",
+                {
+                    "requestId": "1",
+                    "loaderId": "1",
+                    "frameId": "top",
+                    "type": "Document",
+                    "timestamp": 10.0,
+                },
+            ),
+            performance_entry(
+                "Network.responseReceived",
+                {
+                    "requestId": "1",
+                    "frameId": "top",
+                    "type": "Document",
+                    "response": {"url": "https://a.com/", "status": 200},
+                },
+            ),
+            performance_entry(
+                "Network.loadingFinished",
+                {"requestId": "1", "timestamp": 10.3, "encodedDataLength": 4096},
+            ),
+            # An iframe of the page, its document is loaded after the main one
+            performance_entry(
+                "Network.requestWillBeSent",
+                {
+                    "requestId": "2",
+                    "loaderId": "2",
+                    "frameId": "ad",
+                    "type": "Document",
+                    "timestamp": 10.4,
+                },
+            ),
+            performance_entry(
+                "Network.responseReceived",
+                {
+                    "requestId": "2",
+                    "frameId": "ad",
+                    "type": "Document",
+                    "response": {"url": "https://ads.com/frame", "status": 404},
+                },
+            ),
+            performance_entry(
+                "Network.loadingFinished",
+                {"requestId": "2", "timestamp": 11.4, "encodedDataLength": 10},
+            ),
+        ]
+        response = parse_performance_log(entries)
+        self.assertEqual(response.url, "https://a.com/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.size, 4096)
+        self.assertAlmostEqual(response.load_time, 0.3)
+
+
+class RobotsHandler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self) -> None:
+        RobotsHandler.requests += 1
+        body = "User-agent: *\nDisallow: /private/\nCrawl-delay: 2\n"
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class RobotsCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), RobotsHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        RobotsHandler.requests = 0
+
+    def test_rules_are_fetched_once(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            cache = RobotsCache(directory)
+            self.assertTrue(cache.can_fetch("deepcrawl", f"{self.base_url}/page/1"))
+            self.assertFalse(cache.can_fetch("deepcrawl", f"{self.base_url}/private/1"))
+            self.assertEqual(cache.crawl_delay("deepcrawl", self.base_url), 2)
+            self.assertEqual(RobotsHandler.requests, 1)
+
+            # A new process reads the rules from the disk
+            cache = RobotsCache(directory)
+            self.assertFalse(cache.can_fetch("deepcrawl", f"{self.base_url}/private/2"))
+            self.assertEqual(RobotsHandler.requests, 1)
+
+    def test_expired_rules_are_fetched_again(self) -> None:
+        cache = RobotsCache(None, ttl=0)
+        cache.can_fetch("deepcrawl", f"{self.base_url}/page/1")
+        cache.can_fetch("deepcrawl", f"{self.base_url}/page/2")
+        self.assertEqual(RobotsHandler.requests, 2)
+
+    def test_unreachable_host_allows_everything(self) -> None:
+        cache = RobotsCache(None, timeout=1)
+        self.assertTrue(cache.can_fetch("deepcrawl", "http://127.0.0.1:1/page"))
+
+
+class UrlCanonicalizerTest(unittest.TestCase):
+    def test_canonicalize(self) -> None:
+        canonicalizer = UrlCanonicalizer()
+        self.assertEqual(
+            canonicalizer.canonicalize(
+                "HTTP://Shop.COM:80/a/./b/../products/?size=2&color=1&utm_source=mail#top"
+            ),
+            "http://shop.com/a/products/?color=1&size=2",
+        )
+        self.assertEqual(
+            canonicalizer.canonicalize("https://shop.com"), "https://shop.com/"
+        )
+        self.assertEqual(
+            UrlCanonicalizer(
+                sort_params=False, remove_trailing_slash=True
+            ).canonicalize("https://shop.com/a/?b=1&a=2"),
+            "https://shop.com/a?b=1&a=2",
+        )
+        self.assertEqual(
+            canonicalizer.canonicalize("https://shop.com:8443/a%2fb c"),
+            "https://shop.com:8443/a%2Fb%20c",
+        )
+        self.assertEqual(
+            canonicalizer.canonicalize("mailto:a@shop.com"), "mailto:a@shop.com"
+        )
+
+    def test_stripped_params(self) -> None:
+        canonicalizer = UrlCanonicalizer(["session*", "ref"])
+        self.assertEqual(
+            canonicalizer.canonicalize(
+                "https://shop.com/a/?sessionid=1&ref=2&utm_source=3"
+            ),
+            "https://shop.com/a/?utm_source=3",
+        )
+
+
+class SeenSetTest(unittest.TestCase):
+    def test_fingerprint_set(self) -> None:
+        seen = FingerprintSet(capacity=4)
+        for i in range(1000):
+            self.assertTrue(seen.add(f"https://shop.com/{i}"))
+        for i in range(1000):
+            self.assertFalse(seen.add(f"https://shop.com/{i}"))
+        self.assertEqual(len(seen), 1000)
+        self.assertIn("https://shop.com/10", seen)
+        self.assertNotIn("https://shop.com/1000", seen)
+
+    def test_bloom_filter(self) -> None:
+        seen = BloomFilter(capacity=10000, error_rate=0.01)
+        for i in range(10000):
+            seen.add(f"https://shop.com/{i}")
+        self.assertTrue(all(f"https://shop.com/{i}" in seen for i in range(10000)))
+        false_positives = sum(f"https://shop.com/new/{i}" in seen for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class PageExtractionTest(unittest.TestCase):
+    Inspector = namedtuple("Inspector", ["selector", "xpath", "attribute"])
+    Plan = namedtuple("Plan", ["record_selector", "record_xpath", "inspectors"])
+
+    def test_extract_static(self) -> None:
+        tree = lxml.html.document_fromstring(
+            "<html><body><div id='menu'><a href='https://shop.com/a'>A</a><a>B</a></div>"
+            "<ul><li><a href='https://shop.com/1'> One </a></li><li><a href='https://shop.com/1'>Two</a></li></ul>"
+            "</body></html>"
+        )
+        inspectors = [
+            self.Inspector("//li/a", None, "href"),
+            self.Inspector("//li", etree.XPath("//li"), ""),
+            self.Inspector("//table", None, ""),
+            self.Inspector("//[", None, ""),
+        ]
+        content = extract_page(
+            StaticElement(tree), ["//ul", "//div"], self.Plan("", None, inspectors)
+        )
+        self.assertEqual(content.links, ["https://shop.com/1", "https://shop.com/a"])
+        self.assertEqual(
+            content.values,
+            [
+                [("One", "https://shop.com/1"), ("Two", "https://shop.com/1")],
+                [("One", None), ("Two", None)],
+                [],
+                [],
+            ],
+        )
+        self.assertEqual(len(content.errors), 1)
+
+    def test_empty_page(self) -> None:
+        content = extract_page(
+            StaticElement(None),
+            ["//body"],
+            self.Plan("", None, [self.Inspector("//h1", None, "")]),
+        )
+        self.assertEqual(content.links, [])
+        self.assertEqual(content.values, [[]])
+
+    def test_records(self) -> None:
+        tree = lxml.html.document_fromstring(
+            "<html><body><div class='card'><h2>A</h2><span>1</span></div>"
+            "<div class='card'><h2>B</h2></div>"
+            "<div class='card'><h2>C</h2><span>3</span><span>4</span></div></body></html>"
+        )
+        plan = self.Plan(
+            "//div[@class='card']",
+            etree.XPath("//div[@class='card']"),
+            [self.Inspector(".//h2", None, ""), self.Inspector(".//span", None, "")],
+        )
+        content = extract_page(StaticElement(tree), [], plan)
+        # Every record is evaluated on its own, so a missing value does not shift the others
+        self.assertEqual(
+            content.records,
+            [
+                [("A", None), ("1", None)],
+                [("B", None), None],
+                [("C", None), ("3", None)],
+            ],
+        )
+        self.assertEqual(content.values, [])
+
+
+class PolitenessTest(unittest.TestCase):
+    def test_token_bucket(self) -> None:
+        bucket = TokenBucket(2)
+        self.assertEqual(bucket.reserve(0), 0)
+        # Waiting threads are queued behind each other
+        self.assertEqual(bucket.reserve(0), 2)
+        self.assertEqual(bucket.reserve(1), 3)
+        # An idle host saves only one token
+        self.assertEqual(bucket.reserve(100), 0)
+        self.assertEqual(bucket.reserve(100), 2)
+
+    def test_host_scheduler(self) -> None:
+        now = [0.0]
+        delays = {"slow.com": 5}
+        scheduler = HostScheduler(
+            0.5, lambda url: delays.get(HostScheduler.host(url)), lambda: now[0]
+        )
+        self.assertEqual(scheduler.reserve("https://fast.com/1"), 0)
+        self.assertEqual(scheduler.reserve("https://fast.com/2"), 0.5)
+        self.assertEqual(scheduler.reserve("https://slow.com/1"), 0)
+        self.assertEqual(scheduler.reserve("https://slow.com/2"), 5)
+        self.assertEqual(scheduler.waits, 2)
+
+        # Failures slow the host down, successes bring it back to its floor
+        scheduler.feedback("https://fast.com/1", False)
+        scheduler.feedback("https://fast.com/1", False)
+        self.assertEqual(scheduler.interval("https://fast.com/"), 2)
+        for _ in range(20):
+            scheduler.feedback("https://fast.com/1", True)
+        self.assertEqual(scheduler.interval("https://fast.com/"), 0.5)
+        scheduler.feedback("https://slow.com/1", True)
+        self.assertEqual(scheduler.interval("https://slow.com/"), 5)
+
+    def test_wait_is_interrupted(self) -> None:
+        scheduler = HostScheduler(60)
+        stop = threading.Event()
+        self.assertTrue(scheduler.wait("https://shop.com/1", stop))
+        stop.set()
+        self.assertFalse(scheduler.wait("https://shop.com/2", stop))
+
+    def test_retry_policy(self) -> None:
+        policy = RetryPolicy(3, base_delay=1, max_delay=5)
+        self.assertEqual(policy.attempts, 4)
+        for attempt, maximum in enumerate([1, 2, 4, 5, 5]):
+            self.assertTrue(maximum / 2 <= policy.delay(attempt) <= maximum)
+        self.assertTrue(policy.is_transient(503))
+        self.assertFalse(policy.is_transient(404))
+        self.assertFalse(policy.is_transient(None))
+
+    def test_watchdog(self) -> None:
+        watchdog = Watchdog(check_interval=0.01)
+        expired = threading.Event()
+        try:
+            with watchdog.watch(0.05, expired.set) as watch:
+                self.assertTrue(expired.wait(2))
+            self.assertTrue(watch.expired)
+            with watchdog.watch(5, expired.clear) as watch:
+                pass
+            self.assertFalse(watch.expired)
+            self.assertTrue(expired.is_set())
+        finally:
+            watchdog.close()
+        self.assertEqual(watchdog.expired, 1)
+
+
+class MetricsTest(unittest.TestCase):
+    def test_histogram(self) -> None:
+        histogram = Histogram()
+        for i in range(1, 1001):
+            histogram.add(i / 1000)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 1000)
+        self.assertAlmostEqual(summary["mean"], 0.5005)
+        self.assertEqual(summary["min"], 0.001)
+        self.assertEqual(summary["max"], 1)
+        # Percentiles are within the growth of the buckets
+        for q, expected in ((50, 0.5), (95, 0.95), (99, 0.99)):
+            self.assertLessEqual(abs(summary[f"p{q}"] - expected) / expected, 0.05)
+        self.assertEqual(Histogram().summary(), {"count": 0})
+
+    def test_runner_metrics(self) -> None:
+        metrics = RunnerMetrics({"Errors": 2}, visited_pages=10)
+        snapshots = []
+
+        def visit() -> None:
+            for _ in range(1000):
+                metrics.page_visited()
+                metrics.count(200)
+                metrics.observe("fetch", 0.1)
+
+        threads = [threading.Thread(target=visit) for _ in range(4)]
+        metrics.start(snapshots.append, interval=60)
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with metrics.timer("save"):
+            pass
+        metrics.close()
+        # Closing flushes the last snapshot
+        self.assertEqual(len(snapshots), 1)
+        self.assertEqual(snapshots[0]["visited_pages"], 4010)
+        self.assertEqual(snapshots[0]["counters"], {"Errors": 2, 200: 4000})
+        self.assertEqual(snapshots[0]["histograms"]["fetch"]["count"], 4000)
+        self.assertAlmostEqual(snapshots[0]["histograms"]["fetch"]["p99"], 0.1)
+        self.assertEqual(metrics.summary("save")["count"], 1)
+
+    def test_link_samples(self) -> None:
+        metrics = RunnerMetrics(
+            {"Excluded links": 100}, samples={"Excluded links": ["a", "b"]}
+        )
+        for i in range(10_000):
+            metrics.sample("Cross site links", f"https://other.com/{i}")
+        metrics.sample("Excluded links", "c")
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["Cross site links"], 10_000)
+        self.assertEqual(snapshot["counters"]["Excluded links"], 101)
+        self.assertEqual(len(snapshot["samples"]["Cross site links"]), 20)
+        self.assertEqual(len(snapshot["samples"]["Excluded links"]), 3)
+
+    def test_reservoir_is_uniform(self) -> None:
+        picks = [0] * 10
+        for _ in range(2000):
+            sample = ReservoirSample(2)
+            for i in range(10):
+                sample.add(i)
+            for i in sample.items:
+                picks[i] += 1
+        # Every item is kept 400 times on average
+        for count in picks:
+            self.assertTrue(300 < count < 500)
+
+
+class ProfilerTest(unittest.TestCase):
+    def test_trace_and_summary(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = CrawlProfiler(f"{directory}/1.trace", slowest=2)
+            for i in range(5):
+                with profiler.page(f"https://example.com/{i}") as span:
+                    with span.phase("fetch"):
+                        pass
+                    with span.phase("fetch"):
+                        pass
+                    with span.phase("links"):
+                        pass
+            with profiler.batch("3 documents") as span:
+                with span.phase("insert"):
+                    pass
+            summary = profiler.close()
+
+            with open(f"{directory}/1.trace.jsonl") as f:
+                lines = [json.loads(line) for line in f]
+            with open(f"{directory}/1.trace.summary.json") as f:
+                self.assertEqual(json.load(f), summary)
+
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[0]["k"], "page")
+        self.assertEqual(lines[0]["n"], "https://example.com/0")
+        self.assertEqual(set(lines[0]["p"]), {"fetch", "links"})
+        self.assertEqual(lines[-1]["k"], "batch")
+        self.assertEqual(summary["page"]["count"], 5)
+        self.assertEqual(summary["batch"]["count"], 1)
+        shares = sum(phase["share"] for phase in summary["page"]["phases"].values())
+        self.assertAlmostEqual(shares, 1)
+
+    def test_slowest(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = CrawlProfiler(f"{directory}/1.trace", slowest=2)
+            for i in range(5):
+                span = profiler.page(f"https://example.com/{i}")
+                span.duration = i
+                profiler.record(span)
+            summary = profiler.close()
+        self.assertEqual(
+            [slow["name"] for slow in summary["page"]["slowest"]],
+            ["https://example.com/4", "https://example.com/3"],
+        )
+
+    def test_null_profiler(self) -> None:
+        profiler = NullProfiler()
+        with profiler.page("https://example.com") as span:
+            with span.phase("fetch"):
+                pass
+        self.assertEqual(profiler.close(), {})
+
+
+class PrometheusTest(unittest.TestCase):
+    def test_render(self) -> None:
+        registry = MetricsRegistry()
+        pages = registry.counter("pages_total", "Visited pages", ("runner",))
+        links = registry.gauge("frontier_links", "Waiting links", ("runner", "level"))
+        latency = registry.histogram("search_seconds", "Searches", buckets=(0.1, 1))
+        pages.inc(runner=1)
+        pages.inc(2, runner=1)
+        links.set(5, runner=1, level=0)
+        for value in (0.05, 0.5, 5):
+            latency.observe(value)
+        self.assertIs(
+            registry.counter("pages_total", "Visited pages", ("runner",)), pages
+        )
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE pages_total counter", lines)
+        self.assertIn('pages_total{runner="1"} 3', lines)
+        self.assertIn('frontier_links{runner="1",level="0"} 5', lines)
+        self.assertIn('search_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('search_seconds_bucket{le="1.0"} 2', lines)
+        self.assertIn('search_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn("search_seconds_sum 5.55", lines)
+        self.assertIn("search_seconds_count 3", lines)
+
+        with self.assertRaises(ValueError):
+            pages.inc(level=1)
+        links.remove_matching(runner=1)
+        self.assertNotIn('frontier_links{runner="1",level="0"} 5', registry.render())
+
+    def test_collectors(self) -> None:
+        registry = MetricsRegistry()
+        size = registry.gauge("queue_size", "Queue size")
+        queue = [1, 2]
+
+        def collect() -> None:
+            size.set(len(queue))
+
+        def fail() -> None:
+            raise RuntimeError("gone")
+
+        registry.add_collector(fail)
+        registry.add_collector(collect)
+        self.assertIn("queue_size 2", registry.render())
+        queue.append(3)
+        self.assertIn("queue_size 3", registry.render())
+        registry.remove_collector(collect)
+        queue.append(4)
+        self.assertIn("queue_size 3", registry.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
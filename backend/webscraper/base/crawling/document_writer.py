@@ -0,0 +1,172 @@
+import logging
+import queue
+import threading
+import time
+
+from django.db import IntegrityError, connection, transaction
+
+from .metrics import RunnerMetrics
+from .profiler import CrawlProfiler, NullProfiler
+from .seen_set import FingerprintSet
+from ..models import Document, InspectorValue, Runner, Template
+
+
+class DocumentWriter:
+    """
+    Saves the documents found by the crawling threads from a background thread.
+    The threads only put the documents in a queue and never wait for the database,
+    the writer saves them with a few bulk inserts every `batch_size` documents or `flush_interval` seconds.
+    """
+
+    # Put in the queue to stop the writer
+    STOP = object()
+
+    def __init__(
+        self,
+        runner: Runner,
+        batch_size: int = 500,
+        flush_interval: float = 2,
+        logger: logging.Logger | None = None,
+        metrics: RunnerMetrics | None = None,
+        profiler: CrawlProfiler | NullProfiler | None = None,
+    ):
+        """
+        :param runner: The runner of the documents, its documents count is updated after every batch
+        :param batch_size: Maximum number of documents saved together
+        :param flush_interval: Maximum seconds a document waits in the queue
+        :param logger: Logger of the runner
+        :param metrics: Statistics of the runner, the time of every batch is observed as "save"
+        :param profiler: Traces the lookup and the inserts of every batch
+        """
+        self.runner = runner
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.metrics = metrics
+        self.profiler = profiler if profiler is not None else NullProfiler()
+        self.queue: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        # Hash codes of the documents found by this runner, the database catches the others
+        self.hash_codes = FingerprintSet()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+        # statistics
+        self.pending = 0
+        # Documents of the runner in the database, including the ones saved before it was resumed
+        self.saved = runner.documents_count
+        # Documents skipped because they were saved before by another runner
+        self.duplicates = 0
+        self.errors = 0
+
+    @property
+    def documents(self) -> int:
+        """
+        Documents found by the runner, the ones waiting in the queue are counted too.
+        """
+        with self.lock:
+            return self.saved + self.pending
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def submit(
+        self, template: Template, hash_code: str, inspector_values: list[InspectorValue]
+    ) -> bool:
+        """
+        Queue a document to be saved, it does not wait for the database.
+        :param template: Template of the document
+        :param hash_code: The hash code of the values, see `evaluate_document_hash_code`
+        :param inspector_values: The unsaved values of the document
+        :return: False if the document was already found by this runner
+        """
+        with self.lock:
+            if not self.hash_codes.add(hash_code):
+                return False
+            self.pending += 1
+        self.queue.put((template, hash_code, inspector_values))
+        return True
+
+    def run(self) -> None:
+        stopped = False
+        while not stopped:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is self.STOP:
+                    stopped = True
+                    break
+                batch.append(item)
+            if batch:
+                self.flush(batch)
+        # Every thread has its own database connection
+        connection.close()
+
+    def flush(self, batch: list) -> None:
+        start = time.perf_counter()
+        try:
+            with self.profiler.batch(f"{len(batch)} documents") as span:
+                self.write(batch, span)
+            if self.metrics is not None:
+                self.metrics.observe("save", time.perf_counter() - start)
+        except Exception as e:
+            with self.lock:
+                self.errors += len(batch)
+            self.logger.error(f"Could not save {len(batch)} documents: {e}")
+        finally:
+            with self.lock:
+                self.pending -= len(batch)
+
+    def write(self, batch: list, span=NullProfiler.span) -> None:
+        """
+        Saves the documents and their values with three queries, documents already saved
+        by another runner are skipped.
+        :param span: Span of the batch, the lookup is traced as "dedup" and the inserts as "insert"
+        """
+        # Another process may insert the same document between the lookup and the insert,
+        # the unique hash code makes the insert fail and the lookup is done again
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    with span.phase("dedup"):
+                        existing = set(
+                            Document.objects.filter(
+                                hash_code__in=[hash_code for _, hash_code, _ in batch]
+                            ).values_list("hash_code", flat=True)
+                        )
+                    new_documents = [item for item in batch if item[1] not in existing]
+                    with span.phase("insert"):
+                        documents = Document.objects.bulk_create(
+                            [
+                                Document(template=template, hash_code=hash_code)
+                                for template, hash_code, _ in new_documents
+                            ]
+                        )
+                        values = []
+                        for document, (_, _, inspector_values) in zip(
+                            documents, new_documents
+                        ):
+                            for inspector_value in inspector_values:
+                                inspector_value.document = document
+                                values.append(inspector_value)
+                        InspectorValue.objects.bulk_create(values)
+                break
+            except IntegrityError:
+                if attempt == 1:
+                    raise
+        with self.lock:
+            self.saved += len(new_documents)
+            self.duplicates += len(batch) - len(new_documents)
+            saved = self.saved
+        Runner.objects.filter(id=self.runner.id).update(documents_count=saved)
+
+    def close(self) -> None:
+        """
+        Saves the documents left in the queue and stops the writer.
+        """
+        if self.thread.is_alive():
+            self.queue.put(self.STOP)
+            self.thread.join()
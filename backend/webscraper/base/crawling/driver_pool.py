@@ -0,0 +1,281 @@
+import os
+import threading
+from typing import Callable
+
+from selenium.common import WebDriverException
+from selenium.webdriver.chrome.webdriver import WebDriver
+
+
+def process_tree_rss(pid: int) -> float:
+    """
+    Sum the resident memory of a process and all its children, Chrome runs as many processes under the driver.
+    :param pid: The id of the root process
+    :return: Resident memory in MB, 0 if it can not be read (the process is gone or /proc is not available)
+    """
+    children: dict[int, list[int]] = {}
+    try:
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name can contain spaces, the parent id comes right after it
+                    parent = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(parent, []).append(int(entry))
+    except OSError:
+        return 0
+
+    rss_kb = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return rss_kb / 1024
+
+
+class DriverLease:
+    """
+    A driver lent to a crawling thread, the thread must always use `lease.driver`
+    because the pool can replace the browser while it is leased.
+    """
+
+    def __init__(self, driver: WebDriver, show_browser: bool):
+        self.driver = driver
+        self.show_browser = show_browser
+        # Pages loaded since the browser was started
+        self.pages = 0
+
+
+class DriverPool:
+    """
+    Process wide pool of warm Chrome drivers shared by all the runners.
+    Starting a browser takes seconds, so drivers are reset and kept idle after each runner instead of quitting them.
+    Every thread gets a driver right away, a new browser is started when none is idle, and at most `size`
+    drivers are kept idle. The size does not bound the live browsers, there is one per crawling thread,
+    so their number and its peak are reported by `stats`.
+    Browsers are quit outside the lock, a slow shutdown does not block the other threads.
+    A browser is recycled after loading `max_pages` pages or when its processes use more than `max_memory` MB.
+    """
+
+    # The memory of the browser is only checked every few pages, reading /proc is not free
+    MEMORY_CHECK_INTERVAL = 25
+
+    def __init__(
+        self,
+        factory: Callable[[bool], WebDriver],
+        size: int = 4,
+        max_pages: int = 500,
+        max_memory: float = 1024,
+    ):
+        """
+        :param factory: Creates a new driver, it takes the `show_browser` option
+        :param size: Maximum number of idle drivers kept in the process
+        :param max_pages: Pages loaded before the browser is recycled, 0 to disable it
+        :param max_memory: Resident memory in MB before the browser is recycled, 0 to disable it
+        """
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory = max_memory
+        self.lock = threading.Lock()
+        # Idle drivers grouped by the `show_browser` option
+        self.idle: dict[bool, list[DriverLease]] = {}
+        self.alive = 0
+
+        # statistics
+        self.peak = 0
+        self.leases = 0
+        self.created = 0
+        self.recycles = 0
+        self.health_failures = 0
+        self.start_failures = 0
+
+    def configure(self, size: int, max_pages: int, max_memory: float) -> None:
+        with self.lock:
+            self.size = size
+            self.max_pages = max_pages
+            self.max_memory = max_memory
+            surplus = self.trim()
+        for lease in surplus:
+            self.quit_driver(lease.driver)
+
+    def idle_count(self) -> int:
+        return sum(len(drivers) for drivers in self.idle.values())
+
+    def trim(self) -> list[DriverLease]:
+        """
+        Take the idle drivers above the size of the pool, the lock must be held.
+        :return: The drivers to quit once the lock is released
+        """
+        surplus = []
+        while self.idle_count() > self.size:
+            # The option with the fewest idle drivers is the least likely to be leased again
+            drivers = min(
+                (drivers for drivers in self.idle.values() if drivers), key=len
+            )
+            surplus.append(drivers.pop(0))
+            self.alive -= 1
+        return surplus
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": self.size,
+                "alive": self.alive,
+                "peak": self.peak,
+                "idle": self.idle_count(),
+                "leases": self.leases,
+                "created": self.created,
+                "recycles": self.recycles,
+                "health_failures": self.health_failures,
+                "start_failures": self.start_failures,
+            }
+
+    @staticmethod
+    def is_healthy(driver: WebDriver) -> bool:
+        try:
+            return driver.execute_script("return 1") == 1
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def quit_driver(driver: WebDriver) -> None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def reset(driver: WebDriver) -> None:
+        """
+        Remove everything the previous runner left in the browser.
+        """
+        try:
+            driver.execute_cdp_cmd(
+                "Storage.clearDataForOrigin", {"origin": "*", "storageTypes": "all"}
+            )
+        except (WebDriverException, AttributeError):
+            # Fallback for drivers without the Chrome DevTools protocol
+            try:
+                driver.execute_script(
+                    "window.localStorage.clear(); window.sessionStorage.clear();"
+                )
+            except WebDriverException:
+                pass
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def memory(self, driver: WebDriver) -> float:
+        try:
+            return process_tree_rss(driver.service.process.pid)
+        except AttributeError:
+            return 0
+
+    def lease(self, show_browser: bool) -> DriverLease:
+        """
+        Lend a healthy idle driver, a new browser is started if none is idle so the threads never wait.
+        :param show_browser: Whether the browser window should be visible
+        :return: The lease of the driver
+        """
+        with self.lock:
+            self.leases += 1
+            lease = (
+                self.idle[show_browser].pop() if self.idle.get(show_browser) else None
+            )
+            if lease is None:
+                # Counted now, the browser is started outside the lock
+                self.alive += 1
+                self.peak = max(self.peak, self.alive)
+
+        if lease is not None:
+            if self.is_healthy(lease.driver):
+                return lease
+            with self.lock:
+                self.health_failures += 1
+            self.quit_driver(lease.driver)
+        try:
+            lease = DriverLease(self.factory(show_browser), show_browser)
+        except Exception:
+            with self.lock:
+                self.alive -= 1
+                self.start_failures += 1
+            raise
+        with self.lock:
+            self.created += 1
+        return lease
+
+    def page_loaded(self, lease: DriverLease) -> None:
+        """
+        Called after every page, the browser of the lease is replaced if it reached its limits.
+        :param lease: The lease of the driver
+        """
+        lease.pages += 1
+        if self.max_pages and lease.pages >= self.max_pages:
+            self.recycle(lease)
+        elif (
+            self.max_memory
+            and lease.pages % self.MEMORY_CHECK_INTERVAL == 0
+            and self.memory(lease.driver) > self.max_memory
+        ):
+            self.recycle(lease)
+
+    def recycle(self, lease: DriverLease) -> None:
+        """
+        Replace the browser of the lease, the driver of the lease is None if the new browser could not be started.
+        :param lease: The lease of the driver
+        """
+        self.quit_driver(lease.driver)
+        lease.pages = 0
+        try:
+            lease.driver = self.factory(lease.show_browser)
+        except Exception:
+            lease.driver = None
+            with self.lock:
+                self.alive -= 1
+                self.start_failures += 1
+            return
+        with self.lock:
+            self.recycles += 1
+            self.created += 1
+
+    def release(self, lease: DriverLease) -> None:
+        """
+        Give the driver back to the pool, it is reset to be reused by the next runner.
+        :param lease: The lease of the driver
+        """
+        if lease.driver is None:
+            # The browser could not be restarted, it is not counted anymore
+            return
+        try:
+            self.reset(lease.driver)
+        except WebDriverException:
+            self.quit_driver(lease.driver)
+            with self.lock:
+                self.alive -= 1
+            return
+        with self.lock:
+            kept = self.idle_count() < self.size
+            if kept:
+                self.idle.setdefault(lease.show_browser, []).append(lease)
+            else:
+                self.alive -= 1
+        if not kept:
+            self.quit_driver(lease.driver)
+
+    def close(self) -> None:
+        with self.lock:
+            leases = [lease for drivers in self.idle.values() for lease in drivers]
+            self.alive -= len(leases)
+            self.idle = {}
+        for lease in leases:
+            self.quit_driver(lease.driver)
@@ -0,0 +1,127 @@
+import re
+import threading
+from dataclasses import dataclass
+
+from lxml import etree
+
+from ..models import Action, ActionChain, Inspector, Template
+
+
+@dataclass(frozen=True)
+class InspectorPlan:
+    """
+    An inspector ready to be evaluated, its expressions are compiled once for all the pages.
+    """
+
+    inspector: Inspector
+    selector: str
+    # Compiled for the engines parsing the pages with lxml, None if lxml does not support the expression
+    xpath: etree.XPath | None
+    attribute: str
+    clean_ups: tuple[tuple[re.Pattern, str], ...]
+
+    @classmethod
+    def compile(cls, inspector: Inspector, relative: bool = False) -> "InspectorPlan":
+        """
+        :param inspector: The inspector to compile
+        :param relative: True if the inspector is evaluated inside the records of the template
+        """
+        selector = inspector.selector
+        if relative and selector.startswith("/"):
+            selector = f".{selector}"
+        clean_ups = []
+        if inspector.clean_up_expression != "":
+            for reg_expression in inspector.clean_up_expression.split('";"'):
+                k, v = reg_expression.split("=", 1)
+                clean_ups.append((re.compile(k), v))
+        try:
+            xpath = etree.XPath(selector)
+        except etree.XPathSyntaxError:
+            xpath = None
+        return cls(
+            inspector=inspector,
+            selector=selector,
+            xpath=xpath,
+            attribute=inspector.attribute,
+            clean_ups=tuple(clean_ups),
+        )
+
+    def clean_up(self, value: str) -> str:
+        if value == "":
+            return value
+        for pattern, replacement in self.clean_ups:
+            value = pattern.sub(replacement, value)
+        return value
+
+
+@dataclass(frozen=True)
+class ExtractionPlan:
+    """
+    Everything needed to extract the documents of a template, it is read from the database once
+    and shared by all the crawling threads.
+    """
+
+    template_id: int
+    # Empty if the documents are found by zipping the values of the inspectors over the whole page
+    record_selector: str
+    record_xpath: etree.XPath | None
+    inspectors: tuple[InspectorPlan, ...]
+    # The actions executed before the page is crawled, empty if the chain is disabled
+    actions: tuple[Action, ...]
+
+    @classmethod
+    def compile(cls, template: Template) -> "ExtractionPlan":
+        inspectors = Inspector.objects.filter(template=template, deleted=False)
+        actions = ()
+        actions_chain = ActionChain.objects.filter(template=template).first()
+        if actions_chain is not None and not actions_chain.disabled:
+            actions = tuple(
+                Action.objects.filter(action_chain=actions_chain)
+                .filter(deleted=False)
+                .order_by("order")
+            )
+        record_xpath = None
+        if template.record_selector != "":
+            try:
+                record_xpath = etree.XPath(template.record_selector)
+            except etree.XPathSyntaxError:
+                record_xpath = None
+        # The inspectors are evaluated inside every record when the template has records
+        relative = template.record_selector != ""
+        return cls(
+            template_id=template.id,
+            record_selector=template.record_selector,
+            record_xpath=record_xpath,
+            inspectors=tuple(
+                InspectorPlan.compile(inspector, relative=relative)
+                for inspector in inspectors
+            ),
+            actions=actions,
+        )
+
+
+class ExtractionPlans:
+    """
+    The compiled plans of the templates used by the runners of the process.
+    A plan is compiled again the next time it is needed after its template, inspectors or actions are edited.
+    """
+
+    def __init__(self):
+        self.plans: dict[int, ExtractionPlan] = {}
+        self.lock = threading.Lock()
+
+    def get(self, template: Template) -> ExtractionPlan:
+        plan = self.plans.get(template.id)
+        if plan is not None:
+            return plan
+        with self.lock:
+            plan = self.plans.get(template.id)
+            if plan is None:
+                # The template of the caller may be older than the edit which invalidated the plan
+                plan = ExtractionPlan.compile(Template.objects.get(id=template.id))
+                self.plans[template.id] = plan
+            return plan
+
+    def invalidate(self, template_id: int) -> None:
+        with self.lock:
+            self.plans.pop(template_id, None)
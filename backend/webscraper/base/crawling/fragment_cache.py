@@ -0,0 +1,95 @@
+import threading
+from urllib.parse import urlparse
+
+from django.db import connection
+
+from ..models import LinkFragment, Runner
+
+
+class LinkFragmentCache:
+    """
+    The tree of the URL fragments of a runner kept in memory, the key is (parent id, fragment) and the value is the id.
+    Pages of a site share most of their fragments, so the database is only used for the new ones.
+    """
+
+    def __init__(self, runner: Runner):
+        self.runner = runner
+        self.ids: dict[tuple[int | None, str], int] = {}
+        # Only the threads inserting new fragments wait for each other
+        self.lock = threading.Lock()
+
+    def preload(self) -> None:
+        """
+        Load the fragments saved by the runner before it was paused or stopped.
+        """
+        fragments = LinkFragment.objects.filter(runner=self.runner).values_list(
+            "id", "parent_id", "fragment"
+        )
+        for fragment_id, parent_id, fragment in fragments.iterator(chunk_size=10_000):
+            self.ids[(parent_id, fragment)] = fragment_id
+
+    @staticmethod
+    def split(url: str) -> list[str]:
+        parsed_url = urlparse(url)
+        fragments = [parsed_url.netloc] + parsed_url.path.split("/")
+        # Longer fragments do not fit in the column
+        max_length = LinkFragment._meta.get_field("fragment").max_length
+        return [fragment[:max_length] for fragment in fragments if fragment]
+
+    @staticmethod
+    def reserve_ids(count: int) -> list[int]:
+        """
+        Take ids from the sequence of the table, so a whole branch can be inserted at once
+        although every fragment needs the id of its parent.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [LinkFragment._meta.db_table, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def save(self, url: str) -> int | None:
+        """
+        Find the id of the last fragment of the URL, the missing fragments are inserted with one query.
+        :param url: The URL of the page
+        :return: The id of the last fragment, None if the URL has no fragments
+        """
+        fragments = self.split(url)
+        parent_id = None
+        for depth, fragment in enumerate(fragments):
+            fragment_id = self.ids.get((parent_id, fragment))
+            if fragment_id is None:
+                return self.insert(fragments, depth, parent_id)
+            parent_id = fragment_id
+        return parent_id
+
+    def insert(self, fragments: list[str], depth: int, parent_id: int | None) -> int:
+        with self.lock:
+            # Another thread may have inserted a part of the branch while we were waiting
+            for depth in range(depth, len(fragments)):
+                fragment_id = self.ids.get((parent_id, fragments[depth]))
+                if fragment_id is None:
+                    break
+                parent_id = fragment_id
+            else:
+                return parent_id
+
+            missing = fragments[depth:]
+            new_fragments = []
+            for fragment_id, fragment in zip(self.reserve_ids(len(missing)), missing):
+                new_fragments.append(
+                    LinkFragment(
+                        id=fragment_id,
+                        fragment=fragment,
+                        parent_id=parent_id,
+                        runner=self.runner,
+                    )
+                )
+                parent_id = fragment_id
+            LinkFragment.objects.bulk_create(new_fragments)
+            for link_fragment in new_fragments:
+                self.ids[(link_fragment.parent_id, link_fragment.fragment)] = (
+                    link_fragment.id
+                )
+            return parent_id
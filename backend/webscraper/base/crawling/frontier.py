@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import deque
+
+from .journal import FrontierJournal
+from .seen_set import BloomFilter, FingerprintSet
+from ..dataclasses import Link
+
+
+class Frontier:
+    """
+    The links waiting to be crawled, shared between all the crawling threads of a runner.
+    Links are kept in one queue per level, threads block on `get` until a link is added
+    or until all the other threads are idle, which means the crawl is completed.
+    """
+
+    def __init__(
+        self,
+        depth_first: bool,
+        max_links: int,
+        seen: FingerprintSet | BloomFilter | None = None,
+        journal: FrontierJournal | None = None,
+    ):
+        """
+        :param depth_first: Links of the deepest level are crawled first (DFS), otherwise the lowest level (BFS)
+        :param max_links: Maximum number of links that can be discovered
+        :param seen: The set of discovered URLs, a `FingerprintSet` is used by default
+        :param journal: Writes the discovered and processed links to the disk to resume the crawl later
+        """
+        self.depth_first = depth_first
+        self.max_links = max_links
+        self.condition = threading.Condition()
+        self.queues: dict[int, deque[Link]] = {}
+        # All discovered URLs, only their fingerprints are kept once they leave the queues
+        self.seen = seen if seen is not None else FingerprintSet()
+        self.journal = journal
+        self.size = 0
+        # Number of threads processing a link they got from the frontier
+        self.active_workers = 0
+        self.closed = False
+
+        # statistics
+        self.idle_time = 0.0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def full(self) -> bool:
+        return len(self.seen) >= self.max_links
+
+    def add(self, link: Link) -> bool:
+        """
+        Adds the link if it was not discovered before and the maximum number of links is not reached.
+        :param link: The found link
+        :return: True if the link is added to the queues
+        """
+        snapshot = None
+        with self.condition:
+            if len(self.seen) >= self.max_links or not self.seen.add(link.url):
+                return False
+            if self.journal is not None:
+                self.journal.added(link.url, link.level)
+                snapshot = self.journal.due_snapshot()
+            self.queues.setdefault(link.level, deque()).append(link)
+            self.size += 1
+            self.condition.notify()
+        if snapshot is not None:
+            # Written after the lock is released, so the other threads do not wait for the disk
+            self.journal.write_checkpoint(snapshot)
+        return True
+
+    def restore(self, pending: dict[str, int]) -> None:
+        """
+        Put back the links which were not processed before the crawl was stopped, they are already in the seen set.
+        :param pending: The links restored by the journal, the value is the level
+        """
+        with self.condition:
+            for url, level in pending.items():
+                self.queues.setdefault(level, deque()).append(Link(url, level=level))
+                self.size += 1
+            self.condition.notify_all()
+
+    def level_sizes(self) -> dict[int, int]:
+        """
+        :return: The number of links waiting in the queue of every level
+        """
+        with self.condition:
+            return {level: len(queue) for level, queue in self.queues.items()}
+
+    def current_level(self) -> int:
+        """
+        Find the level of the queue that should be crawled next.
+        :return: The level or -1 if all queues are empty
+        """
+        levels_with_links = [level for level, queue in self.queues.items() if queue]
+        if len(levels_with_links) == 0:
+            return -1
+        return max(levels_with_links) if self.depth_first else min(levels_with_links)
+
+    def get(self) -> Link | None:
+        """
+        Blocks until a link is available, every link returned must be followed by a call to `task_done`.
+        :return: The next link to crawl or None if the crawl is completed or stopped
+        """
+        with self.condition:
+            waiting_since = time.perf_counter()
+            while not self.closed and self.size == 0:
+                if self.active_workers == 0:
+                    # Nothing to crawl and no thread can find new links anymore
+                    self.closed = True
+                    self.condition.notify_all()
+                    break
+                self.condition.wait()
+            self.idle_time += time.perf_counter() - waiting_since
+            if self.closed:
+                return None
+            link = self.queues[self.current_level()].pop()
+            self.size -= 1
+            self.active_workers += 1
+            return link
+
+    def task_done(self, link: Link, crawled: bool = True) -> None:
+        """
+        Called when the thread is done with the link, it will not be crawled again if the runner is resumed.
+        :param link: The link returned by `get`
+        :param crawled: False if the link was given up because the runner stopped, it is crawled when resumed
+        """
+        snapshot = None
+        with self.condition:
+            if self.journal is not None and crawled:
+                self.journal.done(link.url)
+                snapshot = self.journal.due_snapshot()
+            self.active_workers -= 1
+            if self.active_workers == 0 and self.size == 0:
+                self.condition.notify_all()
+        if snapshot is not None:
+            self.journal.write_checkpoint(snapshot)
+
+    def checkpoint(self) -> None:
+        if self.journal is None:
+            return
+        with self.condition:
+            snapshot = self.journal.snapshot()
+        self.journal.write_checkpoint(snapshot)
+
+    def close(self) -> None:
+        """
+        Stops the crawl, all the waiting threads are released.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -0,0 +1,169 @@
+"""
+Compares the idle time of the crawling threads between the shared frontier and the
+previous design, where every thread owned its queues, slept when they were empty and then
+stole half of the longest queue of another thread.
+
+Fetching a page is simulated by sleeping, so the benchmark needs neither a browser nor a database.
+Run it from backend/webscraper, like the other benchmarks:
+
+    python -m base.crawling.frontier_benchmark
+"""
+
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .frontier import Frontier
+from ..dataclasses import Link
+
+
+def synthetic_link_graph(pages: int, links_per_page: int, seed: int = 42) -> dict:
+    """
+    Every page links to random pages, page 0 is the seed.
+    """
+    rng = random.Random(seed)
+    return {
+        f"page-{page}": [f"page-{rng.randrange(pages)}" for _ in range(links_per_page)]
+        for page in range(pages)
+    }
+
+
+def crawl_with_frontier(graph: dict, threads: int, fetch_time: float) -> dict:
+    frontier = Frontier(depth_first=False, max_links=len(graph))
+    fetches = []
+
+    def worker() -> None:
+        while True:
+            link = frontier.get()
+            if link is None:
+                return
+            try:
+                time.sleep(fetch_time)
+                fetches.append(link.url)
+                for href in graph[link.url]:
+                    frontier.add(Link(href, level=link.level + 1))
+            finally:
+                frontier.task_done(link)
+
+    frontier.add(Link("page-0"))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in range(threads):
+            executor.submit(worker)
+    return {
+        "elapsed": time.perf_counter() - start,
+        "idle": frontier.idle_time,
+        "fetches": len(fetches),
+        "unique": len(set(fetches)),
+    }
+
+
+def crawl_with_thread_queues(
+    graph: dict, threads: int, fetch_time: float, idle_sleep: float
+) -> dict:
+    """
+    A condensed copy of the previous crawling loop, kept only for the comparison.
+    """
+    links = {"page-0": Link("page-0")}
+    pool = {}
+    idle = [0.0]
+    fetches = []
+    lock = threading.Lock()
+
+    def current_level(queues: dict) -> int:
+        levels = [level for level, queue in queues.items() if queue]
+        return min(levels) if levels else -1
+
+    def steal_work() -> dict | None:
+        longest, owner, owner_level = -1, None, -1
+        for thread_id, state in list(pool.items()):
+            level = current_level(state["queues"])
+            if level != -1 and len(state["queues"][level]) > longest:
+                longest, owner, owner_level = (
+                    len(state["queues"][level]),
+                    thread_id,
+                    level,
+                )
+        if owner is None or longest < 5:
+            return None
+        queue = pool[owner]["queues"][owner_level]
+        half = len(queue) // 2
+        pool[owner]["queues"][owner_level] = queue[:half]
+        return {owner_level: queue[half:]}
+
+    def worker() -> None:
+        thread_id = threading.get_native_id()
+        state = {"running": True, "queues": {0: [Link("page-0")]}}
+        pool[thread_id] = state
+        while True:
+            level = current_level(state["queues"])
+            if level != -1:
+                state["running"] = True
+                link = state["queues"][level].pop()
+                if links[link.url].visited:
+                    continue
+                time.sleep(fetch_time)
+                links[link.url].visited = True
+                with lock:
+                    fetches.append(link.url)
+                for href in graph[link.url]:
+                    if href not in links:
+                        found = Link(href, level=link.level + 1)
+                        links[href] = found
+                        state["queues"].setdefault(found.level, []).append(found)
+                continue
+            if not any(other["running"] for other in pool.values()):
+                return
+            state["running"] = False
+            waiting_since = time.perf_counter()
+            time.sleep(idle_sleep)
+            new_queues = steal_work()
+            with lock:
+                idle[0] += time.perf_counter() - waiting_since
+            if new_queues is not None:
+                state["running"] = True
+                state["queues"] = new_queues
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in range(threads):
+            executor.submit(worker)
+    return {
+        "elapsed": time.perf_counter() - start,
+        "idle": idle[0],
+        "fetches": len(fetches),
+        "unique": len(set(fetches)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--links-per-page", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--fetch-time", type=float, default=0.01)
+    # The previous design slept 5 seconds for pages taking around a second to load
+    parser.add_argument("--idle-sleep", type=float, default=0.05)
+    args = parser.parse_args()
+
+    graph = synthetic_link_graph(args.pages, args.links_per_page)
+    results = {
+        "thread queues": crawl_with_thread_queues(
+            graph, args.threads, args.fetch_time, args.idle_sleep
+        ),
+        "shared frontier": crawl_with_frontier(graph, args.threads, args.fetch_time),
+    }
+    print(
+        f"{'design':<16}{'elapsed (s)':>12}{'idle (s)':>10}{'fetches':>9}{'unique':>8}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<16}{result['elapsed']:>12.2f}{result['idle']:>10.2f}"
+            f"{result['fetches']:>9}{result['unique']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import json
+import os
+import pickle
+import threading
+import time
+
+from .seen_set import BloomFilter, FingerprintSet
+
+
+class FrontierJournal:
+    """
+    Keeps the state of a frontier on disk, so a stopped or crashed runner can continue where it stopped.
+    Every discovered and every processed link is appended to a journal file, and from time to time
+    the whole state is written to a checkpoint file and the journal starts again from empty.
+    Resuming loads the checkpoint and replays the journal on top of it.
+
+    The state is copied while the frontier is locked and the checkpoint is written after the lock is released.
+    The journal is set aside as the previous journal meanwhile, it is only removed once the checkpoint is written.
+    """
+
+    # Records appended before a checkpoint is written
+    CHECKPOINT_RECORDS = 10_000
+    # Seconds between two checkpoints
+    CHECKPOINT_INTERVAL = 60
+
+    def __init__(self, path: str, seen: FingerprintSet | BloomFilter):
+        """
+        :param path: Prefix of the files, the journal and the checkpoint are written next to each other
+        :param seen: The seen set of the frontier, it is saved with the checkpoints
+        """
+        self.journal_path = f"{path}.journal"
+        self.checkpoint_path = f"{path}.checkpoint"
+        self.previous_path = f"{path}.journal.previous"
+        self.seen = seen
+        # Links discovered but not processed yet, the value is the level
+        self.pending: dict[str, int] = {}
+        self.lock = threading.Lock()
+        # Held from the copy of the state until its checkpoint is written, one checkpoint is written at a time
+        self.writing = threading.Lock()
+        self.records = 0
+        self.checkpoint_at = time.monotonic()
+        self.file = None
+
+    @property
+    def exists(self) -> bool:
+        return any(
+            os.path.exists(path)
+            for path in (self.checkpoint_path, self.previous_path, self.journal_path)
+        )
+
+    def load(self) -> None:
+        """
+        Restore the seen set and the pending links from the disk.
+        """
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "rb") as f:
+                checkpoint = pickle.load(f)
+            self.seen = checkpoint["seen"]
+            self.pending = checkpoint["pending"]
+        # The previous journal is left if the process died while writing the checkpoint
+        for path in (self.previous_path, self.journal_path):
+            if os.path.exists(path):
+                self.replay(path)
+
+    def replay(self, path: str) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line is cut if the process died while writing it
+                    break
+                if "added" in record:
+                    # The journal may be older than the checkpoint if we died in between,
+                    # links already known by the checkpoint are skipped
+                    if self.seen.add(record["added"]):
+                        self.pending[record["added"]] = record["level"]
+                else:
+                    self.pending.pop(record["done"], None)
+
+    def open(self) -> None:
+        self.file = open(self.journal_path, "a", encoding="utf-8")
+        if os.path.exists(self.previous_path):
+            # The loaded state is saved before the journal is set aside again
+            self.write_checkpoint(self.snapshot())
+
+    def append(self, record: dict) -> None:
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            # Flushed to the OS, so the record is not lost if the process is killed
+            self.file.flush()
+            self.records += 1
+
+    def added(self, url: str, level: int) -> None:
+        """
+        Called by the frontier under its lock, after the URL is added to the seen set.
+        """
+        self.pending[url] = level
+        self.append({"added": url, "level": level})
+
+    def done(self, url: str) -> None:
+        self.pending.pop(url, None)
+        self.append({"done": url})
+
+    def due_snapshot(self) -> dict | None:
+        """
+        Called by the frontier under its lock.
+        :return: The state to write if a checkpoint is due and no other checkpoint is being written
+        """
+        if (
+            self.records < self.CHECKPOINT_RECORDS
+            and time.monotonic() - self.checkpoint_at < self.CHECKPOINT_INTERVAL
+        ):
+            return None
+        if not self.writing.acquire(blocking=False):
+            return None
+        return self.rotate()
+
+    def snapshot(self) -> dict:
+        """
+        Called by the frontier under its lock, waits for the checkpoint being written.
+        :return: The state to write
+        """
+        self.writing.acquire()
+        return self.rotate()
+
+    def rotate(self) -> dict:
+        """
+        Copy the state and set the journal aside, the new records go to an empty journal.
+        """
+        with self.lock:
+            snapshot = {"seen": self.seen.copy(), "pending": self.pending.copy()}
+            self.file.close()
+            if os.path.exists(self.previous_path):
+                # The previous checkpoint was not written, the previous journal keeps all the records
+                with open(self.previous_path, "a", encoding="utf-8") as previous:
+                    with open(self.journal_path, "r", encoding="utf-8") as f:
+                        previous.write(f.read())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.previous_path)
+            self.file = open(self.journal_path, "a", encoding="utf-8")
+            self.records = 0
+            self.checkpoint_at = time.monotonic()
+        return snapshot
+
+    def write_checkpoint(self, snapshot: dict) -> None:
+        """
+        Called without the lock of the frontier, the other threads keep crawling while the state is written.
+        :param snapshot: The state returned by `due_snapshot` or `snapshot`
+        """
+        try:
+            tmp_path = f"{self.checkpoint_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.checkpoint_path)
+            # Everything in the previous journal is in the checkpoint now
+            os.remove(self.previous_path)
+        finally:
+            self.writing.release()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def delete(self) -> None:
+        """
+        The crawl is completed, there is nothing to resume anymore.
+        """
+        self.close()
+        for path in (self.journal_path, self.previous_path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
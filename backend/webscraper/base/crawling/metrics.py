@@ -0,0 +1,218 @@
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+
+class Histogram:
+    """
+    Streaming histogram with buckets growing by `GROWTH`, so the percentiles are within 5% of the real values
+    whatever the number of samples. Count, sum, min and max are exact.
+    """
+
+    GROWTH = 1.05
+    # Smaller values share the first bucket
+    MIN_VALUE = 1e-4
+
+    def __init__(self):
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def add(self, value: float) -> None:
+        index = 0
+        if value > self.MIN_VALUE:
+            index = math.ceil(math.log(value / self.MIN_VALUE, self.GROWTH))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, q: float) -> float:
+        """
+        :param q: The percentile between 0 and 100
+        :return: The upper bound of the bucket holding the percentile, 0 if there are no samples
+        """
+        if self.count == 0:
+            return 0
+        rank = q / 100 * self.count
+        cumulative = 0
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if cumulative >= rank:
+                value = self.MIN_VALUE * self.GROWTH**index
+                return min(max(value, self.minimum), self.maximum)
+        return self.maximum
+
+    def summary(self) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.mean,
+            "min": self.minimum,
+            "max": self.maximum,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class ReservoirSample:
+    """
+    A uniform sample of at most `size` items out of a stream of any length (Algorithm R).
+    """
+
+    def __init__(self, size: int, items: list | None = None, seen: int = 0):
+        """
+        :param size: Maximum number of kept items
+        :param items: Items of a previous sample
+        :param seen: Number of items the previous sample was taken from
+        """
+        self.size = size
+        self.items = list(items or [])[:size]
+        self.seen = max(seen, len(self.items))
+
+    def add(self, item) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        index = random.randrange(self.seen)
+        if index < self.size:
+            self.items[index] = item
+
+
+class RunnerMetrics:
+    """
+    The statistics of a runner, updated by all the crawling threads and saved from a background thread
+    every `interval` seconds instead of after every page.
+    """
+
+    # Examples kept for every category of skipped links
+    SAMPLE_SIZE = 20
+
+    def __init__(
+        self,
+        counters: dict | None = None,
+        visited_pages: int = 0,
+        samples: dict[str, list] | None = None,
+    ):
+        """
+        :param counters: Counters of a resumed runner
+        :param visited_pages: Pages visited by a resumed runner
+        :param samples: Examples of a resumed runner
+        """
+        self.lock = threading.Lock()
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: dict = dict(counters or {})
+        self.visited_pages = visited_pages
+        self.samples: dict[str, ReservoirSample] = {
+            category: ReservoirSample(
+                self.SAMPLE_SIZE, items, self.counters.get(category, 0)
+            )
+            for category, items in (samples or {}).items()
+        }
+        self.closed = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def observe(self, name: str, value: float) -> None:
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """
+        Observe the seconds spent in the block, failed blocks are measured too.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def count(self, key, n: int = 1) -> None:
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def sample(self, category: str, item) -> None:
+        """
+        Count the item in its category and keep it if it is part of the sample of the category.
+        """
+        with self.lock:
+            self.counters[category] = self.counters.get(category, 0) + 1
+            sample = self.samples.get(category)
+            if sample is None:
+                sample = self.samples[category] = ReservoirSample(self.SAMPLE_SIZE)
+            sample.add(item)
+
+    def mark(self, key, value) -> None:
+        with self.lock:
+            self.counters[key] = value
+
+    def page_visited(self) -> None:
+        with self.lock:
+            self.visited_pages += 1
+
+    def summary(self, name: str) -> dict:
+        with self.lock:
+            histogram = self.histograms.get(name)
+            return histogram.summary() if histogram is not None else {"count": 0}
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "visited_pages": self.visited_pages,
+                "counters": dict(self.counters),
+                "samples": {
+                    category: list(sample.items)
+                    for category, sample in self.samples.items()
+                },
+                "histograms": {
+                    name: histogram.summary()
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def start(
+        self,
+        on_flush: Callable[[dict], None],
+        interval: float = 5,
+        on_close: Callable[[], None] | None = None,
+    ) -> None:
+        """
+        Hand a snapshot to `on_flush` every `interval` seconds and once more when closed.
+        :param on_flush: Saves the snapshot, it is called from the background thread
+        :param interval: Seconds between two flushes
+        :param on_close: Called from the background thread before it exits
+        """
+
+        def run() -> None:
+            try:
+                while not self.closed.wait(interval):
+                    on_flush(self.snapshot())
+                on_flush(self.snapshot())
+            finally:
+                if on_close is not None:
+                    on_close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.closed.set()
+        if self.thread is not None:
+            self.thread.join()
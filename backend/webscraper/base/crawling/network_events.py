@@ -0,0 +1,73 @@
+import json
+
+
+class PageResponse:
+    """
+    The HTTP response of the main document of a page.
+    """
+
+    def __init__(self, url: str, status_code: int, size: int, load_time: float | None):
+        """
+        :param url: The URL of the document after the redirects
+        :param status_code: HTTP status code
+        :param size: Number of bytes received over the network
+        :param load_time: Seconds from sending the request until the document was fully received
+        """
+        self.url = url
+        self.status_code = status_code
+        self.size = size
+        self.load_time = load_time
+
+
+def parse_performance_log(entries: list[dict]) -> PageResponse | None:
+    """
+    Find the response of the main document in the Chrome performance log,
+    so the status code does not need a second request to the site.
+    The iframes load documents too, the main document is the one of the frame the navigation started in.
+    :param entries: The entries returned by `driver.get_log("performance")`
+    :return: The response of the last document loaded in the top frame, None if no document was loaded
+    """
+    sent_at: dict[str, float] = {}
+    responses: dict[str, dict] = {}
+    finished: dict[str, dict] = {}
+    # The navigation sends the request of the top frame before the documents of its iframes
+    main_frame = None
+    document_id = None
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent" and params.get("type") == "Document":
+            if not sent_at:
+                main_frame = params.get("frameId")
+            # Redirects reuse the request id, the first request is the start of the load
+            sent_at.setdefault(request_id, params.get("timestamp"))
+        elif method == "Network.responseReceived" and params.get("type") == "Document":
+            if document_id is None and not sent_at:
+                main_frame = params.get("frameId")
+            if params.get("frameId") != main_frame:
+                continue
+            responses[request_id] = params
+            document_id = request_id
+        elif method == "Network.loadingFinished":
+            finished[request_id] = params
+
+    if document_id is None:
+        return None
+    response = responses[document_id]["response"]
+    size = response.get("encodedDataLength", 0)
+    load_time = None
+    if document_id in finished:
+        size = finished[document_id].get("encodedDataLength", size)
+        if sent_at.get(document_id) is not None:
+            load_time = finished[document_id]["timestamp"] - sent_at[document_id]
+    return PageResponse(
+        url=response.get("url", ""),
+        status_code=response.get("status"),
+        size=int(size),
+        load_time=load_time,
+    )
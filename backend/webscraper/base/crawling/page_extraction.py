@@ -0,0 +1,254 @@
+import json
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from lxml import etree
+from selenium.common import InvalidSelectorException
+from selenium.webdriver.common.by import By
+
+from .static_driver import StaticDriver, StaticElement, evaluate_xpath
+
+# Runs inside the browser, arguments are the scope XPaths, the [selector, attribute] of the inspectors
+# and the record selector of the template.
+# The result is returned as one JSON string, so Selenium does not convert it element by element.
+EXTRACTION_SCRIPT = """
+const [scopes, inspectors, recordSelector] = arguments;
+const errors = [];
+
+function evaluate(selector, context) {
+    const result = document.evaluate(selector, context, null, XPathResult.ANY_TYPE, null);
+    // Expressions like `count(//a)` do not return a node set
+    switch (result.resultType) {
+        case XPathResult.NUMBER_TYPE:
+            return [String(result.numberValue)];
+        case XPathResult.STRING_TYPE:
+            return [result.stringValue];
+        case XPathResult.BOOLEAN_TYPE:
+            return [String(result.booleanValue)];
+    }
+    const nodes = [];
+    for (let node = result.iterateNext(); node; node = result.iterateNext()) {
+        nodes.push(node);
+    }
+    return nodes;
+}
+
+function first(selector, context) {
+    const result = document.evaluate(selector, context, null, XPathResult.ANY_TYPE, null);
+    switch (result.resultType) {
+        case XPathResult.NUMBER_TYPE:
+        case XPathResult.STRING_TYPE:
+        case XPathResult.BOOLEAN_TYPE:
+            return evaluate(selector, context)[0];
+    }
+    return result.iterateNext();
+}
+
+function textOf(node) {
+    if (typeof node === "string") {
+        return node.trim();
+    }
+    // The rendered text like the `text` of a WebElement
+    const rendered = node.nodeType === Node.ELEMENT_NODE && node.innerText !== undefined;
+    const text = rendered ? node.innerText : node.textContent;
+    return (text || "").trim();
+}
+
+function attributeOf(node, name) {
+    if (typeof node === "string" || node.nodeType !== Node.ELEMENT_NODE) {
+        return null;
+    }
+    // Properties first like `get_attribute`, so links are absolute
+    const property = node[name];
+    if (typeof property === "boolean") {
+        return property ? "true" : null;
+    }
+    if (typeof property === "string" || typeof property === "number") {
+        return String(property);
+    }
+    return node.getAttribute(name);
+}
+
+const links = new Set();
+for (const scope of scopes) {
+    try {
+        for (const element of evaluate(scope, document)) {
+            if (typeof element === "string" || !element.querySelectorAll) {
+                continue;
+            }
+            for (const a of element.querySelectorAll("a")) {
+                if (a.getAttribute("href") !== null && typeof a.href === "string") {
+                    links.add(a.href);
+                }
+            }
+        }
+    } catch (e) {
+        errors.push(`${scope}: ${e.message}`);
+    }
+}
+
+function valueOf(node, attribute) {
+    return [textOf(node), attribute ? attributeOf(node, attribute) : null];
+}
+
+let values = [];
+let records = [];
+if (recordSelector) {
+    // Every record is found once and the inspectors only look inside it
+    try {
+        records = evaluate(recordSelector, document)
+            .filter((record) => typeof record !== "string")
+            .map((record) => inspectors.map(([selector, attribute]) => {
+                try {
+                    const node = first(selector, record);
+                    return node ? valueOf(node, attribute) : null;
+                } catch (e) {
+                    const error = `${selector}: ${e.message}`;
+                    if (!errors.includes(error)) {
+                        errors.push(error);
+                    }
+                    return null;
+                }
+            }));
+    } catch (e) {
+        errors.push(`${recordSelector}: ${e.message}`);
+        records = [];
+    }
+} else {
+    values = inspectors.map(([selector, attribute]) => {
+        try {
+            return evaluate(selector, document).map((node) => valueOf(node, attribute));
+        } catch (e) {
+            errors.push(`${selector}: ${e.message}`);
+            return [];
+        }
+    });
+}
+
+return JSON.stringify({links: [...links], values: values, records: records, errors: errors});
+"""
+
+# Links are looked up inside every scope
+LINKS_XPATH = etree.XPath(".//a")
+
+
+@dataclass
+class PageContent:
+    """
+    Everything the crawler reads from a page.
+    """
+
+    # The absolute URLs of the links inside the scopes, without duplicates
+    links: list[str] = field(default_factory=list)
+    # The (text, attribute) of the elements of every inspector, in the order of the inspectors
+    values: list[list[tuple[str, str | None]]] = field(default_factory=list)
+    # If the template has a record selector, the (text, attribute) of the first element of every inspector
+    # inside every record, None if the record has no such element
+    records: list[list[tuple[str, str | None] | None]] = field(default_factory=list)
+    # Scopes and inspectors that could not be evaluated
+    errors: list[str] = field(default_factory=list)
+
+
+def extract_page(page, scopes: Sequence[str], plan) -> PageContent:
+    """
+    Reads the links and the inspectors values of the page at once.
+    A browser is asked with one script, so the time does not grow with the number of elements.
+    :param page: A Selenium driver, a static driver or a static element
+    :param scopes: The XPaths of the elements containing the links, empty if the links are not needed
+    :param plan: The extraction plan of the template, None to only read the links
+    :return: The content of the page
+    """
+    if isinstance(page, StaticDriver):
+        return extract_static(page.tree, scopes, plan)
+    if isinstance(page, StaticElement):
+        return extract_static(page.node, scopes, plan)
+    inspectors = plan.inspectors if plan is not None else ()
+    payload = page.execute_script(
+        EXTRACTION_SCRIPT,
+        list(scopes),
+        [[inspector.selector, inspector.attribute] for inspector in inspectors],
+        plan.record_selector if plan is not None else "",
+    )
+    return PageContent(**json.loads(payload))
+
+
+def evaluate_inspector(node, inspector) -> list[StaticElement]:
+    selector = inspector.xpath if inspector.xpath is not None else inspector.selector
+    return evaluate_xpath(node, By.XPATH, selector)
+
+
+def static_value(element: StaticElement, inspector) -> tuple[str, str | None]:
+    attribute = None
+    if inspector.attribute != "":
+        attribute = element.get_attribute(inspector.attribute)
+    return element.text, attribute
+
+
+def extract_static(node, scopes: Sequence[str], plan) -> PageContent:
+    """
+    The same extraction on a page parsed by lxml.
+    """
+    content = PageContent()
+    inspectors = plan.inspectors if plan is not None else ()
+    # Empty pages and XPaths returning strings have nothing to look up
+    if node is None or isinstance(node, str):
+        if plan is not None and plan.record_selector == "":
+            content.values = [[] for _ in inspectors]
+        return content
+
+    seen = set()
+    for scope in scopes:
+        try:
+            elements = evaluate_xpath(node, By.XPATH, scope)
+        except InvalidSelectorException as e:
+            content.errors.append(f"{scope}: {e.msg}")
+            continue
+        for element in elements:
+            if isinstance(element.node, str):
+                continue
+            for a in LINKS_XPATH(element.node):
+                href = a.get("href")
+                if href is not None and href not in seen:
+                    seen.add(href)
+                    content.links.append(href)
+
+    if plan is None:
+        return content
+    if plan.record_selector != "":
+        record_selector = (
+            plan.record_xpath if plan.record_xpath is not None else plan.record_selector
+        )
+        try:
+            records = evaluate_xpath(node, By.XPATH, record_selector)
+        except InvalidSelectorException as e:
+            content.errors.append(f"{plan.record_selector}: {e.msg}")
+            return content
+        for record in records:
+            if isinstance(record.node, str):
+                continue
+            values = []
+            for inspector in inspectors:
+                try:
+                    elements = evaluate_inspector(record.node, inspector)
+                except InvalidSelectorException as e:
+                    error = f"{inspector.selector}: {e.msg}"
+                    if error not in content.errors:
+                        content.errors.append(error)
+                    elements = []
+                values.append(
+                    static_value(elements[0], inspector) if elements else None
+                )
+            content.records.append(values)
+        return content
+
+    for inspector in inspectors:
+        try:
+            elements = evaluate_inspector(node, inspector)
+        except InvalidSelectorException as e:
+            content.errors.append(f"{inspector.selector}: {e.msg}")
+            content.values.append([])
+            continue
+        content.values.append(
+            [static_value(element, inspector) for element in elements]
+        )
+    return content
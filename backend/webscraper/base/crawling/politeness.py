@@ -0,0 +1,174 @@
+import random
+import threading
+import time
+from typing import Callable
+from urllib.parse import urlparse
+
+# Answers of an overloaded or temporarily broken host, the page is tried again later
+TRANSIENT_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """
+    Gives one token every `interval` seconds, at most `burst` tokens are saved while the host is idle.
+    Tokens are reserved in advance, so waiting threads are served in the order they came.
+    """
+
+    def __init__(self, interval: float, burst: int = 1, now: float = 0):
+        self.interval = interval
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """
+        Take a token.
+        :param now: The current monotonic time
+        :return: Seconds to wait before the token can be used
+        """
+        if self.interval <= 0:
+            return 0
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) / self.interval
+        )
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens * self.interval
+
+
+class HostScheduler:
+    """
+    Spaces the requests sent to every host with a token bucket per host.
+    The interval of a host starts at `min_interval`, or the crawl delay of its ROBOTS.txt if that is longer.
+    It doubles when the host fails or throttles us, and shrinks back to its floor after every good answer,
+    so the crawler settles at the fastest rate the host accepts.
+    """
+
+    # Interval of a host without a delay after its first failure
+    MIN_BACKOFF_INTERVAL = 1
+    MAX_INTERVAL = 60
+    # The interval is multiplied by this after a good answer
+    RECOVERY = 0.8
+
+    def __init__(
+        self,
+        min_interval: float,
+        crawl_delay: Callable[[str], float | None] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param min_interval: Minimum seconds between two requests to the same host
+        :param crawl_delay: Returns the delay asked by the ROBOTS.txt of the URL, None if there is none
+        :param clock: Monotonic time in seconds
+        """
+        self.min_interval = min_interval
+        self.crawl_delay = crawl_delay
+        self.clock = clock
+        self.buckets: dict[str, TokenBucket] = {}
+        # The interval of a host never goes below its floor
+        self.floors: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+        # statistics
+        self.waits = 0
+        self.wait_time = 0.0
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = self.host(url)
+        bucket = self.buckets.get(host)
+        if bucket is not None:
+            return bucket
+        # ROBOTS.txt may be downloaded here, so it is read outside the lock
+        floor = self.min_interval
+        if self.crawl_delay is not None:
+            floor = max(floor, self.crawl_delay(url) or 0)
+        with self.lock:
+            if host not in self.buckets:
+                self.floors[host] = floor
+                self.buckets[host] = TokenBucket(floor, now=self.clock())
+            return self.buckets[host]
+
+    def interval(self, url: str) -> float:
+        return self.bucket(url).interval
+
+    def reserve(self, url: str) -> float:
+        """
+        Take the turn of a request to the host of the URL.
+        :return: Seconds to wait before sending the request
+        """
+        bucket = self.bucket(url)
+        with self.lock:
+            delay = bucket.reserve(self.clock())
+            if delay > 0:
+                self.waits += 1
+                self.wait_time += delay
+            return delay
+
+    def wait(self, url: str, stop: threading.Event | None = None) -> bool:
+        """
+        Block until a request can be sent to the host of the URL.
+        :param url: The URL to request
+        :param stop: Interrupts the wait when it is set
+        :return: False if the wait was interrupted
+        """
+        delay = self.reserve(url)
+        if delay <= 0:
+            return True
+        if stop is None:
+            time.sleep(delay)
+            return True
+        return not stop.wait(delay)
+
+    def feedback(self, url: str, success: bool) -> None:
+        """
+        Adapt the rate of the host to its last answer.
+        :param url: The requested URL
+        :param success: False if the request failed or the host throttled it
+        """
+        bucket = self.bucket(url)
+        floor = self.floors[self.host(url)]
+        with self.lock:
+            if success:
+                bucket.interval = max(floor, bucket.interval * self.RECOVERY)
+            else:
+                bucket.interval = min(
+                    self.MAX_INTERVAL,
+                    max(bucket.interval * 2, floor, self.MIN_BACKOFF_INTERVAL),
+                )
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter between the attempts of a page.
+    """
+
+    def __init__(self, retries: int, base_delay: float = 1, max_delay: float = 30):
+        """
+        :param retries: Attempts after the first one
+        :param base_delay: Seconds before the first retry, it doubles with every retry
+        :param max_delay: Maximum seconds between two attempts
+        """
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @property
+    def attempts(self) -> int:
+        return self.retries + 1
+
+    def delay(self, attempt: int) -> float:
+        """
+        :param attempt: The failed attempt, starting from 0
+        :return: Seconds to wait before the next attempt
+        """
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        # Threads failing together do not come back together
+        return delay * random.uniform(0.5, 1)
+
+    @staticmethod
+    def is_transient(status_code: int | None) -> bool:
+        return status_code in TRANSIENT_STATUS_CODES
@@ -0,0 +1,187 @@
+import heapq
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Iterator
+
+
+class Span:
+    """
+    The time a thread spent on one page, or on one batch of the document writer, split by phase.
+    """
+
+    def __init__(self, profiler: "CrawlProfiler", name: str, kind: str):
+        self.profiler = profiler
+        self.name = name
+        self.kind = kind
+        self.thread_id = threading.get_native_id()
+        self.phases: dict[str, float] = {}
+        self.started = 0.0
+        self.duration = 0.0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Add the seconds spent in the block to the phase, failed blocks are measured too.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def __enter__(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.duration = time.perf_counter() - self.started
+        self.profiler.record(self)
+
+
+class NullSpan:
+    def phase(self, name: str):
+        return nullcontext()
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+class SpanTotals:
+    """
+    The totals of one kind of spans, with the slowest spans kept in a heap of `size` items.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.count = 0
+        self.seconds = 0.0
+        self.phases: dict[str, float] = {}
+        self.slowest: list[tuple[float, str]] = []
+
+    def add(self, span: Span) -> None:
+        self.count += 1
+        self.seconds += span.duration
+        for name, value in span.phases.items():
+            self.phases[name] = self.phases.get(name, 0) + value
+        if len(self.slowest) < self.size:
+            heapq.heappush(self.slowest, (span.duration, span.name))
+        else:
+            heapq.heappushpop(self.slowest, (span.duration, span.name))
+
+    def summary(self) -> dict:
+        phases = dict(self.phases)
+        # Time spent between the measured phases
+        phases["other"] = max(0.0, self.seconds - sum(phases.values()))
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "phases": {
+                name: {
+                    "seconds": seconds,
+                    "share": seconds / self.seconds if self.seconds else 0,
+                }
+                for name, seconds in sorted(
+                    phases.items(), key=lambda item: item[1], reverse=True
+                )
+            },
+            "slowest": [
+                {"name": name, "seconds": duration}
+                for duration, name in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+class CrawlProfiler:
+    """
+    Records where the time of a runner goes, every span is appended as one JSON line to `{path}.jsonl`:
+    {"k": kind, "t": thread id, "n": url or batch, "s": start since the profiler started, "d": seconds, "p": phases}
+    Lines are buffered and only the totals and the slowest spans are kept in memory,
+    so it is cheap enough to be left on in production.
+    """
+
+    # Spans of the crawling threads
+    PAGE = "page"
+    # Spans of the document writer
+    BATCH = "batch"
+
+    def __init__(self, path: str, slowest: int = 10, mode: str = "w"):
+        """
+        :param path: Prefix of the trace and the summary files
+        :param slowest: Number of the slowest spans of every kind in the summary
+        :param mode: "a" to keep the trace of a resumed runner, the summary only covers this run
+        """
+        self.trace_path = f"{path}.jsonl"
+        self.summary_path = f"{path}.summary.json"
+        self.slowest = slowest
+        self.file = open(self.trace_path, mode, encoding="utf-8", buffering=1 << 16)
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.totals: dict[str, SpanTotals] = {}
+
+    def page(self, url: str) -> Span:
+        return Span(self, url, self.PAGE)
+
+    def batch(self, name: str) -> Span:
+        return Span(self, name, self.BATCH)
+
+    def record(self, span: Span) -> None:
+        line = json.dumps(
+            {
+                "k": span.kind,
+                "t": span.thread_id,
+                "n": span.name,
+                "s": round(span.started - self.started, 6),
+                "d": round(span.duration, 6),
+                "p": {name: round(value, 6) for name, value in span.phases.items()},
+            },
+            separators=(",", ":"),
+        )
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(line + "\n")
+            totals = self.totals.get(span.kind)
+            if totals is None:
+                totals = self.totals[span.kind] = SpanTotals(self.slowest)
+            totals.add(span)
+
+    def summary(self) -> dict:
+        """
+        :return: The time share of every phase and the slowest spans, by kind of span
+        """
+        with self.lock:
+            return {kind: totals.summary() for kind, totals in self.totals.items()}
+
+    def close(self) -> dict:
+        """
+        Writes the rest of the trace and the summary.
+        :return: The summary
+        """
+        with self.lock:
+            self.file.close()
+        summary = self.summary()
+        with open(self.summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+class NullProfiler:
+    """
+    Used when the profiling of the crawler is disabled, it records nothing.
+    """
+
+    span = NullSpan()
+
+    def page(self, url: str) -> NullSpan:
+        return self.span
+
+    def batch(self, name: str) -> NullSpan:
+        return self.span
+
+    def close(self) -> dict:
+        return {}
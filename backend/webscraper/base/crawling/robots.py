@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+
+class RobotsRules:
+    """
+    The parsed ROBOTS.txt of one host, the decision of each URL is cached after the first check.
+    """
+
+    # The cache of decisions is cleared when it becomes bigger than this
+    MAX_CACHED_DECISIONS = 100_000
+
+    def __init__(self, content: str | None, expires_at: float, disallow_all=False):
+        """
+        :param content: ROBOTS.txt file content, None if the host does not have one
+        :param expires_at: Time when the file should be fetched again
+        :param disallow_all: The host refused to give us the file (401 or 403)
+        """
+        self.content = content
+        self.expires_at = expires_at
+        self.disallow_all = disallow_all
+        self.parser = None
+        if content:
+            self.parser = RobotFileParser()
+            self.parser.parse(content.splitlines())
+        self.decisions: dict[tuple[str, str], bool] = {}
+
+    def can_fetch(self, user_agent: str, url: str) -> bool:
+        if self.disallow_all:
+            return False
+        if self.parser is None:
+            return True
+        parsed_url = urlparse(url)
+        key = (user_agent, f"{parsed_url.path}?{parsed_url.query}")
+        decision = self.decisions.get(key)
+        if decision is None:
+            if len(self.decisions) >= self.MAX_CACHED_DECISIONS:
+                self.decisions = {}
+            decision = self.parser.can_fetch(user_agent, url)
+            self.decisions[key] = decision
+        return decision
+
+    def crawl_delay(self, user_agent: str) -> float | None:
+        """
+        The minimum seconds between two requests, taken from `Crawl-delay` and `Request-rate`.
+        :param user_agent: User used to crawl
+        :return: Delay in seconds or None if the host did not set it
+        """
+        if self.parser is None:
+            return None
+        delays = []
+        crawl_delay = self.parser.crawl_delay(user_agent)
+        if crawl_delay is not None:
+            delays.append(float(crawl_delay))
+        request_rate = self.parser.request_rate(user_agent)
+        if request_rate is not None and request_rate.requests > 0:
+            delays.append(request_rate.seconds / request_rate.requests)
+        return max(delays) if delays else None
+
+
+class RobotsCache:
+    """
+    ROBOTS.txt files of all the hosts, shared between the threads and the runners of the process.
+    Each file is fetched and parsed once, then kept in memory and on disk until it expires.
+    """
+
+    def __init__(self, directory: str | None, ttl: float = 86400, timeout: float = 10):
+        """
+        :param directory: Where the files are cached on disk, None to keep them only in memory
+        :param ttl: Seconds before a file is fetched again
+        :param timeout: Timeout of fetching a file in seconds
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # The key is the URL of the ROBOTS.txt file
+        self.rules: dict[str, RobotsRules] = {}
+        # One lock per file, so a file is fetched only once when many threads need it
+        self.fetch_locks: dict[str, threading.Lock] = {}
+        # Hosts using the ROBOTS.txt of another location, see `Crawler.robot_file_url`
+        self.robots_urls: dict[str, str] = {}
+
+    @staticmethod
+    def origin(url: str) -> str:
+        parsed_url = urlparse(url)
+        return f"{parsed_url.scheme}://{parsed_url.netloc}"
+
+    def set_robots_url(self, url: str, robots_url: str) -> None:
+        """
+        Use another ROBOTS.txt for the host of the URL.
+        :param url: Any link of the host
+        :param robots_url: Link of the ROBOTS.txt file or of the host it belongs to
+        """
+        if not urlparse(robots_url).path.endswith("robots.txt"):
+            robots_url = f"{self.origin(robots_url)}/robots.txt"
+        with self.lock:
+            self.robots_urls[self.origin(url)] = robots_url
+
+    def robots_url(self, url: str) -> str:
+        origin = self.origin(url)
+        return self.robots_urls.get(origin, f"{origin}/robots.txt")
+
+    @staticmethod
+    def is_fresh(rules: RobotsRules | None) -> bool:
+        return rules is not None and time.time() < rules.expires_at
+
+    def disk_path(self, robots_url: str) -> str:
+        file_name = hashlib.sha1(robots_url.encode()).hexdigest()
+        return os.path.join(self.directory, f"{file_name}.robots.json")
+
+    def read_from_disk(self, robots_url: str) -> RobotsRules | None:
+        if self.directory is None:
+            return None
+        try:
+            with open(self.disk_path(robots_url), "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return RobotsRules(
+            cached["content"], cached["expires_at"], cached["disallow_all"]
+        )
+
+    def write_to_disk(self, robots_url: str, rules: RobotsRules) -> None:
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.disk_path(robots_url)
+        # Written to a temporary file first, so other processes never read half a file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_native_id()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "url": robots_url,
+                    "content": rules.content,
+                    "expires_at": rules.expires_at,
+                    "disallow_all": rules.disallow_all,
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+
+    def fetch(self, robots_url: str) -> RobotsRules | None:
+        """
+        Fetch and parse the ROBOTS.txt file
+        :param robots_url: Location of the file
+        :return: The rules, None if the host is not reachable
+        """
+        try:
+            response = requests.get(robots_url, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            return None
+        expires_at = time.time() + self.ttl
+        if response.status_code == 200:
+            return RobotsRules(response.text, expires_at)
+        return RobotsRules(
+            None, expires_at, disallow_all=response.status_code in (401, 403)
+        )
+
+    def rules_for(self, url: str) -> RobotsRules:
+        """
+        Find the rules of the host of the URL, they are fetched only if they are not cached or expired.
+        :param url: Any link of the host
+        :return: The rules of the host
+        """
+        robots_url = self.robots_url(url)
+        rules = self.rules.get(robots_url)
+        if self.is_fresh(rules):
+            return rules
+
+        with self.lock:
+            fetch_lock = self.fetch_locks.setdefault(robots_url, threading.Lock())
+        with fetch_lock:
+            # Another thread may have fetched it while we were waiting
+            rules = self.rules.get(robots_url)
+            if self.is_fresh(rules):
+                return rules
+            rules = self.read_from_disk(robots_url)
+            if not self.is_fresh(rules):
+                rules = self.fetch(robots_url)
+                if rules is not None:
+                    self.write_to_disk(robots_url, rules)
+                else:
+                    # The host is not reachable now, we allow everything and try again later
+                    rules = RobotsRules(None, time.time() + min(self.ttl, 300))
+            self.rules[robots_url] = rules
+        return rules
+
+    def can_fetch(self, user_agent: str, url: str) -> bool:
+        """
+        Checks if the crawler allowed to crawl a link
+        :param user_agent: User used to crawl
+        :param url: The link wanted to be crawled
+        """
+        if not url:
+            return True
+        return self.rules_for(url).can_fetch(user_agent, url)
+
+    def crawl_delay(self, user_agent: str, url: str) -> float | None:
+        return self.rules_for(url).crawl_delay(user_agent)
@@ -0,0 +1,83 @@
+"""
+Compares the memory used to remember the discovered links between the previous
+`dict[str, Link]` and the compact seen sets, the numbers are then projected to 10M links.
+
+The URLs are synthetic but have the length of the product pages of a shop.
+Run it from backend/webscraper, like the other benchmarks:
+
+    python -m base.crawling.seen_set_benchmark
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from .seen_set import BloomFilter, FingerprintSet
+from ..dataclasses import Link
+
+
+def synthetic_urls(count: int):
+    return (
+        f"https://www.example-shop.com/category-{i % 97}/products/product-{i}?color=blue&size={i % 7}"
+        for i in range(count)
+    )
+
+
+def fill(count: int, create, add):
+    seen = create()
+    for url in synthetic_urls(count):
+        add(seen, url)
+    return seen
+
+
+def measure(name: str, count: int, create, add) -> dict:
+    # Tracing the allocations slows everything down, so the time is measured in a separate run
+    start = time.perf_counter()
+    fill(count, create, add)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    seen = fill(count, create, add)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del seen
+    return {"name": name, "memory": memory, "elapsed": elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    parser.add_argument("--projected-urls", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    def add_to_dict(links: dict, url: str) -> None:
+        if url not in links:
+            links[url] = Link(url)
+
+    results = [
+        measure("dict[str, Link]", args.urls, dict, add_to_dict),
+        measure("FingerprintSet", args.urls, FingerprintSet, FingerprintSet.add),
+        measure(
+            "BloomFilter 1%",
+            args.urls,
+            lambda: BloomFilter(capacity=args.urls),
+            BloomFilter.add,
+        ),
+    ]
+    scale = args.projected_urls / args.urls
+    print(
+        f"{'seen set':<18}{'MB':>10}{'bytes/url':>11}"
+        f"{f'MB for {args.projected_urls:,}':>20}{'seconds':>9}"
+    )
+    for result in results:
+        print(
+            f"{result['name']:<18}{result['memory'] / 2**20:>10.1f}"
+            f"{result['memory'] / args.urls:>11.1f}"
+            f"{result['memory'] * scale / 2**20:>20.0f}{result['elapsed']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
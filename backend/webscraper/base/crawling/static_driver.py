@@ -0,0 +1,110 @@
+import lxml.html
+import requests
+from lxml import etree
+from selenium.common import InvalidSelectorException, NoSuchElementException
+from selenium.webdriver.common.by import By
+
+from .network_events import PageResponse
+
+
+class StaticElement:
+    """
+    Wraps an lxml node, so it can be used the same way as a Selenium WebElement.
+    """
+
+    def __init__(self, node):
+        self.node = node
+
+    @property
+    def text(self) -> str:
+        # XPaths like `//a/@href` or `//h1/text()` return strings instead of nodes
+        if isinstance(self.node, str):
+            return str(self.node).strip()
+        return self.node.text_content().strip()
+
+    def get_attribute(self, name: str) -> str | None:
+        if isinstance(self.node, str):
+            return None
+        return self.node.get(name)
+
+    def find_elements(
+        self, by: str, selector: str | etree.XPath
+    ) -> list["StaticElement"]:
+        if isinstance(self.node, str):
+            return []
+        return evaluate_xpath(self.node, by, selector)
+
+
+def evaluate_xpath(node, by: str, selector: str | etree.XPath) -> list[StaticElement]:
+    """
+    Evaluates the selector on an lxml node, only XPaths are supported as we do not have a browser engine.
+    :param node: The root node of the search
+    :param by: The Selenium locator strategy
+    :param selector: The XPath expression, or the expression compiled with `etree.XPath`
+    :return: list of the matched elements
+    """
+    if by != By.XPATH:
+        raise InvalidSelectorException(f"Static engine supports only XPath, got: {by}")
+    try:
+        if isinstance(selector, etree.XPath):
+            result = selector(node)
+        else:
+            result = node.xpath(selector)
+    except etree.XPathError as e:
+        raise InvalidSelectorException(f"Invalid XPath {selector}: {e}")
+    # Expressions like `count(//a)` do not return a node set
+    if not isinstance(result, list):
+        return [StaticElement(str(result))]
+    return [StaticElement(element) for element in result]
+
+
+class StaticDriver:
+    """
+    A lightweight replacement of the Chrome WebDriver, pages are fetched with a pooled HTTP session and parsed by lxml.
+    It is meant for sites that serve fully rendered HTML, so no JavaScript is executed.
+    """
+
+    def __init__(self, session: requests.Session, timeout: float):
+        self.session = session
+        self.timeout = timeout
+        self.current_url = ""
+        self.page_source = ""
+        self.status_code = None
+        self.response: PageResponse | None = None
+        self.tree = None
+
+    def get(self, url: str) -> None:
+        response = self.session.get(url, timeout=self.timeout)
+        self.current_url = response.url
+        self.status_code = response.status_code
+        self.page_source = response.text
+        self.response = PageResponse(
+            url=response.url,
+            status_code=response.status_code,
+            size=len(response.content),
+            load_time=response.elapsed.total_seconds(),
+        )
+        try:
+            self.tree = lxml.html.document_fromstring(response.content)
+            # Selenium returns absolute links for the `href` attribute, we do the same
+            self.tree.make_links_absolute(response.url, resolve_base_href=True)
+        except (etree.ParserError, ValueError):
+            # Empty or non HTML pages
+            self.tree = None
+
+    def find_elements(
+        self, by: str, selector: str | etree.XPath
+    ) -> list[StaticElement]:
+        if self.tree is None:
+            return []
+        return evaluate_xpath(self.tree, by, selector)
+
+    def find_element(self, by: str, selector: str) -> StaticElement:
+        elements = self.find_elements(by, selector)
+        if len(elements) == 0:
+            raise NoSuchElementException(f"No element found for: {selector}")
+        return elements[0]
+
+    def quit(self) -> None:
+        # The HTTP session is shared between the threads and closed by the runner
+        self.tree = None
@@ -0,0 +1,113 @@
+import posixpath
+import re
+from fnmatch import fnmatchcase
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track the visitor, they never change the content of the page
+TRACKING_PARAMS = [
+    "utm_*",
+    "gclid",
+    "dclid",
+    "fbclid",
+    "msclkid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_hsenc",
+    "_hsmi",
+]
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Characters kept as they are in the path, everything else is percent-encoded
+SAFE_PATH_CHARACTERS = "/:@!$&'()*+,;=-._~"
+
+
+class UrlCanonicalizer:
+    """
+    Rewrites URLs to one canonical form, so the same page is not crawled twice because
+    its links are written differently, for example `/a?x=1&y=2` and `/A/../a?y=2&x=1#top`.
+    """
+
+    def __init__(
+        self,
+        stripped_params: list[str] | None = None,
+        sort_params: bool = True,
+        remove_trailing_slash: bool = False,
+    ):
+        """
+        :param stripped_params: Query parameters to remove, shell wildcards like `utm_*` are allowed
+        :param sort_params: Order the query parameters by name
+        :param remove_trailing_slash: `/products/` and `/products` are the same page, off by default because
+         many servers answer the URL without its slash with a redirect or a 404
+        """
+        stripped_params = (
+            TRACKING_PARAMS if stripped_params is None else stripped_params
+        )
+        stripped_params = [param.strip().lower() for param in stripped_params]
+        self.stripped_names = {
+            param for param in stripped_params if param and "*" not in param
+        }
+        self.stripped_patterns = [param for param in stripped_params if "*" in param]
+        self.sort_params = sort_params
+        self.remove_trailing_slash = remove_trailing_slash
+
+    def is_stripped(self, name: str) -> bool:
+        name = name.lower()
+        if name in self.stripped_names:
+            return True
+        return any(fnmatchcase(name, pattern) for pattern in self.stripped_patterns)
+
+    def normalize_path(self, path: str) -> str:
+        if path == "":
+            return "/"
+        normalized = posixpath.normpath(path)
+        # normpath keeps two leading slashes and removes the trailing one
+        if normalized.startswith("//"):
+            normalized = "/" + normalized.lstrip("/")
+        if path.endswith("/") and normalized != "/" and not self.remove_trailing_slash:
+            normalized += "/"
+        # Encode the characters which are not allowed, `%2f` and `%2F` are the same escape
+        normalized = quote(normalized, safe=SAFE_PATH_CHARACTERS + "%")
+        return re.sub(
+            r"%[0-9a-fA-F]{2}", lambda match: match.group().upper(), normalized
+        )
+
+    def canonicalize(self, url: str) -> str:
+        """
+        :param url: An absolute URL
+        :return: The canonical form of the URL, without the fragment
+        """
+        try:
+            parts = urlsplit(url.strip())
+            port = parts.port
+        except ValueError:
+            # Invalid URLs are kept as they are, the fetch will report them
+            return url
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS:
+            return url
+        host = (parts.hostname or "").rstrip(".")
+        if ":" in host:
+            # IPv6 addresses
+            host = f"[{host}]"
+        netloc = host
+        if port is not None and port != DEFAULT_PORTS[scheme]:
+            netloc = f"{host}:{port}"
+        if parts.username:
+            credentials = parts.username
+            if parts.password:
+                credentials += f":{parts.password}"
+            netloc = f"{credentials}@{netloc}"
+
+        params = [
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not self.is_stripped(name)
+        ]
+        if self.sort_params:
+            # The order of the values of a repeated parameter can matter, only the names are sorted
+            params.sort(key=lambda param: param[0])
+        return urlunsplit(
+            (scheme, netloc, self.normalize_path(parts.path), urlencode(params), "")
+        )
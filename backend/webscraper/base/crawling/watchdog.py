@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+
+class Watch:
+    def __init__(self, deadline: float, on_expire: Callable[[], None]):
+        self.deadline = deadline
+        self.on_expire = on_expire
+        self.expired = False
+
+
+class Watchdog:
+    """
+    Ends the calls that take longer than their deadline, like a browser that hangs and ignores its timeouts.
+    The watchdog does not interrupt the call itself, `on_expire` must make it fail, like killing the driver.
+    """
+
+    def __init__(
+        self, check_interval: float = 0.5, logger: logging.Logger | None = None
+    ):
+        """
+        :param check_interval: Seconds between two checks of the deadlines
+        :param logger: Logger of the runner
+        """
+        self.check_interval = check_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.watches: set[Watch] = set()
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+        # statistics
+        self.expired = 0
+
+    @contextmanager
+    def watch(self, timeout: float, on_expire: Callable[[], None]) -> Iterator[Watch]:
+        """
+        Watch the code of the block.
+        :param timeout: Seconds the block may take
+        :param on_expire: Called from the watchdog thread once the block is late
+        :return: The watch, `watch.expired` tells if the block was ended by the watchdog
+        """
+        watch = Watch(time.monotonic() + timeout, on_expire)
+        with self.lock:
+            self.watches.add(watch)
+        try:
+            yield watch
+        finally:
+            with self.lock:
+                self.watches.discard(watch)
+
+    def run(self) -> None:
+        while not self.closed.wait(self.check_interval):
+            now = time.monotonic()
+            with self.lock:
+                late = [
+                    watch
+                    for watch in self.watches
+                    if not watch.expired and watch.deadline <= now
+                ]
+                for watch in late:
+                    watch.expired = True
+                    self.expired += 1
+            for watch in late:
+                try:
+                    watch.on_expire()
+                except Exception as e:
+                    self.logger.error(f"Watchdog could not end a late call: {e}")
+
+    def close(self) -> None:
+        self.closed.set()
+        self.thread.join()
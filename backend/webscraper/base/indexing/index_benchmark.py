@@ -0,0 +1,143 @@
+"""
+Measures the build of the inverted index on the Stack Overflow dataset, the corpus is repeated
+to check that the build time grows linearly with its size. The largest index is then saved and
+the searches of the benchmark queries are timed on the loaded file, like after a restart.
+
+The rows are streamed from the CSV file like the values are streamed from the database by
+`create_index`, so the benchmark does not need a database. Run it from backend/webscraper:
+
+    python -m base.indexing.index_benchmark
+"""
+
+import argparse
+import csv
+import os
+import pathlib
+import tempfile
+import time
+import tracemalloc
+from typing import Iterator
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webscraper.settings")
+django.setup()
+
+from .inverted_index import InvertedIndex  # noqa: E402
+
+DATASET = (
+    pathlib.Path(__file__).resolve().parents[4]
+    / "datasets"
+    / "stack_overflow_posts_dataset.csv"
+)
+# One query per line, followed by a tab and the expected document ids
+QUERIES = DATASET.with_name("benchmark.txt")
+
+
+def read_rows(path: pathlib.Path, copies: int) -> Iterator[tuple[int, int, str]]:
+    """
+    Streams the (inspector value id, document id, value) rows of the dataset `copies` times,
+    the ids of every copy are shifted so the copies are different documents.
+    """
+    for copy in range(copies):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield (
+                    int(row["id"]) + copy * 10_000_000,
+                    int(row["document id"]) + copy * 10_000_000,
+                    row["value"],
+                )
+
+
+def read_queries(path: pathlib.Path) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.split("\t")[0] for line in f if line.strip()]
+
+
+def search(index: InvertedIndex, query: str) -> list:
+    """
+    Searches the query like the search view, without reading the documents.
+    """
+    keywords = []
+    for word in query.lower().split():
+        word = index.normalize(word)
+        keywords += index.find_matches(word, len(word) // 4)
+    return index.process_query(keywords, None, k=25, max_score=True)
+
+
+def cold_start(index: InvertedIndex, queries: list[str]) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.index")
+        start = time.perf_counter()
+        size = index.save(path)
+        saved = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = InvertedIndex.load(path)
+        load = time.perf_counter() - start
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            search(loaded, query)
+            latencies.append(time.perf_counter() - start)
+    return {"size": size, "save": saved, "load": load, "latencies": latencies}
+
+
+def build(path: pathlib.Path, copies: int, memory: bool) -> dict:
+    if memory:
+        tracemalloc.start()
+    index = InvertedIndex(3)
+    start = time.perf_counter()
+    values = index.build(read_rows(path, copies), small_words_threshold=2)
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "values": values,
+        "words": len(index.inverted_lists),
+        "postings": sum(len(postings) for postings in index.inverted_lists.values()),
+        "elapsed": elapsed,
+        "peak": peak,
+        "index": index,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dataset", type=pathlib.Path, default=DATASET)
+    parser.add_argument("--queries", type=pathlib.Path, default=QUERIES)
+    parser.add_argument("--copies", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Trace the peak memory, the build is slower",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'copies':>6} {'values':>8} {'words':>8} {'postings':>9} {'seconds':>8} {'µs/value':>9} {'peak MB':>8}"
+    )
+    for copies in args.copies:
+        result = build(args.dataset, copies, args.memory)
+        print(
+            f"{copies:>6} {result['values']:>8} {result['words']:>8} {result['postings']:>9}"
+            f" {result['elapsed']:>8.2f} {result['elapsed'] / result['values'] * 1e6:>9.1f}"
+            f" {result['peak'] / 1048576 if args.memory else float('nan'):>8.1f}"
+        )
+
+    queries = read_queries(args.queries)
+    start = cold_start(result["index"], queries)
+    print(
+        f"\nSaved {start['size'] / 1048576:.1f} MB in {start['save']:.2f}s,"
+        f" loaded in {start['load'] * 1000:.2f} ms instead of a {result['elapsed']:.2f}s build"
+    )
+    print(
+        f"First search after the load: {start['latencies'][0] * 1000:.1f} ms,"
+        f" mean of {len(queries)} searches: {sum(start['latencies']) / len(queries) * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Binary file of a built inverted index. The file is memory-mapped read-only, nothing is decoded
+before it is needed, so loading is immediate and all the processes share the same pages of the OS cache.
+
+Layout (little-endian):
+    header      magic, format version, q, number of sections
+    sections    one entry per array: name, item format, offset and number of items
+    arrays      the arrays themselves, aligned to 8 bytes
+
+Strings are stored as a blob of UTF-8 bytes with an array of offsets, the terms and the q-grams
+are sorted by their bytes, so they are found by binary search without reading the whole table.
+Lists, like the postings of a term, are slices of parallel arrays given by an array of offsets.
+
+Versions:
+    1   postings as (doc_id, inspector value id, score, document id) arrays
+    2   postings as doc_id, term frequency and score arrays with a table of the documents,
+        the doc_ids may be compressed
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Callable, Iterable, Iterator
+
+MAGIC = b"WSIX"
+VERSION = 2
+HEADER = struct.Struct("<4sHHI")
+NAME_SIZE = 16
+SECTION = struct.Struct(f"<{NAME_SIZE}s8sQQ")
+ALIGNMENT = 8
+
+
+class IndexFormatError(ValueError):
+    """
+    The file is not an index or it was written by another version of the format.
+    """
+
+
+def string_table(strings: Iterable[str]) -> tuple[array, bytes]:
+    """
+    :return: The offsets and the blob of the UTF-8 encoded strings
+    """
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for string in strings:
+        blob += string.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def offsets_table(lengths: Iterable[int]) -> array:
+    """
+    :return: The offsets of consecutive slices of the given lengths
+    """
+    offsets = array("Q", [0])
+    for length in lengths:
+        offsets.append(offsets[-1] + length)
+    return offsets
+
+
+def write_index(path: str, q: int, arrays: dict[str, array | bytes]) -> int:
+    """
+    Writes the arrays to a temporary file and moves it to `path`, processes which
+    mapped the previous file keep reading it until they load the new one.
+    :param q: The q of the q-grams of the index
+    :param arrays: The arrays by name, bytes are stored as unsigned chars
+    :return: The size of the file
+    """
+    sections = []
+    offset = HEADER.size + SECTION.size * len(arrays)
+    for name, data in arrays.items():
+        if len(name.encode()) > NAME_SIZE:
+            raise ValueError(
+                f"The section name {name} is longer than {NAME_SIZE} bytes"
+            )
+        if isinstance(data, bytes):
+            data = array("B", data)
+        if sys.byteorder != "little":
+            data = array(data.typecode, data)
+            data.byteswap()
+        offset += -offset % ALIGNMENT
+        sections.append((name, data, offset))
+        offset += len(data) * data.itemsize
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, q, len(sections)))
+        for name, data, data_offset in sections:
+            f.write(
+                SECTION.pack(
+                    name.encode(), data.typecode.encode(), data_offset, len(data)
+                )
+            )
+        for name, data, data_offset in sections:
+            f.write(b"\0" * (data_offset - f.tell()))
+            data.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return offset
+
+
+class IndexFile:
+    """
+    The arrays of an index file, every array is a memoryview of the mapped file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime_ns
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        if len(view) < HEADER.size:
+            raise IndexFormatError(f"{path} is not an index file")
+        magic, version, self.q, count = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise IndexFormatError(f"{path} is not an index file")
+        if version != VERSION:
+            raise IndexFormatError(
+                f"{path} has the format version {version}, {VERSION} is expected"
+            )
+        self.version = version
+        self.arrays: dict[str, memoryview] = {}
+        for i in range(count):
+            name, item_format, offset, length = SECTION.unpack_from(
+                view, HEADER.size + i * SECTION.size
+            )
+            item_format = item_format.rstrip(b"\0").decode()
+            size = array(item_format).itemsize
+            self.arrays[name.rstrip(b"\0").decode()] = view[
+                offset : offset + length * size
+            ].cast(item_format)
+
+    def __getitem__(self, name: str) -> memoryview:
+        return self.arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arrays
+
+
+class StringTable(Sequence):
+    """
+    Strings of an index file, they are decoded when they are read.
+    """
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.key(i).decode("utf-8")
+
+    def key(self, i: int) -> bytes:
+        return bytes(self.blob[self.offsets[i] : self.offsets[i + 1]])
+
+    def find(self, string: str) -> int:
+        """
+        Binary search of a table sorted by the UTF-8 bytes of the strings.
+        :return: The position of the string, -1 if it is not in the table
+        """
+        key = string.encode("utf-8")
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self.key(low) == key:
+            return low
+        return -1
+
+
+class ListTable(Mapping):
+    """
+    Lists of an index file by their sorted string key, like the postings of the terms.
+    A list is only read from the arrays when it is accessed.
+    """
+
+    def __init__(self, keys: StringTable, read: Callable[[int], object]):
+        """
+        :param keys: The sorted keys
+        :param read: Reads the list of the key at the given position
+        """
+        self.keys = keys
+        self.read = read
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.keys.find(key) != -1
+
+    def __getitem__(self, key: str):
+        i = self.keys.find(key)
+        if i == -1:
+            raise KeyError(key)
+        return self.read(i)
@@ -1,8 +1,35 @@
 import os
 import pathlib
+import struct
+import tempfile
+import math
+import random
 import unittest
+from array import array
 
+from backend.webscraper.base.indexing.index_file import (
+    HEADER,
+    IndexFile,
+    IndexFormatError,
+    ListTable,
+    StringTable,
+    offsets_table,
+    string_table,
+    write_index,
+)
+from backend.webscraper.base.indexing.postings import (
+    BLOCK_SIZE,
+    END,
+    CompressedPostingList,
+    DocumentTable,
+    PostingList,
+    QGramList,
+    decode_varints,
+    encode_varint,
+)
 from backend.webscraper.base.indexing.qgram_index import QGramIndex, ped
+from backend.webscraper.base.indexing.scoring import bm25_scores, max_scores
+from backend.webscraper.base.indexing.top_k import top_k, top_k_max_score
 
 
 class QGramIndexTest(unittest.TestCase):
@@ -92,5 +119,256 @@ class QGramIndexTest(unittest.TestCase):
         )  # add assertion here
 
 
+class IndexFileTest(unittest.TestCase):
+    def write(self, directory: str) -> str:
+        lists = {
+            "bar": [(1, 0.5), (3, 1.25)],
+            "foo": [(2, 2.0)],
+            "zürich": [(3, 0.75)],
+        }
+        terms = sorted(lists, key=lambda term: term.encode("utf-8"))
+        term_offsets, term_bytes = string_table(terms)
+        offsets = offsets_table(len(lists[term]) for term in terms)
+        postings = [posting for term in terms for posting in lists[term]]
+        path = os.path.join(directory, "1.index")
+        write_index(
+            path,
+            3,
+            {
+                "term_offsets": term_offsets,
+                "terms": term_bytes,
+                "posting_offsets": offsets,
+                "doc_ids": array("I", (doc_id for doc_id, _ in postings)),
+                "scores": array("d", (score for _, score in postings)),
+                "empty": array("Q"),
+            },
+        )
+        return path
+
+    def test_read(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            source = IndexFile(self.write(directory))
+            self.assertEqual(source.q, 3)
+            terms = StringTable(source["term_offsets"], source["terms"])
+            self.assertEqual(list(terms), ["bar", "foo", "zürich"])
+            self.assertEqual(terms.find("foo"), 1)
+            self.assertEqual(terms.find("fo"), -1)
+            self.assertEqual(len(source["empty"]), 0)
+
+            self.assertIn("doc_ids", source)
+            self.assertNotIn("doc_id_data", source)
+
+            offsets = source["posting_offsets"]
+            postings = ListTable(
+                terms,
+                lambda i: list(
+                    zip(
+                        source["doc_ids"][offsets[i] : offsets[i + 1]],
+                        source["scores"][offsets[i] : offsets[i + 1]],
+                    )
+                ),
+            )
+            self.assertIn("zürich", postings)
+            self.assertNotIn("baz", postings)
+            self.assertEqual(postings["bar"], [(1, 0.5), (3, 1.25)])
+            self.assertEqual(postings.get("baz"), None)
+            with self.assertRaises(KeyError):
+                postings["baz"]
+
+    def test_version(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write(directory)
+            with open(path, "r+b") as f:
+                header = HEADER.unpack(f.read(HEADER.size))
+                f.seek(0)
+                f.write(HEADER.pack(header[0], 99, *header[2:]))
+            with self.assertRaises(IndexFormatError):
+                IndexFile(path)
+            with open(path, "wb") as f:
+                f.write(struct.pack("<Q", 0))
+            with self.assertRaises(IndexFormatError):
+                IndexFile(path)
+            with self.assertRaises(ValueError):
+                write_index(path, 3, {"a_much_too_long_name": array("Q")})
+
+
+class PostingsTest(unittest.TestCase):
+    def documents(self, n: int) -> DocumentTable:
+        documents = DocumentTable()
+        for doc_id in range(1, n + 1):
+            documents.add(1000 + doc_id, 100 + doc_id // 2, 5)
+        return documents
+
+    def test_posting_list(self) -> None:
+        postings = PostingList(self.documents(4))
+        for doc_id in (1, 1, 3, 4, 4, 4):
+            postings.add(doc_id)
+        self.assertEqual(len(postings), 3)
+        self.assertEqual(list(postings.tfs), [2, 1, 3])
+        postings.scores[1] = 1.5
+        self.assertEqual(postings[1], (3, 1003, 1.5, 101))
+        self.assertEqual(
+            list(postings),
+            [(1, 1001, 0.0, 100), (3, 1003, 1.5, 101), (4, 1004, 0.0, 102)],
+        )
+
+    def test_compressed_posting_list(self) -> None:
+        n = BLOCK_SIZE * 3 + 7
+        postings = PostingList(self.documents(n * 3))
+        for doc_id in range(1, n * 3, 3):
+            postings.add(doc_id)
+            postings.scores[-1] = doc_id / 4
+        compressed = CompressedPostingList.encode(postings)
+        self.assertEqual(len(compressed), len(postings))
+        self.assertEqual(len(compressed.block_offsets), 4)
+        self.assertEqual(list(compressed.doc_ids), list(postings.doc_ids))
+        self.assertEqual(list(compressed), list(postings))
+        self.assertEqual(compressed[BLOCK_SIZE + 1], postings[BLOCK_SIZE + 1])
+        self.assertEqual(compressed[-1], postings[-1])
+        self.assertLess(compressed.nbytes, postings.nbytes)
+
+    def test_varints(self) -> None:
+        data = bytearray()
+        values = [0, 1, 127, 128, 300, 2**32 - 1]
+        for value in values:
+            encode_varint(value, data)
+        self.assertEqual(len(data), 1 + 1 + 1 + 2 + 2 + 5)
+        self.assertEqual(decode_varints(data), values)
+
+    def test_qgram_list(self) -> None:
+        qgrams = QGramList()
+        for name_id in (1, 1, 2, 5):
+            qgrams.add(name_id)
+        self.assertEqual(list(qgrams), [(1, 2), (2, 1), (5, 1)])
+        self.assertEqual(qgrams[0], (1, 2))
+
+
+class ScoringTest(unittest.TestCase):
+    # Two terms, the first is in the documents 1 and 3, the second in the documents 1, 2 and 4
+    doc_ids = array("I", [1, 3, 1, 2, 4])
+    tfs = array("H", [2, 1, 1, 4, 1])
+    dfs = [2, 3]
+    doc_lengths = array("I", [0, 5, 9, 2, 7])
+
+    def expected(self, b: float, k: float, weights: list[int]) -> list[float]:
+        n = len(self.doc_lengths) - 1
+        avdl = sum(self.doc_lengths) / n
+        scores = []
+        terms = [term for term, df in enumerate(self.dfs) for _ in range(df)]
+        for term, doc_id, tf in zip(terms, self.doc_ids, self.tfs):
+            idf = math.log(n / self.dfs[term], 2)
+            alpha = 1 - b + (b * self.doc_lengths[doc_id] / avdl)
+            tf2 = tf * (1 + (1 / k)) / (alpha + (tf / k)) if k > 0 else 1
+            scores.append(tf2 * idf + weights[term])
+        return scores
+
+    def test_scores(self) -> None:
+        for b, k in ((0.75, 1.75), (0.3, 2.5), (1.0, 0.0)):
+            scores = bm25_scores(
+                self.doc_ids, self.tfs, self.dfs, self.doc_lengths, b, k
+            )
+            # The scores are the same floats, not only close
+            self.assertEqual(scores.tolist(), self.expected(b, k, [0, 0]))
+
+    def test_weights(self) -> None:
+        scores = bm25_scores(
+            self.doc_ids, self.tfs, self.dfs, self.doc_lengths, 0.75, 1.75, [0, 2]
+        )
+        self.assertEqual(scores.tolist(), self.expected(0.75, 1.75, [0, 2]))
+
+    def test_empty(self) -> None:
+        scores = bm25_scores(array("I"), array("H"), [], array("I", [0]), 0.75, 1.75)
+        self.assertEqual(len(scores), 0)
+
+    def test_max_scores(self) -> None:
+        scores = [0.5, 2.0, 1.0, -1.0, 3.0]
+        self.assertEqual(max_scores(scores, self.dfs).tolist(), [2.0, 3.0])
+        self.assertEqual(len(max_scores([], [])), 0)
+
+
+class TopKTest(unittest.TestCase):
+    def lists(self, seed: int, compress: bool) -> list:
+        generator = random.Random(seed)
+        documents = DocumentTable()
+        n = generator.randint(1, BLOCK_SIZE * 4)
+        for doc_id in range(1, n + 1):
+            documents.add(1000 + doc_id, 100 + doc_id, 1)
+        lists = []
+        for _ in range(generator.randint(1, 5)):
+            postings = PostingList(documents)
+            for doc_id in sorted(
+                generator.sample(range(1, n + 1), generator.randint(1, n))
+            ):
+                postings.add(doc_id)
+                # Many equal scores, scores of 0 and negative weights
+                postings.scores[-1] = generator.choice(
+                    [0.0, 0.5, 1.5, -0.5, generator.random() * 3]
+                )
+            postings.max_score = max(postings.scores)
+            if compress and generator.random() < 0.5:
+                postings = CompressedPostingList.encode(postings)
+            lists.append(postings)
+        return lists
+
+    def expected(self, lists: list) -> list:
+        """
+        The pairwise merge of the lists and the sort of the whole union.
+        """
+        union = {}
+        for postings in lists:
+            for posting in postings:
+                if posting[0] in union:
+                    previous = union[posting[0]]
+                    posting = (
+                        posting[0],
+                        posting[1],
+                        previous[2] + posting[2],
+                        posting[3],
+                    )
+                union[posting[0]] = posting
+        union = [union[doc_id] for doc_id in sorted(union) if union[doc_id][2] != 0]
+        return sorted(union, key=lambda posting: posting[2], reverse=True)
+
+    def test_top_k(self) -> None:
+        for seed in range(50):
+            lists = self.lists(seed, compress=False)
+            expected = self.expected(lists)
+            self.assertEqual(top_k(lists), expected)
+            for k in (1, 5, 30):
+                self.assertEqual(top_k(lists, k), expected[:k])
+
+    def test_max_score(self) -> None:
+        for seed in range(100):
+            lists = self.lists(seed, compress=True)
+            expected = self.expected(lists)
+            for k in (1, 5, 30):
+                self.assertEqual(top_k_max_score(lists, k), expected[:k], seed)
+
+    def test_tuples(self) -> None:
+        lists = [
+            [(1, 0, 0.2, 0), (3, 0, 0.6, 0)],
+            [(1, 0, 0.4, 0), (2, 0, 0.7, 0), (3, 0, 0.5, 0)],
+        ]
+        expected = [(3, 0, 0.6 + 0.5, 0), (2, 0, 0.7, 0), (1, 0, 0.2 + 0.4, 0)]
+        self.assertEqual(top_k(lists, 3), expected)
+        self.assertEqual(top_k_max_score(lists, 2), expected[:2])
+        self.assertEqual(top_k(lists, 0), [])
+
+    def test_cursors(self) -> None:
+        lists = self.lists(3, compress=False)
+        postings = max(lists, key=len)
+        compressed = CompressedPostingList.encode(postings)
+        for c in (postings.cursor(), compressed.cursor()):
+            self.assertEqual(c.doc_id, postings.doc_ids[0])
+            c.next()
+            self.assertEqual(c.posting(), postings[1])
+            last = postings.doc_ids[-1]
+            c.seek(last)
+            self.assertEqual(c.doc_id, last)
+            self.assertEqual(c.score(), c.scores[len(postings) - 1])
+            c.seek(last + 1)
+            self.assertEqual(c.doc_id, END)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -3,18 +3,69 @@ This class is inspired and reuses the code from the course Information Retrieval
 https://ad-wiki.informatik.uni-freiburg.de/teaching/InformationRetrievalWS2223
 """
 import itertools
+import os
+import pathlib
 import re
-import math
 import time
-from typing import Tuple
+from array import array
+from typing import Callable, Iterable, Tuple
 
+import numpy as np
 from sympy import sympify, zoo, I
+from .index_file import (
+    IndexFile,
+    IndexFormatError,
+    ListTable,
+    StringTable,
+    offsets_table,
+    string_table,
+    write_index,
+)
+from .postings import CompressedPostingList, DocumentTable, PostingList, QGramList
 from .qgram_index import SingletonMeta, ped
+from .scoring import bm25_scores, max_scores
+from .top_k import top_k, top_k_max_score
 from ..models import InspectorValue, Inspector, Indexer
+from ..utils import metrics_registry
 
 DEFAULT_B = 0.75
 DEFAULT_K = 1.75
 
+# Progress of the index builds of the process
+INDEXER_VALUES = metrics_registry.gauge(
+    "webscraper_indexer_values", "Inspector values to be indexed", ("indexer",)
+)
+INDEXED_VALUES = metrics_registry.gauge(
+    "webscraper_indexer_indexed_values",
+    "Inspector values already indexed by the build",
+    ("indexer",),
+)
+INDEXER_BUILD_SECONDS = metrics_registry.gauge(
+    "webscraper_indexer_build_seconds",
+    "Seconds the last build of the index took",
+    ("indexer",),
+)
+# The progress is published every few values, not for every value
+PROGRESS_INTERVAL = 1000
+# Inspector values fetched from the database at once while the index is built
+CHUNK_SIZE = 2000
+# Removed from the words, all Unicode characters except the word characters and whitespace
+SPECIAL_CHARACTERS = re.compile(r"[^\w\s]+")
+
+# Built indexes are saved here, the other processes load them instead of building them again
+INDEXES_DIRECTORY = os.path.join(pathlib.Path().resolve(), "indexes")
+
+
+def index_path(indexer_id: int) -> str:
+    return os.path.join(INDEXES_DIRECTORY, f"{indexer_id}.index")
+
+
+def concatenate(typecode: str, columns: Iterable) -> array:
+    result = array(typecode)
+    for column in columns:
+        result.extend(column)
+    return result
+
 
 class InvertedIndex:
     """
@@ -37,6 +88,13 @@ class InvertedIndex:
         self.norm_names = []
         self.names = []
         self.name_ent = []
+        # The inspector value, the document and the length of every doc_id of the postings
+        self.documents = DocumentTable()
+        # The file of a loaded index
+        self.source: IndexFile | None = None
+        # The scores of the postings of a loaded index and the highest score of every term, in the order of the file
+        self.scores = None
+        self.max_scores = None
 
         # statistics
         self.ped_calcs = None
@@ -69,23 +127,17 @@ class InvertedIndex:
         self.names.append(name)
 
         for qgram in self.compute_qgrams(normed_name):
-            if qgram not in self.q_inverted_lists:
-                self.q_inverted_lists[qgram] = []
-            if (
-                len(self.q_inverted_lists[qgram]) > 0
-                and self.q_inverted_lists[qgram][-1][0] == name_id
-            ):
-                freq = self.q_inverted_lists[qgram][-1][1] + 1
-                self.q_inverted_lists[qgram][-1] = (name_id, freq)
-            else:
-                self.q_inverted_lists[qgram].append((name_id, 1))
+            qgram_list = self.q_inverted_lists.get(qgram)
+            if qgram_list is None:
+                qgram_list = self.q_inverted_lists[qgram] = QGramList()
+            qgram_list.add(name_id)
 
     def tokenize(self, sentence: str):
         # Split the sentence into words based on spaces
         words = sentence.split()
         # Remove special characters using a regular expression pattern
         # This pattern includes all Unicode characters except whitespace
-        clean_words = [re.sub(r"[^\w\s]+", "", word.lower()) for word in words]
+        clean_words = [SPECIAL_CHARACTERS.sub("", word.lower()) for word in words]
         return clean_words
 
     def create_index(self, indexer_id):
@@ -99,25 +151,10 @@ class InvertedIndex:
 
         indexer = Indexer.objects.get(id=indexer_id)
 
-        # Indexer configurations part
-        b = indexer.b_parameter
-        k = indexer.k_parameter
-
-        # The threshold of which the word is convert to be small and can be neglected
-        small_words_threshold = indexer.small_words_threshold
-
         # Words that should be skipped from indexing
-        skip_words_list = indexer.skip_words.split('";"')
-        skip_words_dictionary = {
-            value: index for index, value in enumerate(skip_words_list)
-        }
+        skip_words = set(indexer.skip_words.split('";"'))
 
-        words_weights = {}
-        if indexer.weight_words != "":
-            weight_words_list = indexer.weight_words.split('";"')
-            for weight in weight_words_list:
-                key_value = weight.split("=")
-                words_weights[key_value[0]] = int(key_value[1])
+        words_weights = self.parse_words_weights(indexer.weight_words)
 
         included_inspectors_ids = Inspector.objects.filter(
             indexer=indexer_id
@@ -126,84 +163,324 @@ class InvertedIndex:
         inspector_values = InspectorValue.objects.filter(
             inspector__in=included_inspectors_ids
         ).order_by("created_at")
-        if len(inspector_values) == 0:
+        total = inspector_values.count()
+        if total == 0:
             print("No documents are found to be indexed!")
             return
+        build_start = time.monotonic()
+        INDEXER_VALUES.set(total, indexer=indexer_id)
+        INDEXED_VALUES.set(0, indexer=indexer_id)
+
+        # The values are streamed in chunks by a server-side cursor, no model instance is created
+        rows = inspector_values.values_list("id", "document_id", "value").iterator(
+            chunk_size=CHUNK_SIZE
+        )
+        self.build(
+            rows,
+            b=indexer.b_parameter,
+            k=indexer.k_parameter,
+            # The threshold of which the word is convert to be small and can be neglected
+            small_words_threshold=indexer.small_words_threshold,
+            skip_words=skip_words,
+            words_weights=words_weights,
+            on_progress=lambda indexed: INDEXED_VALUES.set(indexed, indexer=indexer_id),
+        )
+        INDEXER_BUILD_SECONDS.set(time.monotonic() - build_start, indexer=indexer_id)
+
+    def build(
+        self,
+        rows: Iterable[tuple[int, int, str]],
+        b: float = DEFAULT_B,
+        k: float = DEFAULT_K,
+        small_words_threshold: int = 0,
+        skip_words: set[str] | None = None,
+        words_weights: dict[str, int] | None = None,
+        on_progress: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Builds the inverted lists and the q-grams of the words in one pass over the rows,
+        every row is a document, the ids and the length of every document are kept in `documents`.
+        :param rows: The (inspector value id, document id, value) of the inspector values
+        :param b: The BM25 b parameter
+        :param k: The BM25 k parameter
+        :param small_words_threshold: Words of this length or shorter are not indexed
+        :param skip_words: Words that are not indexed
+        :param words_weights: Added to the score of the words
+        :param on_progress: Called with the number of indexed rows every `PROGRESS_INTERVAL` rows and at the end
+        :return: The number of indexed rows
+        """
+        skip_words = skip_words or set()
+        words_weights = words_weights or {}
+        documents = self.documents
+        word_id = 0
+        doc_id = 0
+        for doc_id, (value_id, document_id, value) in enumerate(rows, start=1):
+            dl = 0  # Compute the document length (number of words).
+            # TODO: I think the regular expression for tokenization should be configured by the GUI
+            for word in self.tokenize(value):
+                # Ignore the word if it is empty or small, or it is in the skip list.
+                if len(word) <= small_words_threshold or word in skip_words:
+                    continue
+                dl += 1
+                posting_list = self.inverted_lists.get(word)
+                if posting_list is None:
+                    # The word is seen for first time, create new list.
+                    posting_list = self.inverted_lists[word] = PostingList(documents)
+                    word_id += 1
+                    self.process_qgrams(word, word_id)
+                # The term frequency is incremented if the doc was already seen.
+                posting_list.add(doc_id)
+            # Register the document length.
+            documents.add(value_id, document_id, dl)
+            if on_progress is not None and doc_id % PROGRESS_INTERVAL == 0:
+                on_progress(doc_id)
 
-        # Init all lengths to zero
-        doc_lengths = [0] * (len(inspector_values) + 1)
+        # Compute N (the total number of documents).
+        n = doc_id
+        if n == 0:
+            return 0
+        # Second pass: replace the term frequencies by the BM25 scores.
+        self.score(b, k, words_weights)
 
-        def collect_words(inspector_values, doc_id) -> None:
-            word_id = 0
-            for inspector_value in inspector_values:
-                dl = 0  # Compute the document length (number of words).
-                doc_id += 1
-                # TODO: I think the regular expression for tokenization should be configured by the GUI
-                for word in self.tokenize(inspector_value.value):
-                    # Ignore the word if it is empty or small, or it is in the skip list.
-                    if (
-                        len(word) <= small_words_threshold
-                        or word in skip_words_dictionary
-                    ):
-                        continue
-                    dl += 1
-                    # Skip empty spaces
-                    if word not in self.inverted_lists:
-                        # The word is seen for first time, create new list.
-                        # counter: int, inspector_db_id: int, score: int, document_db_id: int
-                        self.inverted_lists[word] = [
-                            (doc_id, inspector_value.id, 1, inspector_value.document.id)
-                        ]
-
-                        word_id += 1
-                        self.process_qgrams(word, word_id)
-                        continue
-
-                    # Get last posting to check if the doc was already seen.
-                    last = self.inverted_lists[word][-1]
-                    if last[0] == doc_id:
-                        # The doc was already seen, increment tf by 1.
-                        self.inverted_lists[word][-1] = (
-                            doc_id,
-                            inspector_value.id,
-                            last[2] + 1,
-                            inspector_value.document.id,
-                        )
-                    else:
-                        # The doc was not already seen, set tf to 1.
-                        self.inverted_lists[word].append(
-                            (doc_id, inspector_value.id, 1, inspector_value.document.id)
-                        )
-                # Register the document length.
-                doc_lengths[doc_id] = dl
-
-        collect_words(inspector_values, 0)
+        if on_progress is not None:
+            on_progress(n)
+        return n
 
-        # Compute N (the total number of documents).
-        n = inspector_values.count()
-        # Compute AVDL (the average document length).
-        avdl = sum(doc_lengths) / n
-
-        # Second pass: Iterate the inverted lists and replace the tf scores by
-        # BM25 scores, defined as follows:
-        # BM25 = tf * (k + 1) / (k * (1 - b + b * DL / AVDL) + tf) * log2(N/df)
-        for word, inverted_list in self.inverted_lists.items():
-            for i, document_score in enumerate(inverted_list):
-                tf = document_score[2]
-                doc_id = document_score[0]
-                # Obtain the document length (dl) of the document.
-                dl = doc_lengths[doc_id - 1]  # doc_id is 1-based.
-                # Compute alpha = (1 - b + b * DL / AVDL).
-                alpha = 1 - b + (b * dl / avdl)
-                # Compute tf2 = tf * (k + 1) / (k * alpha + tf).
-                tf2 = tf * (1 + (1 / k)) / (alpha + (tf / k)) if k > 0 else 1
-                # Compute df (that is the length of the inverted list).
-                df = len(self.inverted_lists[word])
-                # Compute the BM25 score = tf' * log2(N/df).
-                score = tf2 * math.log(n / df, 2)
-                if word in words_weights:
-                    score += words_weights[word]
-                inverted_list[i] = (doc_id, document_score[1], score, document_score[3])
+    @staticmethod
+    def parse_words_weights(weight_words: str) -> dict[str, int]:
+        """
+        :param weight_words: The `weight_words` of an indexer, like `python=2";"django=1`
+        :return: The weight of every word
+        """
+        words_weights = {}
+        if weight_words != "":
+            for weight in weight_words.split('";"'):
+                key_value = weight.split("=")
+                words_weights[key_value[0]] = int(key_value[1])
+        return words_weights
+
+    def score(
+        self,
+        b: float = DEFAULT_B,
+        k: float = DEFAULT_K,
+        words_weights: dict[str, int] | None = None,
+    ) -> None:
+        """
+        Computes the BM25 scores of all the postings at once from their term frequencies and
+        the lengths of the documents, so a built or loaded index is scored again with other
+        parameters without tokenizing the documents.
+        :param b: The BM25 b parameter
+        :param k: The BM25 k parameter
+        :param words_weights: Added to the score of the words
+        """
+        if self.source is None:
+            posting_lists = list(self.inverted_lists.values())
+            if len(posting_lists) == 0:
+                return
+            dfs = np.fromiter(map(len, posting_lists), dtype=np.int64)
+            doc_ids = np.concatenate([np.asarray(p.doc_ids) for p in posting_lists])
+            tfs = np.concatenate([np.asarray(p.tfs) for p in posting_lists])
+        else:
+            posting_lists = None
+            dfs = np.diff(np.asarray(self.source["posting_offsets"])).astype(np.int64)
+            tfs = self.source["tfs"]
+            if "doc_ids" in self.source:
+                doc_ids = self.source["doc_ids"]
+            else:
+                # The compressed doc_ids are decoded term by term
+                doc_ids = np.fromiter(
+                    itertools.chain.from_iterable(
+                        self.inverted_lists.read(i).doc_ids for i in range(len(dfs))
+                    ),
+                    dtype=np.uint32,
+                    count=int(dfs.sum()),
+                )
+        weights = None
+        if words_weights:
+            weights = [words_weights.get(term, 0) for term in self.inverted_lists]
+        scores = bm25_scores(doc_ids, tfs, dfs, self.documents.lengths, b, k, weights)
+        highest = max_scores(scores, dfs)
+        if posting_lists is None:
+            # The mapped scores are read-only, the lists of the index read these instead
+            self.scores = scores
+            self.max_scores = highest
+            return
+        start = 0
+        for posting_list, max_score in zip(posting_lists, highest.tolist()):
+            end = start + len(posting_list)
+            np.asarray(posting_list.scores)[:] = scores[start:end]
+            posting_list.max_score = max_score
+            start = end
+
+    def save(self, path: str, compress: bool = False) -> int:
+        """
+        Writes the index to a file that can be loaded by `load`, see `index_file` for the format.
+        :param path: The path of the file, it is replaced if it exists
+        :param compress: Encode the doc_ids as varint gaps and the scores on 32 bits, the file is about half
+        :return: The size of the file
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # The terms and the q-grams are sorted, so they are found by binary search in the file
+        terms = sorted(self.inverted_lists, key=lambda term: term.encode("utf-8"))
+        posting_lists = [self.inverted_lists[term] for term in terms]
+        term_offsets, term_bytes = string_table(terms)
+        qgrams = sorted(self.q_inverted_lists, key=lambda qgram: qgram.encode("utf-8"))
+        qgram_lists = [self.q_inverted_lists[qgram] for qgram in qgrams]
+        qgram_offsets, qgram_bytes = string_table(qgrams)
+        name_offsets, name_bytes = string_table(self.entities)
+        norm_offsets, norm_bytes = string_table(self.norm_names)
+        arrays = {
+            "term_offsets": term_offsets,
+            "terms": term_bytes,
+            "posting_offsets": offsets_table(map(len, posting_lists)),
+            "tfs": concatenate("H", (postings.tfs for postings in posting_lists)),
+            "value_ids": array("Q", self.documents.value_ids),
+            "document_ids": array("Q", self.documents.document_ids),
+            "doc_lengths": array("I", self.documents.lengths),
+            "name_offsets": name_offsets,
+            "names": name_bytes,
+            "norm_offsets": norm_offsets,
+            "norm_names": norm_bytes,
+            "qgram_offsets": qgram_offsets,
+            "qgrams": qgram_bytes,
+            "qgram_lists": offsets_table(map(len, qgram_lists)),
+            "name_ids": concatenate("I", (q.name_ids for q in qgram_lists)),
+            "frequencies": concatenate("I", (q.frequencies for q in qgram_lists)),
+        }
+        if compress:
+            compressed = [
+                CompressedPostingList.encode(postings) for postings in posting_lists
+            ]
+            arrays["scores"] = concatenate(
+                "f", (postings.scores for postings in compressed)
+            )
+            arrays["max_scores"] = array(
+                "d", (postings.max_score for postings in compressed)
+            )
+            arrays["doc_id_data"] = b"".join(postings.data for postings in compressed)
+            arrays["data_offsets"] = offsets_table(
+                len(postings.data) for postings in compressed
+            )
+            arrays["block_lists"] = offsets_table(
+                len(postings.block_offsets) for postings in compressed
+            )
+            arrays["block_offsets"] = concatenate(
+                "I", (postings.block_offsets for postings in compressed)
+            )
+            arrays["last_doc_ids"] = concatenate(
+                "I", (postings.block_last_doc_ids for postings in compressed)
+            )
+        else:
+            arrays["scores"] = concatenate(
+                "d", (postings.scores for postings in posting_lists)
+            )
+            arrays["max_scores"] = array(
+                "d", (postings.max_score for postings in posting_lists)
+            )
+            arrays["doc_ids"] = concatenate(
+                "I", (postings.doc_ids for postings in posting_lists)
+            )
+        return write_index(path, self.q, arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "InvertedIndex":
+        """
+        Maps the file of an index, the lists are only read when a query needs them.
+        :param path: The path of a file written by `save`
+        :return: The index, it can be searched and scored again but not built again
+        """
+        source = IndexFile(path)
+        index = cls(source.q)
+        index.source = source
+        documents = index.documents = DocumentTable(
+            source["value_ids"], source["document_ids"], source["doc_lengths"]
+        )
+        posting_offsets = source["posting_offsets"]
+        tfs = source["tfs"]
+        index.scores = source["scores"]
+        if "max_scores" in source:
+            index.max_scores = source["max_scores"]
+        else:
+            # Files written before the highest scores were saved
+            index.max_scores = max_scores(
+                index.scores, np.diff(np.asarray(posting_offsets))
+            )
+        if "doc_id_data" in source:
+            data = source["doc_id_data"]
+            data_offsets = source["data_offsets"]
+            block_lists = source["block_lists"]
+            block_offsets = source["block_offsets"]
+            block_last_doc_ids = source["last_doc_ids"]
+
+            def read_postings(i: int) -> CompressedPostingList:
+                start, end = posting_offsets[i], posting_offsets[i + 1]
+                first_block, last_block = block_lists[i], block_lists[i + 1]
+                return CompressedPostingList(
+                    documents,
+                    data[data_offsets[i] : data_offsets[i + 1]],
+                    block_offsets[first_block:last_block],
+                    block_last_doc_ids[first_block:last_block],
+                    tfs[start:end],
+                    index.scores[start:end],
+                    index.max_scores[i],
+                )
+
+        else:
+            doc_ids = source["doc_ids"]
+
+            def read_postings(i: int) -> PostingList:
+                start, end = posting_offsets[i], posting_offsets[i + 1]
+                return PostingList(
+                    documents,
+                    doc_ids[start:end],
+                    tfs[start:end],
+                    index.scores[start:end],
+                    index.max_scores[i],
+                )
+
+        index.inverted_lists = ListTable(
+            StringTable(source["term_offsets"], source["terms"]), read_postings
+        )
+        # The entities of the q-gram index are the words of the documents
+        index.entities = index.names = StringTable(
+            source["name_offsets"], source["names"]
+        )
+        index.norm_names = StringTable(source["norm_offsets"], source["norm_names"])
+        qgram_lists = source["qgram_lists"]
+        name_ids = source["name_ids"]
+        frequencies = source["frequencies"]
+        index.q_inverted_lists = ListTable(
+            StringTable(source["qgram_offsets"], source["qgrams"]),
+            lambda i: QGramList(
+                name_ids[qgram_lists[i] : qgram_lists[i + 1]],
+                frequencies[qgram_lists[i] : qgram_lists[i + 1]],
+            ),
+        )
+        return index
+
+    @classmethod
+    def cached(cls, indexer_id: int) -> "InvertedIndex | None":
+        """
+        The index of the indexer, it is loaded from its file on the first search of the process
+        and again when another process saved a new build.
+        :return: The index or None if it was never built
+        """
+        cache_key = f"indexer:{indexer_id}"
+        index = SingletonMeta.indexers_cache.get(cache_key)
+        path = index_path(indexer_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return index
+        if index is not None and (index.source is None or index.source.mtime == mtime):
+            return index
+        try:
+            index = cls.load(path)
+        except IndexFormatError as e:
+            print(f"The index {path} can not be loaded, it must be built again: {e}")
+            return index
+        SingletonMeta.indexers_cache[cache_key] = index
+        return index
 
     def cached_indexers_keys(self):
         singleton_cache = SingletonMeta
@@ -212,7 +489,9 @@ class InvertedIndex:
         cached_indexers = []
         for indexer in indexers:
             cache_key = f"indexer:{indexer.id}"
-            if singleton_cache.indexers_cache.get(cache_key) is not None:
+            in_memory = singleton_cache.indexers_cache.get(cache_key) is not None
+            # Indexes built by another process are loaded from their file on the first search
+            if in_memory or os.path.exists(index_path(indexer.id)):
                 cached_indexers.append(indexer)
         return cached_indexers
 
@@ -220,28 +499,29 @@ class InvertedIndex:
         """
         Compute the union of the two given inverted lists in linear time
         (linear in the total number of entries in the two lists), where the
-        entries in the inverted lists are postings of form (doc_id, bm25_score)
-        and are expected to be sorted by doc_id, in ascending order.
+        entries in the inverted lists are postings of form
+        (doc_id, inspector_value_id, bm25_score, document_id) and are expected
+        to be sorted by doc_id, in ascending order.
 
-        >>> ii = InvertedIndex()
-        >>> l1 = ii.merge([(1, 2.1), (5, 3.2)], [(1, 1.7), (2, 1.3), (6, 3.3)])
-        >>> [(id, "%.1f" % tf) for id, tf in l1]
+        >>> ii = InvertedIndex(3)
+        >>> l1 = ii.merge([(1, 0, 2.1, 0), (5, 0, 3.2, 0)], [(1, 0, 1.7, 0), (2, 0, 1.3, 0), (6, 0, 3.3, 0)])
+        >>> [(p[0], "%.1f" % p[2]) for p in l1]
         [(1, '3.8'), (2, '1.3'), (5, '3.2'), (6, '3.3')]
 
-        >>> l2 = ii.merge([(3, 1.7), (5, 3.2), (7, 4.1)], [(1, 2.3), (5, 1.3)])
-        >>> [(id, "%.1f" % tf) for id, tf in l2]
+        >>> l2 = ii.merge([(3, 0, 1.7, 0), (5, 0, 3.2, 0), (7, 0, 4.1, 0)], [(1, 0, 2.3, 0), (5, 0, 1.3, 0)])
+        >>> [(p[0], "%.1f" % p[2]) for p in l2]
         [(1, '2.3'), (3, '1.7'), (5, '4.5'), (7, '4.1')]
 
-        >>> l2 = ii.merge([], [(1, 2.3), (5, 1.3)])
-        >>> [(id, "%.1f" % tf) for id, tf in l2]
+        >>> l2 = ii.merge([], [(1, 0, 2.3, 0), (5, 0, 1.3, 0)])
+        >>> [(p[0], "%.1f" % p[2]) for p in l2]
         [(1, '2.3'), (5, '1.3')]
 
-        >>> l2 = ii.merge([(1, 2.3)], [])
-        >>> [(id, "%.1f" % tf) for id, tf in l2]
+        >>> l2 = ii.merge([(1, 0, 2.3, 0)], [])
+        >>> [(p[0], "%.1f" % p[2]) for p in l2]
         [(1, '2.3')]
 
         >>> l2 = ii.merge([], [])
-        >>> [(id, "%.1f" % tf) for id, tf in l2]
+        >>> [(p[0], "%.1f" % p[2]) for p in l2]
         []
         """
         i = 0  # The pointer in the first list.
@@ -250,7 +530,7 @@ class InvertedIndex:
 
         # Iterate the lists in an interleaving order and aggregate the scores.
         while i < len(list1) and j < len(list2):
-            if i < list1[i][0] == list2[j][0]:
+            if list1[i][0] == list2[j][0]:
                 result.append(
                     (
                         list1[i][0],
@@ -322,27 +602,40 @@ class InvertedIndex:
             print(f"Error while evaluating score: {e}")
         return eval(str(res))
 
-    def process_query(self, keywords, indexer_id, use_refinements=False):
+    def process_query(
+        self,
+        keywords,
+        indexer_id,
+        use_refinements=False,
+        k: int | None = None,
+        max_score: bool = False,
+    ):
         """
         Process the given keyword query as follows: Fetch the inverted list for
-        each of the keywords in the query and compute the union of all lists.
-        Sort the resulting list by BM25 scores in descending order.
+        each of the keywords in the query and compute the union of all lists
+        with a heap, keeping the k postings with the highest BM25 scores.
+        The postings are sorted by BM25 scores in descending order.
 
-        This method returns _all_ results for the given query, not just the
-        top 3!
+        This method returns _all_ results for the given query when k is None.
 
         If you want to implement some ranking refinements, make these
         refinements optional (their use should be controllable via the
         use_refinements flag).
 
-        >>> ii = InvertedIndex()
+        :param k: The number of results
+        :param max_score: Skip the postings which cannot enter the top k, the results are the same
+
+        >>> ii = InvertedIndex(3)
         >>> ii.inverted_lists = {
-        ... "foo": [(1, 0.2), (3, 0.6)],
-        ... "bar": [(1, 0.4), (2, 0.7), (3, 0.5)],
-        ... "baz": [(2, 0.1)]}
-        >>> result = ii.process_query(["foo", "bar"], use_refinements=False)
-        >>> [(id, "%.1f" % tf) for id, tf in result]
+        ... "foo": [(1, 0, 0.2, 0), (3, 0, 0.6, 0)],
+        ... "bar": [(1, 0, 0.4, 0), (2, 0, 0.7, 0), (3, 0, 0.5, 0)],
+        ... "baz": [(2, 0, 0.1, 0)]}
+        >>> result = ii.process_query(["foo", "bar"], None, use_refinements=False)
+        >>> [(p[0], "%.1f" % p[2]) for p in result]
         [(3, '1.1'), (2, '0.7'), (1, '0.6')]
+        >>> result = ii.process_query(["foo", "bar"], None, k=2, max_score=True)
+        >>> [(p[0], "%.1f" % p[2]) for p in result]
+        [(3, '1.1'), (2, '0.7')]
         """
         if not keywords:
             return []
@@ -353,18 +646,11 @@ class InvertedIndex:
             if keyword in self.inverted_lists:
                 lists.append(self.inverted_lists[keyword])
 
-        # Compute the union of all inverted lists.
         if len(lists) == 0:
             return []
-
-        union = lists[0]
-        for i in range(1, len(lists)):
-            union = self.merge(union, lists[i])
-
-        # Filter all postings with BM25 = 0.
-        union = [x for x in union if x[2] != 0]
-        # Sort the postings by BM25 scores, in descending order.
-        return sorted(union, key=lambda x: x[2], reverse=True)
+        if max_score and k is not None:
+            return top_k_max_score(lists, k)
+        return top_k(lists, k)
 
     def find_matches(self, prefix: str, delta: int) -> list[str]:
         """
@@ -0,0 +1,443 @@
+"""
+Posting lists of the inverted index stored in parallel typed arrays instead of one tuple per posting.
+
+A posting only keeps its doc_id, its term frequency and its score, the inspector value and the document
+of a doc_id are stored once in the `DocumentTable`. Reading a posting still gives the tuple
+(doc_id, inspector_value_id, score, document_id), so the queries read the lists like before.
+
+The arrays can be memoryviews of a mapped index file, see `index_file`.
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import Iterator, Sequence
+
+# Postings per block of a compressed list, a block is decoded or skipped as a whole
+BLOCK_SIZE = 128
+# Term frequencies are stored on 16 bits, higher frequencies are capped
+MAX_TF = 65535
+# The doc_id of a cursor after the last posting, larger than every doc_id
+END = 2**32
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """
+    Appends the value with 7 bits per byte, the high bit tells that more bytes follow.
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data: Sequence[int]) -> list[int]:
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            values.append(value)
+            value = 0
+            shift = 0
+        else:
+            shift += 7
+    return values
+
+
+def postings(
+    documents: "DocumentTable", doc_ids: Sequence[int], scores: Sequence[float]
+) -> Iterator[tuple[int, int, float, int]]:
+    """
+    The (doc_id, inspector_value_id, score, document_id) tuples, zipped without a Python loop.
+    """
+    return zip(
+        doc_ids,
+        map(documents.value_ids.__getitem__, doc_ids),
+        scores,
+        map(documents.document_ids.__getitem__, doc_ids),
+    )
+
+
+class DocumentTable:
+    """
+    The inspector value, the document and the number of words of every doc_id of the index.
+    The doc_ids are 1-based, so the first item of the arrays is not used.
+    """
+
+    def __init__(
+        self,
+        value_ids: Sequence[int] | None = None,
+        document_ids: Sequence[int] | None = None,
+        lengths: Sequence[int] | None = None,
+    ):
+        self.value_ids = value_ids if value_ids is not None else array("Q", [0])
+        self.document_ids = (
+            document_ids if document_ids is not None else array("Q", [0])
+        )
+        self.lengths = lengths if lengths is not None else array("I", [0])
+
+    def __len__(self) -> int:
+        return len(self.lengths) - 1
+
+    def add(self, value_id: int, document_id: int, length: int) -> None:
+        self.value_ids.append(value_id)
+        self.document_ids.append(document_id)
+        self.lengths.append(length)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            len(column) * column.itemsize
+            for column in (self.value_ids, self.document_ids, self.lengths)
+        )
+
+
+class PostingList:
+    """
+    The postings of a term sorted by doc_id, in one array per field.
+    """
+
+    __slots__ = ("documents", "doc_ids", "tfs", "scores", "max_score")
+
+    def __init__(
+        self,
+        documents: DocumentTable,
+        doc_ids: Sequence[int] | None = None,
+        tfs: Sequence[int] | None = None,
+        scores: Sequence[float] | None = None,
+        max_score: float = 0.0,
+    ):
+        """
+        :param documents: The documents of the doc_ids
+        :param doc_ids: The sorted doc_ids of the postings
+        :param tfs: The number of times the term is in the document
+        :param scores: The BM25 scores, they are 0 until the index is scored
+        :param max_score: The highest of the scores
+        """
+        self.documents = documents
+        self.doc_ids = doc_ids if doc_ids is not None else array("I")
+        self.tfs = tfs if tfs is not None else array("H")
+        self.scores = scores if scores is not None else array("d")
+        self.max_score = max_score
+
+    def add(self, doc_id: int) -> None:
+        """
+        Count the term in the document, documents must be added in the order of their doc_ids.
+        """
+        if len(self.doc_ids) != 0 and self.doc_ids[-1] == doc_id:
+            if self.tfs[-1] < MAX_TF:
+                self.tfs[-1] += 1
+            return
+        self.doc_ids.append(doc_id)
+        self.tfs.append(1)
+        self.scores.append(0.0)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __getitem__(self, i: int) -> tuple[int, int, float, int]:
+        doc_id = self.doc_ids[i]
+        return (
+            doc_id,
+            self.documents.value_ids[doc_id],
+            self.scores[i],
+            self.documents.document_ids[doc_id],
+        )
+
+    def __iter__(self) -> Iterator[tuple[int, int, float, int]]:
+        return postings(self.documents, self.doc_ids, self.scores)
+
+    def cursor(self) -> "PostingCursor":
+        return PostingCursor(self, self.doc_ids, self.scores, self.max_score)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            len(column) * column.itemsize
+            for column in (self.doc_ids, self.tfs, self.scores)
+        )
+
+
+class CompressedPostingList:
+    """
+    A posting list with its doc_ids encoded as varint gaps in blocks of `BLOCK_SIZE` postings
+    and its scores stored on 32 bits. The last doc_id of every block is kept, so a block
+    can be decoded alone and the blocks before a doc_id can be skipped.
+    """
+
+    __slots__ = (
+        "documents",
+        "data",
+        "block_offsets",
+        "block_last_doc_ids",
+        "tfs",
+        "scores",
+        "max_score",
+    )
+
+    def __init__(
+        self,
+        documents: DocumentTable,
+        data: Sequence[int],
+        block_offsets: Sequence[int],
+        block_last_doc_ids: Sequence[int],
+        tfs: Sequence[int],
+        scores: Sequence[float],
+        max_score: float = 0.0,
+    ):
+        """
+        :param data: The varint gaps between the doc_ids of all the blocks
+        :param block_offsets: The offset of every block in `data`
+        :param block_last_doc_ids: The last doc_id of every block
+        :param tfs: The term frequencies of the postings
+        :param scores: The BM25 scores of the postings
+        :param max_score: The highest of the scores
+        """
+        self.documents = documents
+        self.data = data
+        self.block_offsets = block_offsets
+        self.block_last_doc_ids = block_last_doc_ids
+        self.tfs = tfs
+        self.scores = scores
+        self.max_score = max_score
+
+    @classmethod
+    def encode(cls, posting_list: PostingList) -> "CompressedPostingList":
+        data = bytearray()
+        block_offsets = array("I")
+        block_last_doc_ids = array("I")
+        previous = 0
+        doc_ids = posting_list.doc_ids
+        for start in range(0, len(doc_ids), BLOCK_SIZE):
+            block_offsets.append(len(data))
+            for doc_id in doc_ids[start : start + BLOCK_SIZE]:
+                encode_varint(doc_id - previous, data)
+                previous = doc_id
+            block_last_doc_ids.append(previous)
+        return cls(
+            posting_list.documents,
+            bytes(data),
+            block_offsets,
+            block_last_doc_ids,
+            array("H", posting_list.tfs),
+            array("f", posting_list.scores),
+            # The rounding to 32 bits keeps the order, so this is the highest of the rounded scores
+            array("f", [posting_list.max_score])[0],
+        )
+
+    def block(self, b: int) -> list[int]:
+        """
+        :return: The doc_ids of the block
+        """
+        start = self.block_offsets[b]
+        end = (
+            self.block_offsets[b + 1]
+            if b + 1 < len(self.block_offsets)
+            else len(self.data)
+        )
+        doc_id = self.block_last_doc_ids[b - 1] if b > 0 else 0
+        doc_ids = []
+        for gap in decode_varints(self.data[start:end]):
+            doc_id += gap
+            doc_ids.append(doc_id)
+        return doc_ids
+
+    @property
+    def doc_ids(self) -> list[int]:
+        return [
+            doc_id for b in range(len(self.block_offsets)) for doc_id in self.block(b)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.tfs)
+
+    def __getitem__(self, i: int) -> tuple[int, int, float, int]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        b, j = divmod(i, BLOCK_SIZE)
+        doc_id = self.block(b)[j]
+        return (
+            doc_id,
+            self.documents.value_ids[doc_id],
+            self.scores[i],
+            self.documents.document_ids[doc_id],
+        )
+
+    def __iter__(self) -> Iterator[tuple[int, int, float, int]]:
+        return postings(self.documents, self.doc_ids, self.scores)
+
+    def doc_ids_at(self, positions: Sequence[int]) -> list[int]:
+        """
+        :return: The doc_ids of the postings at the positions, only their blocks are decoded
+        """
+        blocks = {}
+        doc_ids = []
+        for position in positions:
+            b, i = divmod(int(position), BLOCK_SIZE)
+            block = blocks.get(b)
+            if block is None:
+                block = blocks[b] = self.block(b)
+            doc_ids.append(block[i])
+        return doc_ids
+
+    def cursor(self) -> "CompressedPostingCursor":
+        return CompressedPostingCursor(self)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + sum(
+            len(column) * column.itemsize
+            for column in (
+                self.block_offsets,
+                self.block_last_doc_ids,
+                self.tfs,
+                self.scores,
+            )
+        )
+
+
+class PostingCursor:
+    """
+    Reads a posting list in the order of the doc_ids, `seek` skips to a doc_id by binary search.
+    """
+
+    __slots__ = ("postings", "doc_ids", "scores", "max_score", "position", "doc_id")
+
+    def __init__(
+        self,
+        postings: Sequence,
+        doc_ids: Sequence[int],
+        scores: Sequence[float],
+        max_score: float,
+    ):
+        """
+        :param postings: The (doc_id, inspector_value_id, score, document_id) postings
+        :param doc_ids: The doc_ids of the postings
+        :param scores: The scores of the postings
+        :param max_score: The highest of the scores
+        """
+        self.postings = postings
+        self.doc_ids = doc_ids
+        self.scores = scores
+        self.max_score = max_score
+        self.position = 0
+        self.doc_id = doc_ids[0] if len(doc_ids) != 0 else END
+
+    def next(self) -> None:
+        self.position += 1
+        self.doc_id = (
+            self.doc_ids[self.position] if self.position < len(self.doc_ids) else END
+        )
+
+    def seek(self, doc_id: int) -> None:
+        """
+        Moves to the first posting with a doc_id equal or greater than the given one.
+        """
+        if doc_id <= self.doc_id:
+            return
+        self.position = bisect_left(self.doc_ids, doc_id, self.position)
+        self.doc_id = (
+            self.doc_ids[self.position] if self.position < len(self.doc_ids) else END
+        )
+
+    def score(self) -> float:
+        return self.scores[self.position]
+
+    def posting(self) -> tuple[int, int, float, int]:
+        return self.postings[self.position]
+
+
+class CompressedPostingCursor(PostingCursor):
+    """
+    Reads a compressed posting list, only the blocks containing the visited postings are decoded.
+    """
+
+    __slots__ = ("block", "block_start")
+
+    def __init__(self, postings: CompressedPostingList):
+        self.block = -1
+        self.block_start = 0
+        super().__init__(postings, [], postings.scores, postings.max_score)
+        self.position = -1
+        self.next()
+
+    def read(self, b: int) -> None:
+        self.block = b
+        self.block_start = b * BLOCK_SIZE
+        self.doc_ids = self.postings.block(b)
+
+    def next(self) -> None:
+        self.position += 1
+        i = self.position - self.block_start
+        if i >= len(self.doc_ids):
+            if self.block + 1 >= len(self.postings.block_offsets):
+                self.doc_id = END
+                return
+            self.read(self.block + 1)
+            i = 0
+        self.doc_id = self.doc_ids[i]
+
+    def seek(self, doc_id: int) -> None:
+        if doc_id <= self.doc_id:
+            return
+        last_doc_ids = self.postings.block_last_doc_ids
+        start = self.position - self.block_start
+        if doc_id > last_doc_ids[self.block]:
+            # The blocks ending before the doc_id are skipped without being decoded
+            b = bisect_left(last_doc_ids, doc_id, self.block + 1)
+            if b == len(last_doc_ids):
+                self.position = len(self.postings)
+                self.doc_id = END
+                return
+            self.read(b)
+            start = 0
+        i = bisect_left(self.doc_ids, doc_id, start)
+        self.position = self.block_start + i
+        self.doc_id = self.doc_ids[i]
+
+    def posting(self) -> tuple[int, int, float, int]:
+        documents = self.postings.documents
+        return (
+            self.doc_id,
+            documents.value_ids[self.doc_id],
+            self.postings.scores[self.position],
+            documents.document_ids[self.doc_id],
+        )
+
+
+class QGramList:
+    """
+    The words containing a q-gram as (name_id, frequency) pairs, in two arrays.
+    """
+
+    __slots__ = ("name_ids", "frequencies")
+
+    def __init__(
+        self,
+        name_ids: Sequence[int] | None = None,
+        frequencies: Sequence[int] | None = None,
+    ):
+        self.name_ids = name_ids if name_ids is not None else array("I")
+        self.frequencies = frequencies if frequencies is not None else array("I")
+
+    def add(self, name_id: int) -> None:
+        """
+        Count the q-gram in the word, words must be added in the order of their name_ids.
+        """
+        if len(self.name_ids) != 0 and self.name_ids[-1] == name_id:
+            self.frequencies[-1] += 1
+            return
+        self.name_ids.append(name_id)
+        self.frequencies.append(1)
+
+    def __len__(self) -> int:
+        return len(self.name_ids)
+
+    def __getitem__(self, i: int) -> tuple[int, int]:
+        return self.name_ids[i], self.frequencies[i]
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return zip(self.name_ids, self.frequencies)
@@ -0,0 +1,131 @@
+"""
+Compares the posting lists stored as one tuple per posting, like the index was built before,
+with the posting lists stored in typed arrays, in memory and in the mapped index file, plain or compressed.
+
+The memory of the lists is traced while they are copied, so the words and the q-grams of the index
+are not counted. Run it from backend/webscraper:
+
+    python -m base.indexing.postings_benchmark
+"""
+
+import argparse
+import os
+import pathlib
+import statistics
+import tempfile
+import time
+import tracemalloc
+from array import array
+from typing import Callable
+
+from .index_benchmark import DATASET, QUERIES, read_queries, read_rows, search
+from .inverted_index import InvertedIndex
+from .postings import CompressedPostingList, PostingList
+
+
+def traced(copy: Callable[[], object]) -> tuple[object, int]:
+    """
+    :return: The copy and the bytes allocated to make it
+    """
+    tracemalloc.start()
+    result = copy()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def tuple_lists(index: InvertedIndex) -> dict:
+    return {term: list(postings) for term, postings in index.inverted_lists.items()}
+
+
+def array_lists(index: InvertedIndex) -> dict:
+    return {
+        term: PostingList(
+            postings.documents,
+            array("I", postings.doc_ids),
+            array("H", postings.tfs),
+            array("d", postings.scores),
+        )
+        for term, postings in index.inverted_lists.items()
+    }
+
+
+def compressed_lists(index: InvertedIndex) -> dict:
+    return {
+        term: CompressedPostingList.encode(postings)
+        for term, postings in index.inverted_lists.items()
+    }
+
+
+def latencies(index: InvertedIndex, queries: list[str]) -> list[float]:
+    result = []
+    for query in queries:
+        start = time.perf_counter()
+        search(index, query)
+        result.append(time.perf_counter() - start)
+    return result
+
+
+def with_lists(index: InvertedIndex, lists: dict) -> InvertedIndex:
+    """
+    :return: A copy of the index searching the given posting lists
+    """
+    copy = InvertedIndex(index.q)
+    copy.__dict__.update(index.__dict__)
+    copy.inverted_lists = lists
+    return copy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dataset", type=pathlib.Path, default=DATASET)
+    parser.add_argument("--queries", type=pathlib.Path, default=QUERIES)
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    index = InvertedIndex(3)
+    values = index.build(read_rows(args.dataset, args.copies), small_words_threshold=2)
+    postings = sum(len(postings) for postings in index.inverted_lists.values())
+    print(f"{values} values, {len(index.inverted_lists)} words, {postings} postings\n")
+
+    tuples, tuples_size = traced(lambda: tuple_lists(index))
+    arrays, arrays_size = traced(lambda: array_lists(index))
+    _, compressed_size = traced(lambda: compressed_lists(index))
+    documents_size = index.documents.nbytes
+    print(f"{'in memory':<24} {'MB':>8} {'bytes/posting':>14}")
+    for name, size in (
+        ("tuples", tuples_size),
+        ("arrays", arrays_size + documents_size),
+        ("compressed arrays", compressed_size + documents_size),
+    ):
+        print(f"{name:<24} {size / 1048576:>8.1f} {size / postings:>14.1f}")
+
+    queries = read_queries(args.queries)
+    with tempfile.TemporaryDirectory() as directory:
+        indexes = {
+            "tuples": with_lists(index, tuples),
+            "arrays": with_lists(index, arrays),
+        }
+        print(f"\n{'index file':<24} {'MB':>8} {'bytes/posting':>14}")
+        for name, compress in (("mapped", False), ("mapped compressed", True)):
+            path = os.path.join(directory, f"{name}.index")
+            size = index.save(path, compress=compress)
+            indexes[name] = InvertedIndex.load(path)
+            print(f"{name:<24} {size / 1048576:>8.1f} {size / postings:>14.1f}")
+
+        print(
+            f"\n{'search of ' + str(len(queries)) + ' queries':<24} {'mean ms':>8} {'median ms':>10} {'max ms':>8}"
+        )
+        for name, searched in indexes.items():
+            # The first run reads the pages of the mapped files, the best of the next runs is kept
+            latencies(searched, queries)
+            runs = [latencies(searched, queries) for _ in range(args.repeat)]
+            times = [min(run[i] for run in runs) * 1000 for i in range(len(queries))]
+            print(
+                f"{name:<24} {statistics.mean(times):>8.1f} {statistics.median(times):>10.1f} {max(times):>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Measures the evaluation of the keyword queries on the Stack Overflow dataset: the pairwise merge
+of the posting lists followed by the sort of the whole union, the heap-based top-k union,
+and the top-k union skipping the postings with MaxScore. The benchmark queries are timed,
+queries made of the most common words, whose lists are the longest, and queries mixing them
+with a rare word. Run it from backend/webscraper:
+
+    python -m base.indexing.query_benchmark
+"""
+
+import argparse
+import os
+import pathlib
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable
+
+from .index_benchmark import DATASET, QUERIES, read_queries, read_rows
+from .inverted_index import InvertedIndex
+
+
+def keywords(index: InvertedIndex, query: str) -> list[str]:
+    result = []
+    for word in query.lower().split():
+        word = index.normalize(word)
+        result += index.find_matches(word, len(word) // 4)
+    return result
+
+
+def pairwise(index: InvertedIndex, words: list[str], k: int) -> list:
+    """
+    The evaluation before the top-k union: the lists are merged two by one and the union is sorted.
+    """
+    lists = [
+        list(index.inverted_lists[word])
+        for word in words
+        if word in index.inverted_lists
+    ]
+    if len(lists) == 0:
+        return []
+    union = lists[0]
+    for other in lists[1:]:
+        union = index.merge(union, other)
+    union = [posting for posting in union if posting[2] != 0]
+    return sorted(union, key=lambda posting: posting[2], reverse=True)[:k]
+
+
+def timed(evaluate: Callable[[], list], repeat: int) -> float:
+    """
+    :return: The best time of the evaluation in milliseconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        evaluate()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dataset", type=pathlib.Path, default=DATASET)
+    parser.add_argument("--queries", type=pathlib.Path, default=QUERIES)
+    parser.add_argument("--copies", type=int, default=8)
+    parser.add_argument("--k", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compress", action="store_true")
+    args = parser.parse_args()
+
+    built = InvertedIndex(3)
+    values = built.build(read_rows(args.dataset, args.copies), small_words_threshold=2)
+    postings = sum(len(postings) for postings in built.inverted_lists.values())
+    print(
+        f"{values} values, {len(built.inverted_lists)} words, {postings} postings, k = {args.k}\n"
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.index")
+        built.save(path, compress=args.compress)
+        index = InvertedIndex.load(path)
+
+        by_frequency = sorted(
+            index.inverted_lists, key=lambda word: -len(index.inverted_lists[word])
+        )
+        common = by_frequency[:50]
+        # Words in about one value out of a thousand
+        rare = [
+            word
+            for word in by_frequency
+            if len(index.inverted_lists[word]) <= max(values // 1000, 1)
+        ][:500]
+        generator = random.Random(0)
+        workloads = {
+            "benchmark queries": [
+                keywords(index, query) for query in read_queries(args.queries)
+            ],
+            "common words": [generator.sample(common, 3) for _ in range(20)],
+            "rare and common words": [
+                [generator.choice(rare)] + generator.sample(common, 2)
+                for _ in range(20)
+            ],
+        }
+        evaluations = {
+            "pairwise merge + sort": lambda words: pairwise(index, words, args.k),
+            "heap top-k": lambda words: index.process_query(words, None, k=args.k),
+            "MaxScore top-k": lambda words: index.process_query(
+                words, None, k=args.k, max_score=True
+            ),
+        }
+        for workload, queries in workloads.items():
+            longest = max(
+                sum(len(index.inverted_lists[word]) for word in words)
+                for words in queries
+            )
+            print(f"{workload} ({len(queries)} queries, up to {longest} postings)")
+            print(f"{'':<24} {'mean ms':>8} {'median ms':>10} {'max ms':>8}")
+            for name, evaluate in evaluations.items():
+                times = [
+                    timed(lambda: evaluate(words), args.repeat) for words in queries
+                ]
+                print(
+                    f"{name:<24} {statistics.mean(times):>8.1f} {statistics.median(times):>10.1f} {max(times):>8.1f}"
+                )
+            print()
+
+
+if __name__ == "__main__":
+    main()
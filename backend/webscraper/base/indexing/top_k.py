@@ -0,0 +1,214 @@
+"""
+Top-k evaluation of the keyword queries. The posting lists of the keywords are sorted by doc_id,
+their union is read in doc_id order and only the k best postings are kept in a heap.
+
+With `max_score`, the postings which cannot enter the top k are skipped with the highest score of every
+list (MaxScore, Turtle and Flood 1995). The documents of the best postings of every list are scored
+first, which gives a k-th score. A document only found in the lists whose highest scores sum below it
+cannot enter the top k, so these lists are only probed. In the other lists, a posting whose score plus
+the highest scores of the other lists is below it is skipped too. The remaining documents are scored by
+probing all the lists, by binary search or by skipping blocks of the compressed lists.
+
+Both return the same postings and scores as summing the lists and sorting the whole union.
+"""
+
+import heapq
+import itertools
+import math
+from operator import itemgetter
+from typing import Sequence
+
+import numpy as np
+
+from .postings import PostingCursor
+
+Posting = tuple[int, int, float, int]
+
+DOC_ID = itemgetter(0)
+# The bounds are summed in another order than the scores, so they are made a little larger
+# to stay above the scores whatever the rounding
+MARGIN = 1e-9
+
+
+def upper_bound(value):
+    return value + abs(value) * MARGIN
+
+
+def cursor(postings: Sequence[Posting]) -> PostingCursor:
+    """
+    :param postings: A posting list of the index or a list of posting tuples
+    """
+    if hasattr(postings, "cursor"):
+        return postings.cursor()
+    scores = [posting[2] for posting in postings]
+    return PostingCursor(
+        postings, [posting[0] for posting in postings], scores, max(scores, default=0.0)
+    )
+
+
+def doc_ids_at(c: PostingCursor, positions: np.ndarray) -> list[int]:
+    if hasattr(c.postings, "doc_ids_at"):
+        return c.postings.doc_ids_at(positions)
+    return np.asarray(c.doc_ids)[positions].tolist()
+
+
+def offer(
+    results: list, k: int | None, doc_id: int, score: float, posting: Posting
+) -> None:
+    """
+    Adds the posting to the results if it is among the k best, the postings with a score of 0 are dropped.
+    On equal scores the smallest doc_id is kept, like a stable sort of the postings by doc_id.
+    """
+    if score == 0:
+        return
+    entry = (score, -doc_id, posting)
+    if k is None or len(results) < k:
+        heapq.heappush(results, entry)
+    elif entry[:2] > results[0][:2]:
+        heapq.heapreplace(results, entry)
+
+
+def ranked(results: list) -> list[Posting]:
+    """
+    :return: The postings by score in descending order, with the summed scores
+    """
+    return [
+        (posting[0], posting[1], score, posting[3])
+        for score, _, posting in sorted(
+            results, key=lambda entry: entry[:2], reverse=True
+        )
+    ]
+
+
+def top_k(lists: list[Sequence[Posting]], k: int | None = None) -> list[Posting]:
+    """
+    Heap-based k-way union of the lists, the scores of a document are summed in the order of the lists.
+    :param lists: The posting lists of the keywords, sorted by doc_id
+    :param k: The number of results, all the results if None
+    :return: The k postings with the highest scores
+    """
+    if k == 0:
+        return []
+    results = []
+    for doc_id, group in itertools.groupby(heapq.merge(*lists, key=DOC_ID), key=DOC_ID):
+        posting = next(group)
+        score = posting[2]
+        for other in group:
+            score += other[2]
+        # The documents come by doc_id, so one with the k-th score does not enter the results either
+        if k is not None and len(results) == k and score <= results[0][0]:
+            continue
+        offer(results, k, doc_id, score, posting)
+    return ranked(results)
+
+
+def evaluate(
+    lists: list[Sequence[Posting]], doc_ids: list[int], results: list, k: int
+) -> None:
+    """
+    Scores the documents by probing the lists, the scores are summed in the order of the lists
+    so they are the same floats as with `top_k`.
+    :param doc_ids: Sorted doc_ids
+    """
+    probes = [cursor(postings) for postings in lists]
+    for doc_id in doc_ids:
+        found = []
+        for c in probes:
+            c.seek(doc_id)
+            if c.doc_id == doc_id:
+                found.append(c)
+        score = found[0].score()
+        for c in found[1:]:
+            score += c.score()
+        offer(results, k, doc_id, score, found[0].posting())
+
+
+def evaluate_arrays(
+    lists: list[Sequence[Posting]],
+    cursors: list[PostingCursor],
+    scores: list[np.ndarray],
+    doc_ids: list[int],
+    results: list,
+    k: int,
+) -> None:
+    """
+    Like `evaluate` but the documents are found in every list at once by binary search,
+    the lists must not be compressed.
+    """
+    doc_ids = np.array(doc_ids, dtype=np.int64)
+    totals = np.zeros(len(doc_ids), dtype=np.float64)
+    # The list and the position of the first posting of every document
+    first_list = np.full(len(doc_ids), -1)
+    first_position = np.zeros(len(doc_ids), dtype=np.int64)
+    for i, c in enumerate(cursors):
+        list_doc_ids = np.asarray(c.doc_ids, dtype=np.int64)
+        if len(list_doc_ids) == 0:
+            continue
+        positions = np.searchsorted(list_doc_ids, doc_ids)
+        np.minimum(positions, len(list_doc_ids) - 1, out=positions)
+        found = list_doc_ids[positions] == doc_ids
+        # The scores are added one list after the other, like the postings are summed by `top_k`
+        totals[found] += scores[i][positions[found]]
+        first = found & (first_list == -1)
+        first_list[first] = i
+        first_position[first] = positions[first]
+    threshold = results[0][0] if len(results) == k else -math.inf
+    for j in np.flatnonzero(totals >= threshold).tolist():
+        score = float(totals[j])
+        if len(results) == k and (score, -doc_ids[j]) <= results[0][:2]:
+            continue
+        posting = lists[first_list[j]][int(first_position[j])]
+        offer(results, k, int(doc_ids[j]), score, posting)
+
+
+def top_k_max_score(lists: list[Sequence[Posting]], k: int) -> list[Posting]:
+    """
+    Like `top_k` but the postings which cannot enter the top k are skipped.
+    :param lists: The posting lists of the keywords, sorted by doc_id
+    :param k: The number of results
+    :return: The k postings with the highest scores
+    """
+    if k <= 0:
+        return []
+    cursors = [cursor(postings) for postings in lists]
+    scores = [np.asarray(c.scores, dtype=np.float64) for c in cursors]
+
+    # The documents of the k best postings of every list give a first k-th score
+    seeds = set()
+    for c, list_scores in zip(cursors, scores):
+        positions = np.arange(len(list_scores))
+        if len(list_scores) > k:
+            positions = np.argpartition(list_scores, len(list_scores) - k)[-k:]
+        seeds.update(doc_ids_at(c, positions))
+    if any(hasattr(c.postings, "doc_ids_at") for c in cursors):
+        # The doc_ids of the compressed lists are only decoded where they are probed
+        def score_documents(doc_ids: list[int]) -> None:
+            evaluate(lists, doc_ids, results, k)
+
+    else:
+
+        def score_documents(doc_ids: list[int]) -> None:
+            evaluate_arrays(lists, cursors, scores, doc_ids, results, k)
+
+    results = []
+    score_documents(sorted(seeds))
+    # Without k results yet, because of the scores of 0, all the documents are scored
+    threshold = results[0][0] if len(results) == k else -math.inf
+
+    # A posting can have a negative weight, it does not lower the score of the documents without it
+    highest = [max(c.max_score, 0.0) for c in cursors]
+    total = sum(highest)
+    candidates = set()
+    below = 0.0
+    for i in sorted(range(len(cursors)), key=highest.__getitem__):
+        below += highest[i]
+        # A document only in this list and the lists before cannot enter the results,
+        # it is found through the next lists if it is in one of them
+        if upper_bound(below) < threshold:
+            continue
+        # The seeded documents are not in the order of the doc_ids, so a document with
+        # the k-th score may still enter the results and only the ones below it are skipped
+        viable = upper_bound(scores[i] + (total - highest[i])) >= threshold
+        candidates.update(doc_ids_at(cursors[i], np.flatnonzero(viable)))
+    score_documents(sorted(candidates - seeds))
+    return ranked(results)
@@ -0,0 +1,22 @@
+# Generated by Django 4.1 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0069_alter_statistics_http_codes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="crawler",
+            name="engine",
+            field=models.CharField(
+                choices=[("Selenium", "Selenium"), ("Static", "Static")],
+                default="Selenium",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.1 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0070_crawler_engine"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="crawler",
+            name="concurrency",
+            field=models.PositiveIntegerField(default=100),
+        ),
+        migrations.AddField(
+            model_name="crawler",
+            name="host_concurrency",
+            field=models.PositiveIntegerField(default=10),
+        ),
+        migrations.AlterField(
+            model_name="crawler",
+            name="engine",
+            field=models.CharField(
+                choices=[
+                    ("Selenium", "Selenium"),
+                    ("Static", "Static"),
+                    ("Async", "Async"),
+                ],
+                default="Selenium",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0071_crawler_async_engine"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="configurationmodel",
+            name="driver_max_memory",
+            field=models.PositiveIntegerField(default=1024),
+        ),
+        migrations.AddField(
+            model_name="configurationmodel",
+            name="driver_max_pages",
+            field=models.PositiveIntegerField(default=500),
+        ),
+        migrations.AddField(
+            model_name="configurationmodel",
+            name="driver_pool_size",
+            field=models.PositiveSmallIntegerField(default=4),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1 on 2026-10-18 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0072_configurationmodel_driver_pool"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="crawler",
+            name="stripped_url_params",
+            field=models.TextField(
+                blank=True,
+                default='utm_*";"gclid";"dclid";"fbclid";"msclkid";"mc_cid";"mc_eid";"_ga";"_hsenc";"_hsmi',
+            ),
+        ),
+        migrations.AddField(
+            model_name="crawler",
+            name="use_bloom_filter",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.1 on 2026-10-18 19:24
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicated_documents(apps, schema_editor):
+    """
+    Threads could save the same document twice before the hash code was unique,
+    only the oldest copy is kept, the values of the others are deleted with them.
+    """
+    Document = apps.get_model("base", "Document")
+    duplicated = (
+        Document.objects.exclude(hash_code="")
+        .values("hash_code")
+        .annotate(count=Count("id"), first_id=Min("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicated:
+        Document.objects.filter(hash_code=duplicate["hash_code"]).exclude(
+            id=duplicate["first_id"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0073_crawler_url_canonicalization"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicated_documents, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="configurationmodel",
+            name="document_batch_size",
+            field=models.PositiveIntegerField(default=500),
+        ),
+        migrations.AddField(
+            model_name="configurationmodel",
+            name="document_flush_interval",
+            field=models.FloatField(default=2),
+        ),
+        migrations.AddConstraint(
+            model_name="document",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("hash_code", ""), _negated=True),
+                fields=("hash_code",),
+                name="unique_document_hash_code",
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1 on 2026-10-18 19:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_runner_documents(apps, schema_editor):
+    Runner = apps.get_model("base", "Runner")
+    InspectorValue = apps.get_model("base", "InspectorValue")
+    for runner in Runner.objects.all():
+        runner.documents_count = (
+            InspectorValue.objects.filter(deleted=False, runner=runner)
+            .values("document__id")
+            .annotate(dcount=Count("id"))
+            .count()
+        )
+        runner.save(update_fields=["documents_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0074_document_writer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="runner",
+            name="documents_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_runner_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0075_runner_documents_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="template",
+            name="record_selector",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0076_template_record_selector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="configurationmodel",
+            name="statistics_flush_interval",
+            field=models.FloatField(default=5),
+        ),
+        migrations.AddField(
+            model_name="statistics",
+            name="metrics",
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.1 on 2026-10-18 19:37
+
+import random
+
+from django.db import migrations, models
+
+# The keys written for every skipped link before, and the counter they are merged into
+LINK_PREFIXES = {
+    "Disallow link: ": "Disallowed links",
+    "Excluded link: ": "Excluded links",
+    "Cross site link: ": "Cross site links",
+}
+SAMPLE_SIZE = 20
+
+
+def merge_link_keys(apps, schema_editor):
+    Statistics = apps.get_model("base", "Statistics")
+    for statistics in Statistics.objects.all().iterator():
+        http_codes = {}
+        links = {}
+        for key, value in statistics.http_codes.items():
+            for prefix, category in LINK_PREFIXES.items():
+                if key.startswith(prefix):
+                    links.setdefault(category, []).append(key[len(prefix) :])
+                    break
+            else:
+                http_codes[key] = value
+        if not links:
+            continue
+        for category, urls in links.items():
+            http_codes[category] = len(urls)
+            statistics.link_samples[category] = random.sample(
+                urls, min(len(urls), SAMPLE_SIZE)
+            )
+        statistics.http_codes = http_codes
+        statistics.save(update_fields=["http_codes", "link_samples"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0077_statistics_metrics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="statistics",
+            name="link_samples",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(merge_link_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0078_statistics_link_samples"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="crawler",
+            name="profile",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0079_crawler_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="indexer",
+            name="compress_postings",
+            field=models.BooleanField(default=False),
+        ),
+    ]
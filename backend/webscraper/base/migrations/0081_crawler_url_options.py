@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0080_indexer_compress_postings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="crawler",
+            name="remove_trailing_slash",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="crawler",
+            name="sort_url_params",
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.db.models import Count
 from polymorphic.models import PolymorphicModel
 from solo.models import SingletonModel
 
+from .crawling.urls import TRACKING_PARAMS
+
 
 class RunnerStatus(models.TextChoices):
     NEW = "New"
@@ -49,6 +51,16 @@ class CrawlingAlgorithms(models.TextChoices):
     DFS = "DFS"
 
 
+class CrawlerEngines(models.TextChoices):
+    """
+    This is used to declare how the pages are fetched and parsed
+    """
+
+    SELENIUM = "Selenium"
+    STATIC = "Static"
+    ASYNC = "Async"
+
+
 class ActionChainEvent(models.TextChoices):
     BEFORE = "before"
     AFTER = "after"
@@ -66,6 +78,9 @@ class Template(models.Model):
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     deleted = models.BooleanField(default=False)
+    # XPath of the element holding one document, like a product card of a listing page.
+    # If it is set, the inspectors are evaluated inside every record, `//h2` is read as `.//h2`
+    record_selector = models.TextField(blank=True, default="")
 
     def __str__(self) -> str:
         return self.name
@@ -94,6 +109,8 @@ class Indexer(models.Model):
     name = models.CharField(max_length=50)
     description = models.TextField(blank=True)
     boosting_formula = models.TextField(blank=True)
+    # Store the doc_ids of the index file as varint gaps and the scores on 32 bits
+    compress_postings = models.BooleanField(default=False)
     status = models.CharField(
         max_length=10, choices=IndexerStatus.choices, default=IndexerStatus.NEW
     )
@@ -192,6 +209,16 @@ class Document(models.Model):
     for example one movie, onr product or one-page result count as one document.
     """
 
+    class Meta:
+        constraints = [
+            # The same document is saved only once, documents without hash code are imported ones
+            models.UniqueConstraint(
+                fields=["hash_code"],
+                condition=~models.Q(hash_code=""),
+                name="unique_document_hash_code",
+            )
+        ]
+
     template = models.ForeignKey(Template, on_delete=models.PROTECT, null=True)
     hash_code = models.CharField(max_length=40, default="")
 
@@ -228,6 +255,26 @@ class Crawler(models.Model):
         choices=CrawlingAlgorithms.choices,
         default=CrawlingAlgorithms.DFS,
     )
+    engine = models.CharField(
+        max_length=20,
+        choices=CrawlerEngines.choices,
+        default=CrawlerEngines.SELENIUM,
+    )
+    # Number of in flight requests used by the async engine
+    concurrency = models.PositiveIntegerField(default=100)
+    host_concurrency = models.PositiveIntegerField(default=10)
+    # Query parameters removed from the links before they are crawled, `utm_*` matches all the UTM parameters
+    stripped_url_params = models.TextField(
+        blank=True, default='";"'.join(TRACKING_PARAMS)
+    )
+    # Orders the query parameters of the links by name, `?b=1&a=2` and `?a=2&b=1` are crawled once
+    sort_url_params = models.BooleanField(default=True)
+    # Crawls `/products/` as `/products`, only for sites which serve both
+    remove_trailing_slash = models.BooleanField(default=False)
+    # Keeps the seen links in a Bloom filter, it needs less memory but a few pages may be skipped
+    use_bloom_filter = models.BooleanField(default=False)
+    # Traces the time of every phase of every page to `{runner id}.trace.jsonl`
+    profile = models.BooleanField(default=False)
 
     def __str__(self) -> str:
         return self.name
@@ -244,12 +291,20 @@ class Runner(models.Model):
         max_length=10, choices=RunnerStatus.choices, default=RunnerStatus.NEW
     )
     machine = models.CharField(max_length=225, default="localhost")
+    # Saved documents, kept up to date while the runner is crawling so they are not counted on every read
+    documents_count = models.PositiveIntegerField(default=0)
 
     def __str__(self) -> str:
         return str(self.pk)
 
     @property
     def collected_documents(self) -> int:
+        return self.documents_count
+
+    def count_documents(self) -> int:
+        """
+        Counts the documents in the database, it gets slower as the runner collects more documents.
+        """
         return (
             InspectorValue.objects.filter(deleted=False, runner=self)
             .values("document__id")
@@ -296,6 +351,10 @@ class Statistics(models.Model):
     avg_page_size = models.FloatField(default=0)
     http_codes = models.JSONField(default=dict)
     average_docs_per_page = models.PositiveIntegerField(default=0)
+    # Count, mean and p50/p95/p99 of the fetch, actions, extraction and save times, see `RunnerMetrics`
+    metrics = models.JSONField(default=dict)
+    # A few examples of the skipped links of every category counted in `http_codes`
+    link_samples = models.JSONField(default=dict)
 
     def __str__(self) -> str:
         return f"Runner: {self.runner}," f" visited_pages: ({self.visited_pages})"
@@ -335,6 +394,15 @@ class ConfigurationModel(SingletonModel):
     max_num_crawlers = models.PositiveSmallIntegerField(default=2)
     max_num_machines = models.PositiveSmallIntegerField(default=2)
     min_sleep_time = models.FloatField(default=0.25)
+    # Warm Chrome drivers kept by each process, see `DriverPool`
+    driver_pool_size = models.PositiveSmallIntegerField(default=4)
+    driver_max_pages = models.PositiveIntegerField(default=500)
+    driver_max_memory = models.PositiveIntegerField(default=1024)
+    # Documents are saved in batches by a background writer, see `DocumentWriter`
+    document_batch_size = models.PositiveIntegerField(default=500)
+    document_flush_interval = models.FloatField(default=2)
+    # Seconds between two saves of the statistics of a runner
+    statistics_flush_interval = models.FloatField(default=5)
 
     def __str__(self):
         return "Site Configuration"
@@ -0,0 +1,243 @@
+import bisect
+import logging
+import math
+import threading
+from typing import Callable
+
+# Upper bounds of the default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        name
+        + '="'
+        + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        + '"'
+        for name, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metric:
+    """
+    A metric with one value per combination of its labels, the values only live in the memory of the process.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        """
+        :param name: Name of the metric, like `webscraper_pages_total`
+        :param documentation: The help line of the metric
+        :param labels: Names of the labels, every update must give a value to all of them
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values: dict[tuple[tuple[str, str], ...], object] = {}
+
+    def key(self, labels: dict) -> tuple[tuple[str, str], ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(
+                f"{self.name} expects the labels {self.labels}, got {tuple(labels)}"
+            )
+        return tuple((name, str(labels[name])) for name in self.labels)
+
+    def remove(self, **labels) -> None:
+        """
+        Drop the value of the labels, like the values of a runner which is done.
+        """
+        with self.lock:
+            self.values.pop(self.key(labels), None)
+
+    def remove_matching(self, **labels) -> None:
+        """
+        Drop the values of all the label combinations containing the given labels.
+        """
+        expected = {(name, str(value)) for name, value in labels.items()}
+        with self.lock:
+            for key in [key for key in self.values if expected <= set(key)]:
+                del self.values[key]
+
+    def samples(self) -> list[tuple[str, tuple[tuple[str, str], ...], float]]:
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        """
+        Copy a total counted by another object, like the leases of the driver pool.
+        """
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """
+    Counts the observed values in cumulative buckets, like the latency of the searches.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        """
+        :param buckets: Sorted upper bounds of the buckets, the +Inf bucket is added
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # One count per bucket, the count of +Inf, then the sum
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self) -> list[tuple[str, tuple[tuple[str, str], ...], float]]:
+        with self.lock:
+            values = {key: list(counts) for key, counts in self.values.items()}
+        samples = []
+        for key, counts in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(
+                    (
+                        f"{self.name}_bucket",
+                        key + (("le", format_value(float(bound))),),
+                        cumulative,
+                    )
+                )
+            samples.append((f"{self.name}_sum", key, counts[-1]))
+            samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process. Values which already live in other objects, like the size of a frontier,
+    are read by collectors right before the metrics are rendered, so the crawling threads do not update them.
+    """
+
+    def __init__(self, logger: logging.Logger | None = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        :return: The metric registered before with the same name, or the given one
+        """
+        with self.lock:
+            registered = self.metrics.setdefault(metric.name, metric)
+        if type(registered) is not type(metric):
+            raise ValueError(
+                f"{metric.name} is already registered as a {registered.type}"
+            )
+        return registered
+
+    def counter(
+        self, name: str, documentation: str, labels: tuple[str, ...] = ()
+    ) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(
+        self, name: str, documentation: str, labels: tuple[str, ...] = ()
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        :param collector: Updates a few gauges, it is called for every scrape and must not query the database
+        """
+        with self.lock:
+            self.collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]) -> None:
+        with self.lock:
+            if collector in self.collectors:
+                self.collectors.remove(collector)
+
+    def render(self) -> str:
+        """
+        :return: All the metrics in the Prometheus text format
+        """
+        with self.lock:
+            collectors = list(self.collectors)
+            metrics = list(self.metrics.values())
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                # The other metrics are still exported
+                self.logger.error(f"Could not collect the metrics: {e}")
+        lines = []
+        for metric in sorted(metrics, key=lambda metric: metric.name):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -46,6 +46,14 @@ class CrawlerSerializer(serializers.ModelSerializer):
             "show_browser",
             "parsing_algorithm",
             "allow_multi_elements",
+            "engine",
+            "concurrency",
+            "host_concurrency",
+            "stripped_url_params",
+            "sort_url_params",
+            "remove_trailing_slash",
+            "use_bloom_filter",
+            "profile",
         ]
 
 
@@ -59,6 +67,8 @@ class StatisticsSerializer(serializers.ModelSerializer):
             "avg_loading_time",
             "avg_page_size",
             "http_codes",
+            "metrics",
+            "link_samples",
         ]
 
 
@@ -102,6 +112,7 @@ class IndexerSerializer(serializers.ModelSerializer):
             "deleted",
             "inspectors_to_be_indexed",
             "boosting_formula",
+            "compress_postings",
             "inspectors",
         ]
 
@@ -155,6 +166,7 @@ class TemplateSerializer(serializers.ModelSerializer):
             "name",
             "created_at",
             "deleted",
+            "record_selector",
             "inspectors",
             "action_chain",
             "action_chain_disabled",
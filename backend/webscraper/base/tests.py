@@ -0,0 +1,329 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import lxml.html
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from .crawling.document_writer import DocumentWriter
+from .crawling.extraction_plan import ExtractionPlan, InspectorPlan
+from .crawling.fragment_cache import LinkFragmentCache
+from .crawling.page_extraction import extract_page
+from .crawling.static_driver import StaticElement
+from .models import (
+    ActionChain,
+    Crawler,
+    Document,
+    Inspector,
+    InspectorValue,
+    LinkFragment,
+    Runner,
+    Template,
+    WaitAction,
+)
+from .utils import extraction_plans
+
+
+class ExtractionPlanTest(TestCase):
+    def test_compile_records(self) -> None:
+        template = Template.objects.create(
+            name="cards", record_selector="//div[@class='card']"
+        )
+        Inspector.objects.create(name="title", selector="//h2", template=template)
+        Inspector.objects.create(name="price", selector="//span", template=template)
+        plan = ExtractionPlan.compile(template)
+        self.assertEqual(plan.record_selector, "//div[@class='card']")
+        self.assertIsNotNone(plan.record_xpath)
+        # The inspectors are evaluated inside every record
+        self.assertEqual(
+            [inspector.selector for inspector in plan.inspectors], [".//h2", ".//span"]
+        )
+
+        tree = lxml.html.document_fromstring(
+            "<html><body><div class='card'><h2>A</h2><span>1</span></div>"
+            "<div class='card'><h2>B</h2><span>2</span></div></body></html>"
+        )
+        content = extract_page(StaticElement(tree), [], plan)
+        self.assertEqual(
+            content.records,
+            [[("A", None), ("1", None)], [("B", None), ("2", None)]],
+        )
+
+    def test_compile_without_records(self) -> None:
+        template = Template.objects.create(name="page")
+        Inspector.objects.create(name="title", selector="//h2", template=template)
+        plan = ExtractionPlan.compile(template)
+        self.assertIsNone(plan.record_xpath)
+        self.assertEqual(plan.inspectors[0].selector, "//h2")
+
+        template.record_selector = "//["
+        plan = ExtractionPlan.compile(template)
+        self.assertIsNone(plan.record_xpath)
+
+    def test_clean_up(self) -> None:
+        inspector = Inspector(
+            selector="//span", clean_up_expression='\\s+= ";"EUR=currency=EUR'
+        )
+        plan = InspectorPlan.compile(inspector)
+        self.assertEqual(len(plan.clean_ups), 2)
+        # Only the first `=` separates the expression from its replacement
+        self.assertEqual(plan.clean_up("12\n EUR"), "12 currency=EUR")
+        self.assertEqual(plan.clean_up(""), "")
+
+    def test_actions(self) -> None:
+        template = Template.objects.create(name="actions")
+        chain = ActionChain.objects.create(template=template, disabled=True)
+        second = WaitAction.objects.create(name="second", action_chain=chain, order=2)
+        first = WaitAction.objects.create(name="first", action_chain=chain, order=1)
+        WaitAction.objects.create(
+            name="deleted", action_chain=chain, order=0, deleted=True
+        )
+        self.assertEqual(ExtractionPlan.compile(template).actions, ())
+        chain.disabled = False
+        chain.save()
+        self.assertEqual(
+            [action.id for action in ExtractionPlan.compile(template).actions],
+            [first.id, second.id],
+        )
+
+
+class ExtractionPlansTest(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.template = Template.objects.create(name="shop")
+        self.chain = ActionChain.objects.create(template=self.template, disabled=True)
+        self.inspector = Inspector.objects.create(
+            name="title", selector="//h1", template=self.template
+        )
+        # The plans are shared by the process, a plan left by another test is not reused
+        extraction_plans.invalidate(self.template.id)
+        self.addCleanup(extraction_plans.invalidate, self.template.id)
+
+    def test_plan_is_cached(self) -> None:
+        plan = extraction_plans.get(self.template)
+        self.assertIs(extraction_plans.get(self.template), plan)
+
+    def test_template_edit(self) -> None:
+        plan = extraction_plans.get(self.template)
+        response = self.client.patch(
+            f"/api/templates/{self.template.id}/",
+            {"record_selector": "//article"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        plan = extraction_plans.get(self.template)
+        self.assertEqual(plan.record_selector, "//article")
+        self.assertEqual(plan.inspectors[0].selector, ".//h1")
+
+    def test_inspector_edit(self) -> None:
+        extraction_plans.get(self.template)
+        response = self.client.patch(
+            f"/api/inspectors/{self.inspector.id}/", {"selector": "//h2"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        plan = extraction_plans.get(self.template)
+        self.assertEqual(plan.inspectors[0].selector, "//h2")
+
+    def test_action_edit(self) -> None:
+        action = WaitAction.objects.create(name="wait", action_chain=self.chain)
+        self.assertEqual(extraction_plans.get(self.template).actions, ())
+        response = self.client.post(
+            f"/api/actions/{self.chain.id}/disable-actions-chain/"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(extraction_plans.get(self.template).actions[0].time, 1)
+        response = self.client.patch(
+            f"/api/actions/{action.id}/",
+            {"resourcetype": "WaitAction", "time": 3},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(extraction_plans.get(self.template).actions[0].time, 3)
+
+
+# The ids of the fragments are reserved from the Postgres sequence of the table
+@unittest.skipUnless(connection.vendor == "postgresql", "The cache needs Postgres")
+class LinkFragmentCacheTest(TransactionTestCase):
+    def setUp(self) -> None:
+        crawler = Crawler.objects.create(name="shop", seed_url="https://shop.com/")
+        self.runner = Runner.objects.create(crawler=crawler)
+
+    def test_preload(self) -> None:
+        host = LinkFragment.objects.create(fragment="shop.com", runner=self.runner)
+        page = LinkFragment.objects.create(
+            fragment="a", parent=host, runner=self.runner
+        )
+        cache = LinkFragmentCache(self.runner)
+        cache.preload()
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.save("https://shop.com/a"), page.id)
+
+    def test_shared_prefix(self) -> None:
+        cache = LinkFragmentCache(self.runner)
+        first = cache.save("https://shop.com/a/b")
+        second = cache.save("https://shop.com/a/c")
+        # Only the last fragment is new, the host and `a` are reused
+        self.assertEqual(LinkFragment.objects.count(), 4)
+        self.assertEqual(
+            LinkFragment.objects.get(id=first).parent_id,
+            LinkFragment.objects.get(id=second).parent_id,
+        )
+        self.assertEqual(LinkFragment.objects.get(id=second).full_url, "shop.com/a/c")
+
+    def test_concurrent_inserts(self) -> None:
+        cache = LinkFragmentCache(self.runner)
+        barrier = threading.Barrier(8)
+        ids = []
+
+        def save() -> None:
+            try:
+                barrier.wait()
+                ids.append(cache.save("https://shop.com/x/y/z"))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=save) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The branch is inserted once, the other threads find it in the cache
+        self.assertEqual(len(set(ids)), 1)
+        self.assertEqual(LinkFragment.objects.count(), 4)
+
+
+class DocumentWriterFixture:
+    def create_runner(self) -> None:
+        self.template = Template.objects.create(name="shop")
+        self.inspector = Inspector.objects.create(
+            name="title", selector="//h1", template=self.template
+        )
+        crawler = Crawler.objects.create(name="shop", seed_url="https://shop.com/")
+        self.runner = Runner.objects.create(crawler=crawler)
+        self.fragment = LinkFragment.objects.create(
+            fragment="shop.com", runner=self.runner
+        )
+
+    def values(self, *texts: str) -> list[InspectorValue]:
+        return [
+            InspectorValue(
+                value=text,
+                url="https://shop.com/",
+                link_fragment=self.fragment,
+                inspector=self.inspector,
+                runner=self.runner,
+            )
+            for text in texts
+        ]
+
+    def item(self, hash_code: str) -> tuple:
+        return self.template, hash_code, self.values(f"{hash_code} title")
+
+
+class DocumentWriterTest(DocumentWriterFixture, TestCase):
+    def setUp(self) -> None:
+        self.create_runner()
+
+    def test_write(self) -> None:
+        writer = DocumentWriter(self.runner)
+        batch = [
+            (self.template, "a", self.values("A", "A2")),
+            (self.template, "b", self.values("B")),
+        ]
+        writer.write(batch)
+        self.assertEqual(writer.saved, 2)
+        # Every value is linked to the document created for its hash code
+        for hash_code, texts in (("a", ["A", "A2"]), ("b", ["B"])):
+            document = Document.objects.get(hash_code=hash_code)
+            self.assertEqual(
+                sorted(
+                    InspectorValue.objects.filter(document=document).values_list(
+                        "value", flat=True
+                    )
+                ),
+                texts,
+            )
+        self.runner.refresh_from_db()
+        self.assertEqual(self.runner.documents_count, 2)
+
+    def test_documents_of_another_runner(self) -> None:
+        Document.objects.create(template=self.template, hash_code="a")
+        writer = DocumentWriter(self.runner)
+        writer.write([self.item("a"), self.item("b")])
+        self.assertEqual(writer.saved, 1)
+        self.assertEqual(writer.duplicates, 1)
+        self.assertEqual(Document.objects.filter(hash_code="a").count(), 1)
+        self.assertFalse(InspectorValue.objects.filter(value="a title").exists())
+        self.runner.refresh_from_db()
+        self.assertEqual(self.runner.documents_count, 1)
+
+    def test_integrity_error(self) -> None:
+        writer = DocumentWriter(self.runner)
+        bulk_create = Document.objects.bulk_create
+        calls = []
+
+        def conflicting_bulk_create(documents: list) -> list:
+            calls.append(len(documents))
+            if len(calls) == 1:
+                # Another process saved the same document after the lookup
+                raise IntegrityError("unique_document_hash_code")
+            return bulk_create(documents)
+
+        with mock.patch.object(
+            Document.objects, "bulk_create", side_effect=conflicting_bulk_create
+        ):
+            writer.write([self.item("a")])
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(writer.saved, 1)
+        self.assertEqual(Document.objects.filter(hash_code="a").count(), 1)
+
+    def test_duplicate_in_runner(self) -> None:
+        writer = DocumentWriter(self.runner)
+        self.assertTrue(writer.submit(*self.item("a")))
+        self.assertFalse(writer.submit(*self.item("a")))
+        self.assertEqual(writer.documents, 1)
+
+
+class DocumentWriterThreadTest(DocumentWriterFixture, TransactionTestCase):
+    def setUp(self) -> None:
+        self.create_runner()
+
+    def wait_saved(self, writer: DocumentWriter, count: int) -> None:
+        deadline = time.monotonic() + 5
+        while writer.saved < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_batch_size(self) -> None:
+        writer = DocumentWriter(self.runner, batch_size=2, flush_interval=60)
+        writer.start()
+        for hash_code in "abc":
+            writer.submit(*self.item(hash_code))
+        # A full batch is saved without waiting for the interval
+        self.wait_saved(writer, 2)
+        self.assertEqual(Document.objects.count(), 2)
+        self.assertEqual(writer.pending, 1)
+        writer.close()
+        self.assertEqual(Document.objects.count(), 3)
+
+    def test_flush_interval(self) -> None:
+        writer = DocumentWriter(self.runner, batch_size=100, flush_interval=0.1)
+        writer.start()
+        writer.submit(*self.item("a"))
+        self.wait_saved(writer, 1)
+        self.assertEqual(Document.objects.count(), 1)
+        writer.close()
+
+    def test_close(self) -> None:
+        writer = DocumentWriter(self.runner, batch_size=100, flush_interval=60)
+        writer.start()
+        for hash_code in "abc":
+            writer.submit(*self.item(hash_code))
+        writer.close()
+        self.assertFalse(writer.thread.is_alive())
+        self.assertEqual(writer.pending, 0)
+        self.assertEqual(Document.objects.count(), 3)
+        self.runner.refresh_from_db()
+        self.assertEqual(self.runner.documents_count, 3)
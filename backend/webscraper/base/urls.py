@@ -14,4 +14,6 @@ router.register(r"actions", views.ActionViewSet, "actions")
 
 urlpatterns = [
     path("", include(router.urls)),
+    # Scraped by Prometheus, it does not query the database
+    path("metrics/", views.metrics, name="metrics"),
 ]
@@ -1,187 +1,137 @@
+import atexit
 import hashlib
 import time
-from urllib.parse import urlparse
-from urllib.robotparser import RobotFileParser
+import os
+import pathlib
 
 import requests
+from requests.adapters import HTTPAdapter
 from selenium.common import NoSuchElementException
 from selenium.webdriver import Keys
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 
-from .dataclasses import Link, CrawlerThread
+from .crawling.driver_pool import DriverPool
+from .crawling.extraction_plan import ExtractionPlans
+from .crawling.network_events import PageResponse, parse_performance_log
+from .crawling.robots import RobotsCache
+from .crawling.static_driver import StaticDriver
+from .prometheus import MetricsRegistry
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 
 from .models import (
-    Template,
-    ActionChain,
     Action,
     ClickAction,
     WaitAction,
     ScrollAction,
-    Crawler,
-    CrawlingAlgorithms,
 )
 
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 6.1)"
+    " AppleWebKit/537.2 (KHTML, like Gecko) Chrome/110.0.5481.77 Safari/537.2"
+)
+# The user matched against the rules of ROBOTS.txt files
+ROBOTS_USER_AGENT = "deepcrawl"
 
-def fetch_robots_txt(link) -> str:
-    """
-    Find and parse ROBOTS.txt file
-    :param link: Base link that will be used as a source of truth to find the ROBOTS.txt
-    :return:
-    """
-    # Parse the base URL from the provided link
-    base_url = urlparse(link)._replace(path="").geturl()
+# The parsed ROBOTS.txt files are shared by all the runners and survive restarts on disk
+robots_cache = RobotsCache(os.path.join(pathlib.Path().resolve(), "robots_cache"))
 
-    # Fetch the robots.txt file
-    robots_url = base_url + "/robots.txt"
-    response = requests.get(robots_url)
+# The templates compiled for the runners of the process, the views drop a plan when its template is edited
+extraction_plans = ExtractionPlans()
 
-    if response.status_code == 200:
-        return response.text
-    else:
-        return None
+# Metrics of the process, they are exported in the Prometheus text format by the metrics view
+metrics_registry = MetricsRegistry()
 
 
-def check_crawl_permission(robots_txt_content, user_agent, link) -> bool:
+def create_chrome_driver(show_browser: bool) -> WebDriver:
     """
-    Checks if the crawler allowed to crawl a link
-    :param robots_txt_content: ROBOTS.txt file content
-    :param user_agent: User used to crawl
-    :param link: The link wanted to be crawled
-    :return:
+    Create a new driver to be used for crawling
+    :return:chrome driver
     """
-    if not robots_txt_content or not link:
-        return True
-    robot_parser = RobotFileParser()
-    robot_parser.parse(robots_txt_content.splitlines())
-    robot_parser.set_url(link)  # Set the URL to check permissions
-
-    # Check if the link is allowed to be crawled
-    return robot_parser.can_fetch(user_agent, link)
-
+    chrome_options = Options()
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--window-size=2560,1440")
+    # The network events are used to read the status code and the size of the pages
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    # Set the implicitly wait time (in seconds)
+    if not show_browser:
+        chrome_options.add_argument("--headless")  # Hides the browser window
+    # Reference the local Chromedriver instance
+    chrome_path = r"/usr/bin/chromedriver"
+    return webdriver.Chrome(executable_path=chrome_path, options=chrome_options)
 
-def find_the_links_current_level(
-    links_queues: dict[int, list], crawler: Crawler
-) -> int:
-    """
-    We would like to find the queue that contain links left
-    :param links_queues: A hashmap with a key of the level and the value is the queue
-    :param crawler: Crawler that is in progress.
-    :return:
-    """
-    levels_with_links = []
-    for level in links_queues.keys():
-        if len(links_queues[level]) > 0:
-            levels_with_links.append(level)
 
-    if len(levels_with_links) == 0:
-        return -1
+# Warm browsers shared by all the runners of the process, configured from the `ConfigurationModel`
+driver_pool = DriverPool(create_chrome_driver)
+atexit.register(driver_pool.close)
 
-    if crawler.parsing_algorithm == CrawlingAlgorithms.DFS:
-        levels_with_links.sort(reverse=True)
-    else:
-        levels_with_links.sort()
-    print(levels_with_links)
-    return levels_with_links[0]
+DRIVER_POOL_BROWSERS = metrics_registry.gauge(
+    "webscraper_driver_pool_browsers", "Browsers of the driver pool", ("state",)
+)
+DRIVER_POOL_EVENTS = metrics_registry.counter(
+    "webscraper_driver_pool_events_total", "Events of the driver pool", ("event",)
+)
 
 
-def add_link_to_level(links_queues: dict[int, list], link: Link) -> None:
-    """
-    Helper function used to add links to the corresponding level
-    :param links_queues:
-    :param link:
-    :return:
-    """
-    if link.level in links_queues.keys():
-        links_queues[link.level].append(link)
-    else:
-        links_queues[link.level] = [link]
+def collect_driver_pool() -> None:
+    stats = driver_pool.stats()
+    for state in ("size", "alive", "peak", "idle"):
+        DRIVER_POOL_BROWSERS.set(stats[state], state=state)
+    for event in (
+        "leases",
+        "created",
+        "recycles",
+        "health_failures",
+        "start_failures",
+    ):
+        DRIVER_POOL_EVENTS.set(stats[event], event=event)
 
 
-def all_threads_completed(shared_threads_pool: dict[int, CrawlerThread]) -> bool:
-    """
-    Check if all crawlers are completed
-    :param shared_threads_pool:
-    :return:
-    """
-    for thread_id, thread in shared_threads_pool.items():
-        if thread.running:
-            return False
-    return True
+metrics_registry.add_collector(collect_driver_pool)
 
 
-def split_work_between_threads(
-    shared_threads_pool: dict[int, CrawlerThread]
-) -> dict[int, list] | None:
+def create_http_session(pool_size: int) -> requests.Session:
     """
-    This function will check which threads are not done crawling and will distribute the work between them
-    :param shared_threads_pool:
-    :return:
+    Create an HTTP session shared between the crawling threads, connections are kept alive and reused.
+    :param pool_size: The maximum number of connections kept open per host
+    :return: HTTP session
     """
-    max_length = -1
-    max_level = -1
-    thread_id_needs_help = -1
-    for thread_id, thread in shared_threads_pool.items():
-        level = find_the_links_current_level(thread.queues, thread.crawler)
-        if level != -1 and len(thread.queues[level]) > max_length:
-            max_length = len(thread.queues[level])
-            thread_id_needs_help = thread_id
-            max_level = level
-
-    long_queue: list = shared_threads_pool[thread_id_needs_help].queues[max_level]
-    if len(long_queue) < 5:
-        return None
-    half_length = len(long_queue) // 2
-    shared_threads_pool[thread_id_needs_help].queues[max_level] = long_queue[
-        :half_length
-    ]
-    print(len(long_queue[half_length:]))
-    if len(long_queue[half_length:]) == 0:
-        return None
-    result: dict[int, list] = {max_level: long_queue[half_length:]}
-    return result
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
 
 
-def create_chrome_driver(show_browser: bool) -> WebDriver:
+def load_page(driver, url: str) -> PageResponse | None:
     """
-    Create a new driver to be used for crawling
-    :return:chrome driver
+    Load the page and read the response of its document from the network events of the browser,
+    so no second request is sent to the site.
+    :param driver: Chrome driver or static driver
+    :param url: The URL of the page
+    :return: The response of the document, None if the browser did not report it
     """
-    chrome_options = Options()
-    user_agent = (
-        "Mozilla/5.0 (Windows NT 6.1)"
-        " AppleWebKit/537.2 (KHTML, like Gecko) Chrome/110.0.5481.77 Safari/537.2"
-    )
-    chrome_options.add_argument(f"user-agent={user_agent}")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--window-size=2560,1440")
-    # Set the implicitly wait time (in seconds)
-    if not show_browser:
-        chrome_options.add_argument("--headless")  # Hides the browser window
-    # Reference the local Chromedriver instance
-    chrome_path = r"/usr/bin/chromedriver"
-    return webdriver.Chrome(executable_path=chrome_path, options=chrome_options)
+    if isinstance(driver, StaticDriver):
+        driver.get(url)
+        return driver.response
+    # Drop the events of the previous page and its actions
+    driver.get_log("performance")
+    driver.get(url)
+    return parse_performance_log(driver.get_log("performance"))
 
 
-def execute_all_before_actions(template: Template, driver: WebDriver) -> None:
+def execute_all_before_actions(actions: tuple[Action, ...], driver: WebDriver) -> None:
     """
     Execute a list of actions to be done before the crawling process,
     some sites needs to accept cookies for example.
-    :param template:
+    :param actions: The actions of the extraction plan, in their order
     :param driver:
     :return:
     """
-    actions_chain = ActionChain.objects.filter(template=template).first()
-    if actions_chain is None or actions_chain.disabled:
-        return
-    all_actions = (
-        Action.objects.filter(action_chain=actions_chain)
-        .filter(deleted=False)
-        .order_by("order")
-    )
-    for action_to_be_executed in all_actions:
+    for action_to_be_executed in actions:
         try:
             if isinstance(action_to_be_executed, ClickAction):
                 driver.find_element(By.XPATH, action_to_be_executed.selector).click()
@@ -1,10 +1,12 @@
 import csv
 import os
+import time
 from concurrent.futures import ThreadPoolExecutor, Future, wait
 from io import StringIO
 import pathlib
 
 from django.db import transaction
+from django.http import HttpRequest, HttpResponse
 from django.utils import timezone
 
 from django.contrib.auth.models import User
@@ -14,9 +16,10 @@ from rest_framework.decorators import action
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from .crawling.control import publish_runner_status
 from .crawling.crawler_utils import CrawlerUtils
 from .filters import InspectorFilter
-from .indexing.inverted_index import InvertedIndex
+from .indexing.inverted_index import InvertedIndex, index_path
 from .indexing.qgram_index import QGramIndex, SingletonMeta
 from .models import (
     Crawler,
@@ -31,6 +34,7 @@ from .models import (
     ActionChain,
 )
 from .pbs.pbs_utils import PBSTestsUtils
+from .utils import extraction_plans, metrics_registry
 from .serializers import (
     CrawlerSerializer,
     UserSerializer,
@@ -42,6 +46,23 @@ from .serializers import (
     InspectorValueSerializer,
 )
 
+# TODO: The number of search results should be configurable
+SEARCH_RESULTS = 25
+
+SEARCH_SECONDS = metrics_registry.histogram(
+    "webscraper_search_seconds", "Seconds taken by the searches", ("indexer",)
+)
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Exports the metrics of the process in the Prometheus text format, they are read from memory only.
+    """
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
 
 class EverythingButDestroyViewSet(
     mixins.CreateModelMixin,
@@ -72,6 +93,11 @@ class TemplateViewSet(EverythingButDestroyViewSet):
         ActionChain.objects.create(template=template_object, name=request.data["name"])
         return template
 
+    def perform_update(self, serializer: TemplateSerializer) -> None:
+        super().perform_update(serializer)
+        # Running crawlers compile the template again for their next page
+        extraction_plans.invalidate(serializer.instance.id)
+
 
 class IndexerViewSet(EverythingButDestroyViewSet):
     queryset = Indexer.objects.filter(deleted=False).order_by("-id")
@@ -149,10 +175,13 @@ class IndexerViewSet(EverythingButDestroyViewSet):
             print("Creating an index!")
             inverted_index = InvertedIndex(indexer.q_gram_q)
             inverted_index.create_index(indexer_id)
+            # The index is searched from its file, so the other processes share it instead of building it
+            path = index_path(indexer_id)
+            inverted_index.save(path, compress=indexer.compress_postings)
+            singleton_cache.indexers_cache[cache_key] = InvertedIndex.load(path)
             indexer.status = IndexerStatus.COMPLETED
             indexer.completed_at = timezone.now()
             indexer.save()
-            singleton_cache.indexers_cache[cache_key] = inverted_index
             print(start_time - time.time())
             print("Done creating an index!")
 
@@ -162,12 +191,43 @@ class IndexerViewSet(EverythingButDestroyViewSet):
 
         return Response(status=200)
 
+    @action(detail=True, url_path="rescore", methods=["POST"])
+    def rescore(self, request: Request, pk: int) -> Response:
+        """
+        Computes the scores of the built index again with the current b and k parameters and word weights,
+        the documents are not tokenized again.
+        """
+        indexer = Indexer.objects.get(pk=pk)
+        path = index_path(indexer.id)
+        if not os.path.exists(path):
+            return Response(status=404, data={"detail": "The index is not built."})
+        # The cached index is still searched while a copy is scored
+        inverted_index = InvertedIndex.load(path)
+        inverted_index.score(
+            indexer.b_parameter,
+            indexer.k_parameter,
+            InvertedIndex.parse_words_weights(indexer.weight_words),
+        )
+        inverted_index.save(path, compress=indexer.compress_postings)
+        SingletonMeta.indexers_cache[f"indexer:{indexer.id}"] = InvertedIndex.load(path)
+        return Response(status=200)
+
     @action(detail=True, url_path="search", methods=["POST"])
     def search(self, request: Request, pk: int) -> Response:
+        start = time.perf_counter()
+        try:
+            return self.search_documents(request, pk)
+        finally:
+            SEARCH_SECONDS.observe(time.perf_counter() - start, indexer=pk)
+
+    def search_documents(self, request: Request, pk: int) -> Response:
+        """
+        Finds the documents of the index matching the query, ranked by their score.
+        """
         query = request.data["q"].lower().strip()
-        singleton_cache = SingletonMeta
-        cache_key = f"indexer:{pk}"
-        inverted_index = singleton_cache.indexers_cache.get(cache_key, None)
+        inverted_index = InvertedIndex.cached(pk)
+        if inverted_index is None:
+            return Response(status=404, data={"detail": "The index is not built."})
         words = query.split()
         q_list = []
         for word in words:
@@ -179,11 +239,12 @@ class IndexerViewSet(EverythingButDestroyViewSet):
             q_list = q_list + postings
         if len(q_list) == 0:
             return Response(data=None)
-        result = inverted_index.process_query(q_list, pk)[:25]
+        result = inverted_index.process_query(
+            q_list, pk, k=SEARCH_RESULTS, max_score=True
+        )
         for r in result:
             print(f"{r[3]}  - {r[2]}")
 
-        # TODO: 25 should be configurable
         docs_ids = [d[3] for d in result]
         headers = {}
         documents = {}
@@ -259,6 +320,14 @@ class InspectorViewSet(EverythingButDestroyViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = "template"
 
+    def perform_create(self, serializer: InspectorSerializer) -> None:
+        super().perform_create(serializer)
+        extraction_plans.invalidate(serializer.instance.template_id)
+
+    def perform_update(self, serializer: InspectorSerializer) -> None:
+        super().perform_update(serializer)
+        extraction_plans.invalidate(serializer.instance.template_id)
+
 
 class InspectorValueViewSet(EverythingButDestroyViewSet):
     queryset = InspectorValue.objects.filter(deleted=False)
@@ -285,19 +354,45 @@ class RunnerViewSet(EverythingButDestroyViewSet):
     def stop(self, request: Request, pk: int) -> Response:
         runner = Runner.objects.get(pk=pk)
         runner.status = str(RunnerStatus.EXIT)
-        runner.save()
+        # The documents count is updated by the runner at the same time
+        runner.save(update_fields=["status"])
+        publish_runner_status(runner.id, runner.status)
         return Response(status=200)
 
-    @action(detail=False, url_path="start", methods=["post"])
-    def start(self, request: Request) -> Response:
-        runner_id = request.data["id"]
-        runner_serializer = RunnerSerializer(data=request.data)
-        # TODO: If data are invalid we should throw an error here
-        if not runner_serializer.is_valid():
-            pass
+    @action(detail=True, url_path="pause", methods=["post"])
+    def pause(self, request: Request, pk: int) -> Response:
+        runner = Runner.objects.get(pk=pk)
+        runner.status = str(RunnerStatus.PAUSED)
+        # The documents count is updated by the runner at the same time
+        runner.save(update_fields=["status"])
+        publish_runner_status(runner.id, runner.status)
+        return Response(status=200)
 
-        runner = Runner.objects.get(id=runner_id)
-        if runner_serializer["machine"].value != "localhost":
+    @action(detail=True, url_path="resume", methods=["post"])
+    def resume(self, request: Request, pk: int) -> Response:
+        runner = Runner.objects.get(pk=pk)
+        # A running runner already crawls its frontier and a completed one has no frontier left,
+        # the status is changed in the same query so two requests can not both resume the runner
+        resumed = Runner.objects.filter(
+            pk=pk, status__in=(str(RunnerStatus.PAUSED), str(RunnerStatus.EXIT))
+        ).update(status=str(RunnerStatus.RUNNING))
+        if not resumed:
+            return Response(
+                status=400,
+                data={
+                    "detail": f"A runner with the status {runner.status} can not be resumed."
+                },
+            )
+        # The runner continues from the frontier it saved on disk, the crawled pages are not fetched again
+        self.run_runner(runner, runner.machine, runner.crawler_id)
+        return Response(status=200)
+
+    @staticmethod
+    def run_runner(runner: Runner, machine: str, crawler_id: int) -> None:
+        """
+        Run the crawler of the runner on this machine or as a job of the PBS cluster.
+        """
+        if machine != "localhost":
             # IP address are taken from the docker/.env file
             pbs_head_node = "173.16.38.8"
             # TODO: This can be dynamically added by using django models
@@ -308,9 +403,23 @@ class RunnerViewSet(EverythingButDestroyViewSet):
             pbs.set_up_pbs()
             pbs.run_job(runner)
         else:
-            crawler_utils = CrawlerUtils(runner_id, runner_serializer.data["crawler"])
+            crawler_utils = CrawlerUtils(runner.id, crawler_id)
             crawler_utils.start()
 
+    @action(detail=False, url_path="start", methods=["post"])
+    def start(self, request: Request) -> Response:
+        runner_id = request.data["id"]
+        runner_serializer = RunnerSerializer(data=request.data)
+        # TODO: If data are invalid we should throw an error here
+        if not runner_serializer.is_valid():
+            pass
+
+        runner = Runner.objects.get(id=runner_id)
+        self.run_runner(
+            runner,
+            runner_serializer["machine"].value,
+            runner_serializer.data["crawler"],
+        )
         return Response(status=200)
 
     @action(detail=False, url_path="start-docker", methods=["post"])
@@ -368,9 +477,18 @@ class ActionViewSet(EverythingButDestroyViewSet):
     queryset = Action.objects.all().filter(deleted=False)
     serializer_class = ActionPolymorphicSerializer
 
+    def perform_create(self, serializer: ActionPolymorphicSerializer) -> None:
+        super().perform_create(serializer)
+        extraction_plans.invalidate(serializer.instance.action_chain.template_id)
+
+    def perform_update(self, serializer: ActionPolymorphicSerializer) -> None:
+        super().perform_update(serializer)
+        extraction_plans.invalidate(serializer.instance.action_chain.template_id)
+
     @action(detail=True, url_path="disable-actions-chain", methods=["post"])
     def disable_actions_chain(self, request: Request, pk: int):
         chain = ActionChain.objects.get(id=pk)
         chain.disabled = not chain.disabled
         chain.save()
+        extraction_plans.invalidate(chain.template_id)
         return Response(status=200)